@@ -0,0 +1,54 @@
+"""
+Parser benchmark: the regex section walker against the BeautifulSoup reference.
+
+    python bench/bench_parser.py [page.html ...]
+
+Without arguments it runs on bench/pages/*.html. Those pages are synthesized to
+mirror the structure of the live booking page (venue tab sections, date header
+rows, .row/.col slot rows, navigation, scripts); saved copies of the real page
+can be passed on the command line instead. Each page is checked for identical
+output before it is timed.
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gym_monitor.parser import parse_schedule, parse_schedule_soup  # noqa: E402
+
+PAGES_DIR = Path(__file__).resolve().parent / 'pages'
+
+
+def best_of(func, html, repeat, number):
+    return min(timeit.repeat(lambda: func(html), repeat=repeat, number=number)) / number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('pages', nargs='*', type=Path)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    pages = args.pages or sorted(PAGES_DIR.glob('*.html'))
+    if not pages:
+        print("No pages to benchmark.")
+        return 1
+    print(f"{'page':<24}{'slots':>7}{'bs4 ms':>10}{'fast ms':>10}{'speedup':>9}")
+    for path in pages:
+        html = path.read_text(encoding='utf-8')
+        expected = parse_schedule_soup(html)
+        if parse_schedule(html) != expected:
+            print(f"{path.name}: parsers disagree, not timing this page")
+            return 1
+        slots = sum(len(v) for v in expected.values())
+        soup_time = best_of(parse_schedule_soup, html, args.repeat, max(1, args.number // 10))
+        fast_time = best_of(parse_schedule, html, args.repeat, args.number)
+        print(f"{path.name:<24}{slots:>7}{soup_time * 1000:>10.2f}{fast_time * 1000:>10.3f}{soup_time / fast_time:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
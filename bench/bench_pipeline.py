@@ -0,0 +1,230 @@
+"""
+End-to-end benchmark of the monitoring pipeline against a local booking server
+(gym_monitor.devtools.booking_server), so runs are repeatable and never touch
+the live site.
+
+    python bench/bench_pipeline.py [--days 3 7 14] [--flips 20] [--intervals 0.1 0.5]
+
+Three parts:
+
+  stages      time of each step of one cycle on pages of increasing size:
+              fetch (200 and 304), parse, diff (snapshot + detect_openings) and
+              the Treeview update (TreeRenderer.render)
+  latency     a watched FULL slot is flipped on the server; the time until the
+              engine raises on_alert (detect), and until the alert comes out of
+              the GUI's UpdateQueue, drained every GUI_FRAME_MS like the Tk
+              thread does, into a stand-in for _show_alert (shown), for each
+              poll interval. The alert window itself is not drawn.
+  throughput  monitoring cycles per second with the server unchanged (304),
+              unchanged without ETags (200, fingerprint short-circuit) and
+              changing on every request (one section reparsed)
+
+The Treeview update uses a real ttk.Treeview when a display is available and
+a stand-in that only counts calls otherwise.
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gym_monitor.config import GUI_FRAME_MS  # noqa: E402
+from gym_monitor.detector import detect_openings  # noqa: E402
+from gym_monitor.devtools.booking_server import BookingServer, Schedule  # noqa: E402
+from gym_monitor.engine import MonitorEngine  # noqa: E402
+from gym_monitor.parser import parse_schedule  # noqa: E402
+from gym_monitor.scheduler import PollScheduler  # noqa: E402
+from gym_monitor.state import StateStore  # noqa: E402
+from gym_monitor.transport import HttpClient  # noqa: E402
+from gym_monitor.treeview import TreeRenderer  # noqa: E402
+from gym_monitor.updates import UpdateQueue  # noqa: E402
+
+
+class _CountingTree:
+    """Stands in for a ttk.Treeview when there is no display."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __getattr__(self, name):
+        def call(*args, **kwargs):
+            self.calls += 1
+        return call
+
+
+def _make_tree():
+    try:
+        import tkinter
+        from tkinter import ttk
+        root = tkinter.Tk()
+        root.withdraw()
+        return ttk.Treeview(root, columns=('Time', 'Status', 'Chance'), show='headings'), 'ttk.Treeview'
+    except Exception:
+        return _CountingTree(), 'counting stand-in'
+
+
+def best(func, repeat=5):
+    """Best wall time of `repeat` calls, in milliseconds."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return min(times) * 1000
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def bench_stages(days_list, repeat):
+    tree, tree_kind = _make_tree()
+    print(f"Stages (best of {repeat}, ms; tree: {tree_kind})")
+    print(f"{'days':>5}{'slots':>7}{'KiB':>7}{'fetch':>9}{'304':>8}{'parse':>8}{'diff':>8}{'render':>9}{'update':>9}")
+    client = HttpClient()
+    try:
+        for days in days_list:
+            schedule = Schedule.synthesize(days=days)
+            with BookingServer(schedule) as site:
+                response = client.get(site.url)
+                html = response.text
+                etag = response.headers.get('ETag')
+                fetch = best(lambda: client.get(site.url), repeat)
+                revalidate = best(lambda: client.get(site.url, headers={'If-None-Match': etag}), repeat)
+            data = parse_schedule(html)
+            parse = best(lambda: parse_schedule(html), repeat)
+
+            state = StateStore()
+            state.seed(data)
+            for slot_id in schedule.slot_ids("FULL"):
+                state.select(slot_id)
+            diff = best(lambda: detect_openings(state, state.snapshot(data)), repeat)
+
+            # First render of the page, then a render where one row changed.
+            slots = [slot for venue_slots in data.values() for slot in venue_slots]
+            renderer = TreeRenderer(tree)
+            render = best(lambda: (renderer.clear(), renderer.render(slots, set())), repeat)
+            changed = [dict(slot) for slot in slots]
+            changed[len(changed) // 2]["status"] = "1 spaces left"
+            update = best(lambda: (renderer.render(changed, set()), renderer.render(slots, set())), repeat) / 2
+            renderer.clear()
+            print(f"{days:>5}{len(slots):>7}{len(html) / 1024:>7.0f}{fetch:>9.2f}{revalidate:>8.2f}"
+                  f"{parse:>8.2f}{diff:>8.2f}{render:>9.2f}{update:>9.3f}")
+    finally:
+        client.close()
+
+
+def _engine(site, interval, on_alert=None):
+    scheduler = PollScheduler(windows=[], default_interval=interval, jitter=0.0, max_requests_per_hour=0)
+    return MonitorEngine(url=site.url, scheduler=scheduler, on_alert=on_alert)
+
+
+def bench_latency(days, intervals, flips):
+    print(f"\nAlert latency, flip -> on_alert (detect) and -> _show_alert (shown) "
+          f"({flips} flips, {days} days of slots; ms)")
+    print(f"{'interval':>9}{'detect':>9}{'p50':>9}{'p95':>9}{'max':>9}{'missed':>8}")
+    for interval in intervals:
+        schedule = Schedule.synthesize(days=days)
+        alerted, shown = {}, {}
+        arrived = threading.Condition()
+        updates = UpdateQueue()
+        stopped = threading.Event()
+
+        def show_alert(slot_id):
+            with arrived:
+                shown[slot_id] = time.perf_counter()
+                arrived.notify_all()
+
+        def on_alert(slot_id):
+            alerted[slot_id] = time.perf_counter()
+            updates.urgent(show_alert, slot_id)
+
+        def frames():
+            # The Tk thread's _pump_updates.
+            while not stopped.wait(GUI_FRAME_MS / 1000):
+                updates.drain()
+
+        with BookingServer(schedule) as site:
+            engine = _engine(site, interval, on_alert)
+            gui = threading.Thread(target=frames, name='bench-gui', daemon=True)
+            gui.start()
+            try:
+                engine.state.seed(engine.fetch_snapshot())
+                targets = schedule.slot_ids("FULL")[:flips]
+                for slot_id in targets:
+                    engine.state.select(slot_id)
+                engine.start()
+                detected, latencies, missed = [], [], 0
+                for slot_id in targets:
+                    # Flip at a random point of the poll cycle.
+                    time.sleep(interval * (0.5 + (hash(slot_id) % 100) / 200))
+                    flipped = site.flip(slot_id)
+                    with arrived:
+                        if not arrived.wait_for(lambda: slot_id in shown, timeout=interval * 5 + 2):
+                            missed += 1
+                            continue
+                    detected.append((alerted[slot_id] - flipped) * 1000)
+                    latencies.append((shown[slot_id] - flipped) * 1000)
+            finally:
+                stopped.set()
+                engine.close()
+        if latencies:
+            print(f"{interval:>9.2f}{statistics.median(detected):>9.1f}{statistics.median(latencies):>9.1f}"
+                  f"{percentile(latencies, 95):>9.1f}{max(latencies):>9.1f}{missed:>8}")
+        else:
+            print(f"{interval:>9.2f}{'-':>9}{'-':>9}{'-':>9}{'-':>9}{missed:>8}")
+
+
+def bench_throughput(days, seconds):
+    print(f"\nThroughput, back-to-back cycles for {seconds:g}s ({days} days of slots)")
+    print(f"{'server':<28}{'cycles/s':>10}{'ms/cycle':>10}")
+    configurations = [
+        ("unchanged, ETag (304)", True, False),
+        ("unchanged, no ETag (200)", False, False),
+        ("one change per request", True, True),
+    ]
+    for name, etag, churn in configurations:
+        schedule = Schedule.synthesize(days=days)
+        churned = schedule.slot_ids()[-1]
+        with BookingServer(schedule, etag=etag) as site:
+            engine = _engine(site, 0)
+            try:
+                engine.state.seed(engine.fetch_snapshot())
+                cycles = 0
+                started = time.perf_counter()
+                while time.perf_counter() - started < seconds:
+                    if churn:
+                        site.flip(churned, f"{cycles % 20 + 1} spaces left")
+                    engine.check_once()
+                    cycles += 1
+                elapsed = time.perf_counter() - started
+            finally:
+                engine.close()
+        print(f"{name:<28}{cycles / elapsed:>10.0f}{elapsed / cycles * 1000:>10.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--days', type=int, nargs='+', default=[3, 7, 14], help="schedule sizes for the stage timings")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--intervals', type=float, nargs='+', default=[0.1, 0.5], help="poll intervals for the latency run")
+    parser.add_argument('--flips', type=int, default=20)
+    parser.add_argument('--seconds', type=float, default=3.0, help="length of each throughput run")
+    parser.add_argument('--only', choices=('stages', 'latency', 'throughput'))
+    args = parser.parse_args(argv)
+
+    if args.only in (None, 'stages'):
+        bench_stages(args.days, args.repeat)
+    if args.only in (None, 'latency'):
+        bench_latency(args.days[0], args.intervals, args.flips)
+    if args.only in (None, 'throughput'):
+        bench_throughput(args.days[0], args.seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
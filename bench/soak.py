@@ -0,0 +1,396 @@
+"""
+Soak and load test of the monitor against a local booking server
+(gym_monitor.devtools.booking_server): how many watched slots, venues, rules
+and notification targets one process handles before detection slows down, and
+whether anything grows over hours.
+
+    python bench/soak.py [--minutes 120] [--instances 2] [--venues 4] [--days 7]
+                         [--watch 200] [--rules 20] [--channels 10] [--change-rate 5]
+
+A change generator rewrites random slots on the server (`--change-rate` per
+second, keeping about `--full-ratio` of them FULL). Each instance is a
+MonitorEngine with its own watches, rules and notification channels, wired to
+the GUI's own classes on a withdrawn Tk root the way hku_gym_monitor.py wires
+them: snapshots and alerts go through an UpdateQueue drained every
+GUI_FRAME_MS on the main thread, snapshots are rendered by a TreeRenderer per
+venue and alerts are listed by the real AlertManager, which keeps the
+countdowns. A share of the alerts is acknowledged (the slot is then watched
+again, so the load stays the same), the rest time out after `--alert-timeout`
+seconds and are re-armed.
+
+It needs a display; on a headless machine run it under xvfb-run.
+
+Every `--report-every` seconds one line is printed (and appended to --csv):
+
+    cycles/s     monitoring cycles per second, all instances
+    alerts       alerts shown in the interval, and notifications delivered
+    p50/p95/p99  server flip -> alert listed in the alert window, in ms, over
+                 the interval, for alerts the engine raised first after the
+                 flip (a re-armed alert or one held back by an open one is not
+                 a detection)
+    rss          resident memory in MiB
+    threads      live threads
+    tasks        asyncio tasks on the engine loops (channel workers, loops, timers)
+    after        pending Tk timers (`after info`), not counting the harness's own
+    open         rows in the alert windows
+    rows         rows in the venue trees
+    slots        interned slots across instances (SlotRegistry)
+
+The summary compares the first and last report, so a leak shows up as growth.
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+import random
+import resource
+import signal
+import statistics
+import sys
+import threading
+import time
+import tkinter as tk
+from pathlib import Path
+from tkinter import ttk
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gym_monitor.config import ALERT_TIMEOUT_SECONDS, GUI_FRAME_MS  # noqa: E402
+from gym_monitor.devtools.booking_server import BookingServer, Schedule  # noqa: E402
+from gym_monitor.engine import MonitorEngine  # noqa: E402
+from gym_monitor.logs import setup_logging  # noqa: E402
+from gym_monitor.notifier import Channel  # noqa: E402
+from gym_monitor.scheduler import PollScheduler  # noqa: E402
+from gym_monitor.treeview import TreeRenderer  # noqa: E402
+from gym_monitor.updates import UpdateQueue  # noqa: E402
+from hku_gym_monitor import AlertManager  # noqa: E402
+
+COLUMNS = ('elapsed_s', 'cycles_per_s', 'alerts', 'delivered', 'p50_ms', 'p95_ms', 'p99_ms',
+           'rss_mib', 'threads', 'tasks', 'after', 'open', 'rows', 'slots')
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def rss_mib():
+    """Current resident memory; the peak where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+
+class SinkChannel(Channel):
+    """A notification target that takes `delay` seconds per alert and counts them."""
+    name = 'sink'
+
+    def __init__(self, index, delay=0.0):
+        super().__init__(rate=1000, per=1.0)
+        self.name = f"sink{index}"
+        self.delay = delay
+
+    async def deliver(self, alert):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+
+class Instance:
+    """One engine and the GUI classes that show its snapshots and alerts."""
+
+    def __init__(self, index, root, site, venues, args, rng):
+        self.site = site
+        self.rng = rng
+        self.ack_ratio = args.ack_ratio
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.shown = 0
+        self.last_raised = {}   # slot id -> perf_counter() of its last on_alert, at most one per slot on the page
+        self.delivered = 0
+        self.acknowledge_at = {}    # slot id -> monotonic time the simulated user acknowledges it
+        self.updates = UpdateQueue()
+        self.alerts = AlertManager(root, self.acknowledged, self.closed, args.alert_timeout)
+        self.renderers = {}
+        for name in venues:
+            tree = ttk.Treeview(root, columns=('Time', 'Status', 'Chance'), show='headings')
+            tree.tag_configure('selected', background='yellow')
+            self.renderers[name] = TreeRenderer(tree)
+        scheduler = PollScheduler(windows=[], default_interval=args.interval, jitter=0.0, max_requests_per_hour=0)
+        self.engine = MonitorEngine(url=site.url, venues=venues, scheduler=scheduler, extra_urls=[],
+                                    on_data=lambda data: self.updates.put('data', self.render, data),
+                                    on_alert=self.raised,
+                                    on_expired=lambda slot_ids: self.updates.post(self.expired, slot_ids))
+        self.state = self.engine.state
+        self.state.seed(self.engine.fetch_snapshot())
+        full = site.schedule.slot_ids("FULL")
+        for slot_id in rng.sample(full, min(args.watch, len(full))):
+            self.state.select(slot_id)
+        names = list(venues)
+        for _ in range(args.rules):
+            hour = rng.randint(7, 20)
+            self.engine.add_rule(f'venue="{rng.choice(names)}" days={rng.choice(("mon-fri", "weekends", "all"))} '
+                                 f'time={hour:02d}:00-{hour + 2:02d}:00', owner=f"soak{index}")
+        for i in range(args.channels):
+            self.engine.add_channel(SinkChannel(i, args.notify_delay))
+
+    def raised(self, slot_id):
+        """on_alert, on the engine loop: queued for the Tk thread like the GUI does."""
+        flipped = self.site.flips.get(slot_id)
+        if flipped is not None and flipped <= self.last_raised.get(slot_id, 0.0):
+            flipped = None
+        self.last_raised[slot_id] = time.perf_counter()
+        self.updates.urgent(self.show_alert, slot_id, flipped)
+
+    # --- The Tk thread's side, as in FitnessScheduleMonitor ---
+    def render(self, data):
+        if not data:
+            return
+        selected = self.state.selected_snapshot()
+        for name, renderer in self.renderers.items():
+            renderer.render(data.get(name, []), selected, self.engine.forecasts)
+
+    def show_alert(self, slot_id, flipped=None):
+        if not self.state.open_alert(slot_id):
+            return
+        self.alerts.add(slot_id, self.state.status_of(slot_id) or '')
+        shown = time.perf_counter()
+        with self.lock:
+            self.shown += 1
+            if flipped is not None:
+                self.latencies.append(shown - flipped)
+        if self.rng.random() < self.ack_ratio:
+            timeout = self.alerts.timeout_seconds
+            self.acknowledge_at[slot_id] = time.monotonic() + self.rng.uniform(0, min(timeout, 10))
+        self.engine.notify(slot_id)
+
+    def expired(self, slot_ids):
+        for slot_id in slot_ids:
+            self.alerts.discard(slot_id)
+            self.acknowledge_at.pop(slot_id, None)
+        self.render(self.engine.last_data)
+
+    def acknowledged(self, slot_id):
+        if self.state.acknowledge(slot_id):
+            self.state.select(slot_id)      # watched again, so the load stays the same
+
+    def closed(self, slot_id):
+        self.acknowledge_at.pop(slot_id, None)
+        self.state.rearm(slot_id)
+
+    def acknowledge_due(self):
+        """The simulated user: presses Acknowledge on the rows whose time has come."""
+        now = time.monotonic()
+        pending = set(self.alerts.pending)
+        for slot_id, when in list(self.acknowledge_at.items()):
+            if when <= now:
+                del self.acknowledge_at[slot_id]
+                if slot_id in pending:
+                    self.alerts._remove(slot_id, acknowledged=True)
+
+    def open_rows(self):
+        return len(self.alerts.tree.get_children()) if self.alerts.tree is not None else 0
+
+    def tree_rows(self):
+        return sum(len(renderer.tree.get_children()) for renderer in self.renderers.values())
+
+    def take_latencies(self):
+        with self.lock:
+            latencies, self.latencies = self.latencies, []
+            shown, self.shown = self.shown, 0
+        return latencies, shown
+
+    def tasks(self):
+        loop = self.engine._loop
+        return len(asyncio.all_tasks(loop)) if loop is not None else 0
+
+    def take_delivered(self):
+        total = sum(stats['delivered'] for stats in self.engine.notification_stats(timeout=5).values())
+        delivered, self.delivered = total - self.delivered, total
+        return delivered
+
+
+class Harness:
+    """Runs on the Tk main loop: a frame timer drains the update queues, a report timer samples."""
+
+    def __init__(self, args, root):
+        self.args = args
+        self.root = root
+        self.rng = random.Random(args.seed)
+        self.venues = {f"Venue {i + 1}": f"v{i + 1}Content" for i in range(args.venues)}
+        self.schedule = Schedule.synthesize(days=args.days, full_ratio=args.full_ratio, venues=self.venues, seed=args.seed)
+        self.site = BookingServer(self.schedule, delay=args.delay).start()
+        self.instances = [Instance(i, root, self.site, self.venues, args, random.Random(args.seed + i))
+                          for i in range(args.instances)]
+        self.stopped = threading.Event()
+        self.changes = 0
+        self.reports = []
+        self.writer = None
+        self._pump_id = None
+        self._next_tick = 0.0
+        self._started = 0.0
+        self._cycles = 0
+
+    def change(self):
+        """Rewrites random slots on the server at --change-rate per second."""
+        slot_ids = self.schedule.slot_ids()
+        period = 1 / self.args.change_rate
+        next_change = time.perf_counter()
+        while not self.stopped.is_set():
+            next_change += period
+            delay = next_change - time.perf_counter()
+            if delay > 0:
+                self.stopped.wait(delay)
+            slot_id = self.rng.choice(slot_ids)
+            if self.schedule.status(slot_id) == "FULL":
+                status = f"{self.rng.randint(1, 25)} spaces left"
+            elif self.rng.random() < self.args.full_ratio:
+                status = "FULL"
+            else:
+                continue
+            self.site.flip(slot_id, status)
+            self.changes += 1
+
+    def pump(self):
+        """The GUI's _pump_updates for every instance, and the simulated user once a second."""
+        if self.stopped.is_set():
+            self.root.quit()
+            return
+        for instance in self.instances:
+            instance.updates.drain()
+        if time.monotonic() >= self._next_tick:
+            self._next_tick += 1
+            for instance in self.instances:
+                instance.acknowledge_due()
+        self._pump_id = self.root.after(GUI_FRAME_MS, self.pump)
+
+    def pending_timers(self):
+        after_ids = self.root.tk.splitlist(self.root.tk.call('after', 'info'))
+        return sum(1 for after_id in after_ids if after_id != self._pump_id)
+
+    def sample(self, elapsed, cycles_per_s):
+        latencies, shown = [], 0
+        for instance in self.instances:
+            found, count = instance.take_latencies()
+            latencies += found
+            shown += count
+        ms = [value * 1000 for value in latencies]
+        return {
+            'elapsed_s': round(elapsed),
+            'cycles_per_s': round(cycles_per_s, 1),
+            'alerts': shown,
+            'delivered': sum(instance.take_delivered() for instance in self.instances),
+            'p50_ms': round(statistics.median(ms), 1) if ms else None,
+            'p95_ms': round(percentile(ms, 95), 1) if ms else None,
+            'p99_ms': round(percentile(ms, 99), 1) if ms else None,
+            'rss_mib': round(rss_mib(), 1),
+            'threads': threading.active_count(),
+            'tasks': sum(instance.tasks() for instance in self.instances),
+            'after': self.pending_timers(),
+            'open': sum(instance.open_rows() for instance in self.instances),
+            'rows': sum(instance.tree_rows() for instance in self.instances),
+            'slots': sum(len(instance.state.slots) for instance in self.instances),
+        }
+
+    def report(self):
+        elapsed = time.monotonic() - self._started
+        total = sum(instance.engine.stats['cycles'] for instance in self.instances)
+        since = elapsed - (self.reports[-1]['elapsed_s'] if self.reports else 0)
+        row = self.sample(elapsed, (total - self._cycles) / max(since, 1e-9))
+        self._cycles = total
+        self.reports.append(row)
+        print(''.join(f"{'-' if row[column] is None else row[column]:>13}" for column in COLUMNS), flush=True)
+        if self.writer is not None:
+            self.writer.writerow(row)
+        self._schedule_report()
+
+    def _schedule_report(self):
+        remaining = self._started + self.args.minutes * 60 - time.monotonic()
+        if remaining <= 0:
+            self.stopped.set()
+            return
+        self.root.after(int(min(self.args.report_every, remaining) * 1000), self.report)
+
+    def run(self):
+        args = self.args
+        threading.Thread(target=self.change, name='soak-changes', daemon=True).start()
+        for instance in self.instances:
+            instance.engine.start()
+        # Tk's callback wrapper would only print a KeyboardInterrupt; stop at the next frame instead.
+        signal.signal(signal.SIGINT, lambda signum, frame: self.stopped.set())
+        csv_file = None
+        if args.csv:
+            csv_file = open(args.csv, 'w', newline='', buffering=1)
+            self.writer = csv.DictWriter(csv_file, COLUMNS)
+            self.writer.writeheader()
+        print(''.join(f"{column:>13}" for column in COLUMNS))
+        self._started = self._next_tick = time.monotonic()
+        try:
+            self._schedule_report()
+            self.pump()
+            self.root.mainloop()
+        finally:
+            self.stopped.set()
+            for instance in self.instances:
+                instance.engine.stop()
+                instance.engine.close()
+            self.site.stop()
+            if csv_file is not None:
+                csv_file.close()
+        self.summarize(self.reports)
+
+    def summarize(self, reports):
+        if len(reports) < 2:
+            return
+        first, last = reports[0], reports[-1]
+        print(f"\n{self.changes} changes on the server, {sum(r['alerts'] for r in reports)} alerts, "
+              f"{sum(r['delivered'] for r in reports)} notifications delivered")
+        for column in ('rss_mib', 'threads', 'tasks', 'after', 'open', 'rows', 'slots'):
+            growth = last[column] - first[column]
+            print(f"{column:>8}: {first[column]} -> {last[column]} ({growth:+g})")
+        p95 = [r['p95_ms'] for r in reports if r['p95_ms'] is not None]
+        if p95:
+            print(f"  p95 ms: first {p95[0]}, last {p95[-1]}, worst {max(p95)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--minutes', type=float, default=10, help="how long to run")
+    parser.add_argument('--report-every', type=float, default=30, metavar='SECONDS')
+    parser.add_argument('--instances', type=int, default=1, help="engines in this process, each with its own watches")
+    parser.add_argument('--venues', type=int, default=2)
+    parser.add_argument('--days', type=int, default=3, help="days of slots per venue")
+    parser.add_argument('--full-ratio', type=float, default=0.75)
+    parser.add_argument('--watch', type=int, default=50, help="FULL slots watched per instance")
+    parser.add_argument('--rules', type=int, default=5, help="watch rules per instance")
+    parser.add_argument('--channels', type=int, default=2, help="notification channels per instance")
+    parser.add_argument('--notify-delay', type=float, default=0.05, help="seconds each notification takes")
+    parser.add_argument('--change-rate', type=float, default=2.0, help="slot changes per second on the server")
+    parser.add_argument('--interval', type=float, default=0.5, help="poll interval of every instance")
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds the server adds to every response")
+    parser.add_argument('--ack-ratio', type=float, default=0.5, help="share of alerts acknowledged")
+    parser.add_argument('--alert-timeout', type=float, default=ALERT_TIMEOUT_SECONDS)
+    parser.add_argument('--csv', type=Path, help="also write the reports to this CSV file")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args(argv)
+    # Importing hku_gym_monitor set up the app's INFO logging; every acknowledgement would print a line.
+    setup_logging(None, level=logging.WARNING)
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        print(f"The soak test drives the real Tk alert window and needs a display ({e}); "
+              f"on a headless machine run it under xvfb-run.", file=sys.stderr)
+        return 1
+    root.withdraw()
+    try:
+        Harness(args, root).run()
+    finally:
+        root.destroy()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
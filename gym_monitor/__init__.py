@@ -0,0 +1,15 @@
+"""Headless monitoring engine for the HKU Fitness Centre booking page."""
+from .config import URL, REFRESH_INTERVAL_SECONDS, ALERT_TIMEOUT_SECONDS, VENUES, ConfigError, load_email_config
+
+# The engine pulls in requests and asyncio; importing gym_monitor.config (as the
+# GUI does before its first window) should not wait for them.
+_LAZY = {'MonitorEngine': '.engine', 'StateStore': '.state', 'HttpClient': '.transport'}
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        import importlib
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,233 @@
+"""
+Headless monitor: `python -m gym_monitor --watch "CSE Active|<date>|<time>"`.
+
+Runs without a display, so it works on servers and in containers. Use --list to
+print the slot ids currently on the page.
+
+With --serve, one poller serves a whole team: watches and notification channels
+are managed per subscriber through a local HTTP API (see gym_monitor.api).
+"""
+import time
+STARTED = time.perf_counter()   # noqa: E402 -- the startup report counts the imports below
+import argparse
+import logging
+import signal
+import sys
+import threading
+
+from .config import (URL, REFRESH_INTERVAL_SECONDS, SECRET_CONFIG_PATH, HTTP_POOL_SIZE, CONNECT_TIMEOUT_SECONDS,
+                     READ_TIMEOUT_SECONDS, HTTP_MAX_RETRIES, MAX_REQUESTS_PER_HOUR, HISTORY_PATH, SERVER_PORT,
+                     SUBSCRIPTIONS_PATH, CHECKPOINT_MAX_AGE_SECONDS, EXTRA_URLS, FETCH_CONCURRENCY, LOG_PATH, LOG_MODULE_LEVELS, ConfigError, load_email_config, load_smtp_config)
+from .checkpoint import load_checkpoint
+from .engine import MonitorEngine
+from .history import HistoryStore
+from .logs import setup_logging
+from .metrics import StartupTimer
+from .rules import RuleError
+from .scheduler import PollScheduler, parse_window
+from .transport import HttpClient
+from .notifier import DesktopChannel, EmailChannel, WebhookChannel
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog="python -m gym_monitor", description="Monitor HKU Fitness Centre slots without a GUI.")
+    parser.add_argument('--url', default=URL, help="booking page to poll")
+    parser.add_argument('--page', action='append', metavar='URL',
+                        help="also poll this page and merge its venues into the snapshot (repeatable)")
+    parser.add_argument('--fetch-concurrency', type=int, default=FETCH_CONCURRENCY,
+                        help="pages downloaded at the same time")
+    parser.add_argument('--no-hedge', action='store_true',
+                        help="never send a second request when a response is slower than the recent p95")
+    parser.add_argument('--interval', type=float, default=REFRESH_INTERVAL_SECONDS,
+                        help="seconds between checks outside the poll windows")
+    parser.add_argument('--window', action='append', type=parse_window, metavar='HH:MM-HH:MM=SECONDS',
+                        help="poll at a different rate during this daily window (repeatable, replaces the defaults)")
+    parser.add_argument('--no-windows', action='store_true', help="always poll every --interval seconds")
+    parser.add_argument('--jitter', type=float, default=0.1, help="relative random variation of each wait")
+    parser.add_argument('--max-requests-per-hour', type=int, default=MAX_REQUESTS_PER_HOUR,
+                        help="request budget, 0 for unlimited")
+    parser.add_argument('--pool-size', type=int, default=HTTP_POOL_SIZE, help="keep-alive connections to keep open")
+    parser.add_argument('--connect-timeout', type=float, default=CONNECT_TIMEOUT_SECONDS)
+    parser.add_argument('--read-timeout', type=float, default=READ_TIMEOUT_SECONDS)
+    parser.add_argument('--retries', type=int, default=HTTP_MAX_RETRIES, help="quick retries of a failed fetch")
+    parser.add_argument('--watch', action='append', default=[], metavar='SLOT_ID',
+                        help='slot to watch, as "Venue|Date|Time" (repeatable)')
+    parser.add_argument('--rule', action='append', default=[], metavar='RULE',
+                        help='alert on any slot matching a watch rule, e.g. \'venue="CSE Active" days=tue,thu time=18:00-\' '
+                             '(repeatable, see gym_monitor/rules.py)')
+    parser.add_argument('--list', action='store_true', help="print the current slots and exit")
+    parser.add_argument('--email', metavar='RECIPIENT', help="also send alerts to this address")
+    parser.add_argument('--secret', default=str(SECRET_CONFIG_PATH), help="SMTP settings file")
+    parser.add_argument('--desktop', action='store_true', help="also show system notifications")
+    parser.add_argument('--webhook', action='append', default=[], metavar='URL',
+                        help="also POST each alert as JSON to this URL (repeatable)")
+    parser.add_argument('--history', default=str(HISTORY_PATH), help="SQLite file recording status transitions")
+    parser.add_argument('--no-history', action='store_true', help="do not record status transitions")
+    parser.add_argument('--once', action='store_true', help="stop watching a slot after its first alert")
+    parser.add_argument('--serve', action='store_true',
+                        help="multi-user mode: manage watches per subscriber through the HTTP API")
+    parser.add_argument('--host', default='127.0.0.1', help="address the API listens on (--serve)")
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help="port of the API (--serve)")
+    parser.add_argument('--subscriptions', default=str(SUBSCRIPTIONS_PATH),
+                        help="JSON file keeping the subscribers and their watches (--serve)")
+    parser.add_argument('--checkpoint', metavar='PATH',
+                        help="save the monitoring state here every few seconds and warm-start from it (if recent) on the next run")
+    parser.add_argument('--log-file', default=str(LOG_PATH), help="JSON-lines log, rotated by size and daily")
+    parser.add_argument('--no-log-file', action='store_true', help="only log to the terminal")
+    parser.add_argument('--log-level', action='append', type=parse_log_level, default=[], metavar='[MODULE=]LEVEL',
+                        help="log level, of one module if given, e.g. fetcher=WARNING (repeatable)")
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help="serve stage timings for Prometheus at http://HOST:PORT/metrics (--serve has GET /metrics on the API)")
+    return parser
+
+
+def parse_log_level(text):
+    """'fetcher=WARNING' -> ('fetcher', 'WARNING'); 'DEBUG' -> (None, 'DEBUG')."""
+    module, _, level = text.rpartition('=')
+    level = level.upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise argparse.ArgumentTypeError(f"unknown log level: {level}")
+    return module or None, level
+
+
+def list_slots(engine):
+    data = engine.fetch_snapshot()
+    if not data:
+        return 1
+    for venue_slots in data.values():
+        for slot in venue_slots:
+            chance = engine.forecasts.get(slot['id'])
+            print(f"{slot['id']}\t{slot['status']}" + (f"\t{chance:.0%}" if chance is not None else ''))
+    return 0
+
+
+def main(argv=None):
+    args = build_arg_parser().parse_args(argv)
+    module_levels = dict(LOG_MODULE_LEVELS)
+    module_levels.update((module, level) for module, level in args.log_level if module)
+    level = next((level for module, level in reversed(args.log_level) if module is None), 'INFO')
+    setup_logging(None if args.no_log_file else args.log_file, level=logging.getLevelName(level),
+                  module_levels=module_levels)
+    startup = StartupTimer(STARTED)
+    startup.mark('imports')
+
+    stopped = threading.Event()
+
+    registry = None
+    operator_channels = []      # channels from the command line get every alert
+
+    def on_alert(slot_id):
+        logging.info(f"ALERT: a spot has opened up for {slot_id.replace('|', ' - ')}")
+        if registry is not None:
+            # Only the channels of the people watching this slot.
+            engine.notify(slot_id, registry.channels_for(slot_id).union(operator_channels))
+            return
+        engine.notify(slot_id)
+        if args.once:
+            engine.state.acknowledge(slot_id)
+
+    def on_status(text, color="black"):
+        if color == "red":
+            logging.warning(text)
+
+    client = HttpClient(pool_size=args.pool_size, connect_timeout=args.connect_timeout,
+                        read_timeout=args.read_timeout, max_retries=args.retries, hedge=not args.no_hedge)
+    windows = [] if args.no_windows else args.window
+    scheduler = PollScheduler(windows=windows, default_interval=args.interval, jitter=args.jitter,
+                              max_requests_per_hour=args.max_requests_per_hour)
+    history = None if args.no_history else HistoryStore(args.history)
+    engine = MonitorEngine(url=args.url, scheduler=scheduler, client=client, history=history,
+                           extra_urls=EXTRA_URLS if args.page is None else args.page, fetch_concurrency=args.fetch_concurrency,
+                           on_alert=on_alert, on_status=on_status,
+                           on_email_failure=lambda: logging.error("Email delivery keeps failing; alerts stay queued and are retried."),
+                           # The registry saves its file when it forgets a watch; not on the engine loop.
+                           on_expired=lambda slot_ids: registry is not None and engine.run_blocking(registry.forget, slot_ids))
+    startup.mark('engine')
+
+    if args.list:
+        try:
+            return list_slots(engine)
+        finally:
+            engine.close()
+    if args.serve:
+        from .subscriptions import SubscriptionRegistry
+        try:
+            engine.start_mailer(load_smtp_config(args.secret))
+        except ConfigError as e:
+            logging.warning(f"{e} Subscribers can only use webhooks.")
+        registry = SubscriptionRegistry(engine, args.subscriptions)
+    elif not args.watch and not args.rule:
+        logging.error("Nothing to watch. Pass --watch SLOT_ID (see --list for the ids) or --rule RULE.")
+        return 2
+    for text in args.rule:
+        try:
+            engine.add_rule(text)
+        except RuleError as e:
+            logging.error(str(e))
+            return 2
+    if args.email:
+        if registry is not None and engine.mailer is not None:
+            channel = EmailChannel(engine.mailer, recipient=args.email)
+            engine.add_channel(channel)
+            operator_channels.append(channel.name)
+        else:
+            try:
+                engine.enable_email(load_email_config(args.email, args.secret))
+            except ConfigError as e:
+                logging.error(str(e))
+                return 2
+            operator_channels.append(EmailChannel.name)
+
+    channels = [DesktopChannel()] if args.desktop else []
+    channels += [WebhookChannel(url, client) for url in args.webhook]
+    for channel in channels:
+        engine.add_channel(channel)
+        operator_channels.append(channel.name)
+
+    saved = load_checkpoint(args.checkpoint, CHECKPOINT_MAX_AGE_SECONDS) if args.checkpoint else None
+    if saved and saved.get("data"):
+        # The first poll is diffed against the saved page, so nothing that opened meanwhile is missed.
+        engine.restore(saved)
+        startup.mark('warm_snapshot')
+    else:
+        data = engine.fetch_snapshot()
+        if data:
+            engine.state.seed(data)
+        startup.mark('first_data')
+    for slot_id in args.watch:
+        engine.state.select(slot_id)
+    if registry is not None:
+        from .api import ApiServer
+        api = ApiServer(engine, registry, args.host, args.port).start()
+    else:
+        logging.info(f"Watching {len(args.watch)} slot(s).")
+    metrics_server = None
+    if args.metrics_port:
+        from .api import MetricsServer
+        metrics_server = MetricsServer(engine.metrics_text, args.host, args.metrics_port).start()
+
+    def handle_signal(signum, frame):
+        stopped.set()
+    signal.signal(signal.SIGINT, handle_signal)
+    signal.signal(signal.SIGTERM, handle_signal)
+
+    if args.checkpoint:
+        engine.start_checkpoints(args.checkpoint)
+    engine.start()
+    startup.mark('monitoring')
+    startup.report()
+    stopped.wait()
+    if registry is not None:
+        api.stop()
+    if metrics_server is not None:
+        metrics_server.stop()
+    if engine.checkpointer is not None:
+        engine.checkpointer.save()
+    engine.stop()
+    logging.info(f"Notification stats: {engine.notification_stats()}")
+    engine.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
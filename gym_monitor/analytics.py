@@ -0,0 +1,162 @@
+"""
+Availability analytics over the recorded history (history.py).
+
+The transitions are loaded into NumPy arrays once and every statistic is a
+handful of array operations (bincount, lexsort, percentile), so hundreds of
+thousands of transitions aggregate in well under a second:
+
+- opening rate per slot and per hour of the day (FULL -> available)
+- time-to-refill: how long an opened slot stayed available
+- a forecast per slot: the share of past slots with the same venue, weekday
+  and start time that opened up at least once (Laplace-smoothed)
+
+NumPy is optional; without it AvailabilityModel.build() returns None. It is
+only imported by the first build(), which runs after the first fetch, because
+it takes longer to import than the rest of the app.
+"""
+import logging
+import time
+from datetime import datetime
+
+from .history import FULL, AVAILABLE
+from .parser import parse_date, parse_time_range
+from .scheduler import PollWindow
+
+np = None
+
+
+def _import_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:  # analytics are an optional extra
+            return None
+        np = numpy
+    return np
+
+MINUTES_PER_WEEK = 7 * 1440
+
+
+def pattern_key(venue_index, weekday, start_minute):
+    """Slots that share a venue, weekday and start time share a pattern."""
+    return venue_index * MINUTES_PER_WEEK + weekday * 1440 + start_minute
+
+
+class AvailabilityModel:
+    """Statistics computed from one export of the history store."""
+
+    def __init__(self, slot_ids, venues, slot_patterns, slot_openings, ts, hours, refill_seconds, days_covered):
+        self.slot_ids = slot_ids
+        self.venues = venues                    # venue name -> index used in pattern keys
+        self.slot_openings = slot_openings      # openings per slot, by slot index
+        self.opening_times = ts                 # timestamps of every opening
+        self.opening_hours = hours              # local hour of day of every opening
+        self.refill_seconds = refill_seconds    # how long each opening stayed available
+        self.days_covered = days_covered
+
+        # Per pattern: how many dated slots were seen and how many of them opened up.
+        valid = slot_patterns >= 0
+        patterns = slot_patterns[valid]
+        self.pattern_keys, inverse = np.unique(patterns, return_inverse=True)
+        self.pattern_instances = np.bincount(inverse, minlength=len(self.pattern_keys))
+        self.pattern_opened = np.bincount(inverse, weights=slot_openings[valid] > 0,
+                                          minlength=len(self.pattern_keys))
+
+    @classmethod
+    def build(cls, store, days=60):
+        """Loads the last `days` of transitions from `store`. Returns None without NumPy."""
+        if _import_numpy() is None:
+            logging.warning("NumPy is not installed; availability analytics are disabled.")
+            return None
+        started = time.perf_counter()
+        since = time.time() - days * 86400
+        slots, transitions = store.export(since)
+
+        max_key = max((row[0] for row in slots), default=0)
+        slot_ids = [''] * (max_key + 1)
+        venue_names = sorted({row[2] for row in slots})
+        venues = {name: i for i, name in enumerate(venue_names)}
+        slot_patterns = np.full(max_key + 1, -1, dtype=np.int64)
+        for key, slot_id, venue, _, weekday, start_minute in slots:
+            slot_ids[key] = slot_id
+            if weekday is not None and start_minute is not None:
+                slot_patterns[key] = pattern_key(venues[venue], weekday, start_minute)
+
+        rows = np.array(transitions, dtype=np.float64).reshape(-1, 4)
+        keys = rows[:, 0].astype(np.int64)
+        ts = rows[:, 1]
+        from_kind = rows[:, 2].astype(np.int8)
+        to_kind = rows[:, 3].astype(np.int8)
+
+        opened = (from_kind == FULL) & (to_kind == AVAILABLE)
+        slot_openings = np.bincount(keys[opened], minlength=max_key + 1)
+        offset = datetime.now().astimezone().utcoffset().total_seconds()
+        hours = ((ts[opened] + offset) // 3600 % 24).astype(np.int64)
+
+        # Time to refill: order each slot's kind changes by time and measure from
+        # an opening to the slot's next change of kind (back to FULL, or gone).
+        changes = from_kind != to_kind
+        order = np.lexsort((ts[changes], keys[changes]))
+        c_keys, c_ts = keys[changes][order], ts[changes][order]
+        c_opened = opened[changes][order]
+        follows = np.zeros(len(c_keys), dtype=bool)
+        follows[:-1] = c_keys[1:] == c_keys[:-1]
+        ends = np.flatnonzero(c_opened & follows)
+        refill_seconds = c_ts[ends + 1] - c_ts[ends]
+
+        days_covered = max(1.0, (ts.max() - ts.min()) / 86400) if len(ts) else 1.0
+        model = cls(slot_ids, venues, slot_patterns, slot_openings, ts[opened], hours, refill_seconds, days_covered)
+        logging.info(f"Analytics: {len(ts)} transitions, {int(opened.sum())} openings aggregated "
+                     f"in {(time.perf_counter() - started) * 1000:.0f} ms.")
+        return model
+
+    # --- Rates ---
+    def opening_rate_by_hour(self):
+        """Average number of openings per day in each hour of the day (24 values)."""
+        return np.bincount(self.opening_hours, minlength=24) / self.days_covered
+
+    def refill_percentiles(self, percentiles=(50, 90, 99)):
+        """Seconds an opened slot stayed available, at the given percentiles."""
+        if not len(self.refill_seconds):
+            return {}
+        values = np.percentile(self.refill_seconds, percentiles)
+        return dict(zip(percentiles, values.tolist()))
+
+    # --- Forecast ---
+    def _pattern_of(self, slot_id):
+        parts = slot_id.split('|')
+        if len(parts) < 3 or parts[0] not in self.venues:
+            return -1
+        day = parse_date(parts[1])
+        times = parse_time_range(parts[2])
+        if day is None or times is None:
+            return -1
+        return pattern_key(self.venues[parts[0]], day.weekday(), times[0])
+
+    def forecast(self, slot_ids):
+        """
+        Maps each slot id to the probability that it opens up at least once,
+        from past slots with the same venue, weekday and start time. Slots
+        without such history are left out.
+        """
+        slot_ids = list(slot_ids)
+        if not slot_ids or not len(self.pattern_keys):
+            return {}
+        patterns = np.array([self._pattern_of(slot_id) for slot_id in slot_ids], dtype=np.int64)
+        positions = np.searchsorted(self.pattern_keys, patterns)
+        positions = np.minimum(positions, len(self.pattern_keys) - 1)
+        known = (self.pattern_keys[positions] == patterns) & (patterns >= 0)
+        probability = (self.pattern_opened[positions] + 1) / (self.pattern_instances[positions] + 2)
+        return {slot_id: float(p) for slot_id, p, ok in zip(slot_ids, probability, known) if ok}
+
+    def hot_hours(self, min_rate=0.5, limit=3):
+        """The (at most `limit`) hours of the day averaging at least `min_rate` openings per day."""
+        rates = self.opening_rate_by_hour()
+        ranked = np.argsort(rates)[::-1][:limit]
+        return sorted(int(hour) for hour in ranked if rates[hour] >= min_rate)
+
+    def hot_windows(self, interval, min_rate=0.5, limit=3):
+        """PollWindows polling every `interval` seconds during the hot_hours()."""
+        return [PollWindow(f"{hour:02d}:00", f"{hour + 1:02d}:00", interval)
+                for hour in self.hot_hours(min_rate, limit)]
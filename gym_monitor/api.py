@@ -0,0 +1,184 @@
+"""
+Local HTTP API of the server mode. JSON in, JSON out:
+
+    GET  /slots                                      current slots, status and watcher count
+    GET  /subscribers                                every subscriber with their watches
+    GET  /subscribers/<name>
+    POST /subscribe    {"name", "email"?, "webhooks"?}   webhooks: a list of http(s) URLs
+    POST /unsubscribe  {"name"}
+    POST /watch        {"name", "slot_id"}               a slot listed by GET /slots
+    POST /unwatch      {"name", "slot_id"}
+    POST /rule         {"name", "rule"}                  a watch rule, see gym_monitor.rules
+    POST /unrule       {"name", "rule_id"}
+    GET  /stats                                      poll and notification counters
+    GET  /metrics                                    stage timings and counters, Prometheus text format
+
+It binds to 127.0.0.1 by default and has no authentication: it is meant for a
+team machine, not the internet. MetricsServer serves only GET /metrics, for the
+GUI and the single-user monitor.
+"""
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlsplit
+
+
+# Fields a POST body must have as non-empty strings.
+_REQUIRED = {'/watch': ('name', 'slot_id'), '/unwatch': ('name', 'slot_id'), '/rule': ('name', 'rule')}
+
+
+def _channels(body):
+    """The email and webhooks of a /subscribe body. Raises ValueError unless they are well-formed."""
+    email = body.get("email")
+    if email is not None and not (isinstance(email, str) and "@" in email):
+        raise ValueError("email must be an email address")
+    webhooks = body.get("webhooks")
+    if webhooks is None:
+        webhooks = []
+    if not isinstance(webhooks, list) or not all(
+            isinstance(url, str) and urlsplit(url).scheme in ('http', 'https') and urlsplit(url).netloc
+            for url in webhooks):
+        raise ValueError("webhooks must be a list of http(s) URLs")
+    return email, webhooks
+
+
+class _ApiHandler(BaseHTTPRequestHandler):
+
+    def _reply(self, status, body=None):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _body(self, *required):
+        length = int(self.headers.get('Content-Length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if not isinstance(body, dict) or not all(isinstance(body.get(key), str) and body[key] for key in required):
+            raise ValueError(f"expected a JSON object with {', '.join(required)}")
+        return body
+
+    def do_GET(self):
+        api = self.server.api
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path == '/slots':
+            self._reply(200, api.slots())
+        elif path == '/subscribers':
+            self._reply(200, api.registry.subscribers())
+        elif path.startswith('/subscribers/'):
+            subscriber = api.registry.get(unquote(path[len('/subscribers/'):]))
+            self._reply(200 if subscriber else 404, subscriber or {"error": "no such subscriber"})
+        elif path == '/stats':
+            self._reply(200, api.stats())
+        elif path == '/metrics':
+            payload = api.engine.metrics_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        registry = self.server.api.registry
+        path = self.path.rstrip('/')
+        try:
+            body = self._body(*_REQUIRED.get(path, ('name',)))
+            if path == '/subscribe':
+                subscriber = registry.subscribe(body["name"], *_channels(body))
+                self._reply(200, subscriber.to_dict())
+            elif path == '/unsubscribe':
+                self._reply(200 if registry.unsubscribe(body["name"]) else 404, {})
+            elif path == '/watch':
+                registry.watch(body["name"], body["slot_id"])
+                self._reply(200, registry.get(body["name"]))
+            elif path == '/unwatch':
+                self._reply(200 if registry.unwatch(body["name"], body["slot_id"]) else 404, registry.get(body["name"]))
+            elif path == '/rule':
+                self._reply(200, registry.add_rule(body["name"], body["rule"]).to_dict())
+            elif path == '/unrule':
+                removed = isinstance(body.get("rule_id"), int) and registry.remove_rule(body["name"], body["rule_id"])
+                self._reply(200 if removed else 404, registry.get(body["name"]))
+            else:
+                self._reply(404, {"error": "not found"})
+        except KeyError as e:
+            self._reply(404, {"error": f"no such subscriber: {e}"})
+        except ValueError as e:
+            self._reply(400, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        logging.debug(f"API {self.address_string()} {format % args}")
+
+
+class ApiServer:
+    """Serves the API for `engine` and `registry` from a background thread."""
+
+    def __init__(self, engine, registry, host='127.0.0.1', port=8650):
+        self.engine = engine
+        self.registry = registry
+        self._server = ThreadingHTTPServer((host, port), _ApiHandler)
+        self._server.daemon_threads = True
+        self._server.api = self
+        self.host, self.port = self._server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}"
+
+    def slots(self):
+        data = self.engine.last_data or {}
+        return [{"slot_id": slot["id"], "venue": venue, "status": slot["status"],
+                 "watchers": len(self.registry.watchers(slot["id"]))}
+                for venue, venue_slots in data.items() for slot in venue_slots]
+
+    def stats(self):
+        return {"engine": dict(self.engine.stats), "watches": self.registry.watch_count(),
+                "notifications": self.engine.notification_stats(), "stages": self.engine.metrics.summary()}
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='gym-monitor-api', daemon=True).start()
+        logging.info(f"API listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?', 1)[0].rstrip('/') != '/metrics':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        payload = self.server.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves GET /metrics from a background thread; `render` returns the exposition text."""
+
+    def __init__(self, render, host='127.0.0.1', port=0):
+        self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        self._server.daemon_threads = True
+        self._server.render = render
+        self.host, self.port = self._server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}/metrics"
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='gym-monitor-metrics', daemon=True).start()
+        logging.info(f"Metrics available at {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,121 @@
+"""
+Checkpoints for a warm restart.
+
+Every CHECKPOINT_SECONDS the engine writes what a restart would otherwise
+lose: the watched slots, the last seen status of every slot, the open alerts,
+the last parsed page and whatever the client adds (the GUI keeps the email
+recipient and whether it was monitoring). The file is written to a temporary
+name, fsynced and renamed over the old one, so a crash leaves either the old or
+the new checkpoint, never half of one; nothing is written while nothing changed,
+except that an unchanged checkpoint is rewritten every `refresh_seconds`
+(a quarter of CHECKPOINT_MAX_AGE_SECONDS), so a quiet night does not make it
+too old to warm-start from.
+The GUI discards it when it is closed normally, so only a crash or a kill
+warm-starts it; the headless monitor saves it on the way out instead, so a
+service restart picks up where it stopped.
+
+On a warm start the saved page is shown at once and becomes the baseline of
+the first fresh fetch, so a slot that opened while the monitor was down is
+still reported. The SMTP password is not written: it is read from
+secret.yaml again.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from .config import CHECKPOINT_MAX_AGE_SECONDS
+from .parser import slot_record
+
+CHECKPOINT_VERSION = 1
+
+
+def encode_data(data):
+    """Parsed page data as {venue: [[date, time, status], ...]}."""
+    if not data:
+        return None
+    return {venue: [[slot["date"], slot["time"], slot["status"]] for slot in slots] for venue, slots in data.items()}
+
+
+def decode_data(saved, now=None):
+    """The inverse of encode_data(), leaving out slots that have ended by `now`."""
+    if not saved:
+        return None
+    now = now or datetime.now()
+    data = {}
+    for venue, rows in saved.items():
+        slots = [slot_record(venue, date_text, time_slot, status) for date_text, time_slot, status in rows]
+        slots = [slot for slot in slots if slot["ends"] is None or slot["ends"] > now]
+        if slots:
+            data[venue] = slots
+    return data or None
+
+
+def load_checkpoint(path, max_age=None):
+    """The checkpoint at `path`, or None if there is none, it is unreadable or older than `max_age` seconds."""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            saved = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring the checkpoint in '{path}': {e}")
+        return None
+    if not isinstance(saved, dict) or saved.get("version") != CHECKPOINT_VERSION:
+        logging.warning(f"Ignoring the checkpoint in '{path}': unknown format.")
+        return None
+    age = time.time() - saved.get("saved_at", 0)
+    if max_age is not None and age > max_age:
+        logging.info(f"The checkpoint in '{path}' is {age / 60:.0f} minutes old; starting fresh.")
+        return None
+    return saved
+
+
+class Checkpointer:
+    """
+    Writes capture() (and extra(), if given) to `path`. save() is blocking and
+    skips the write when the content is unchanged since a write less than
+    `refresh_seconds` ago, and after discard().
+    """
+
+    def __init__(self, path, capture, extra=None, refresh_seconds=CHECKPOINT_MAX_AGE_SECONDS / 4):
+        self.path = path
+        self.capture = capture
+        self.extra = extra
+        self.refresh_seconds = refresh_seconds
+        self.lock = threading.Lock()    # the periodic save and the one on exit may overlap
+        self._last = None
+        self._saved_at = 0.0
+        self._discarded = False
+
+    def save(self):
+        """Returns True if a checkpoint was written."""
+        content = self.capture()
+        if self.extra is not None:
+            content.update(self.extra())
+        body = json.dumps(content, separators=(',', ':'), ensure_ascii=False)
+        with self.lock:
+            now = time.time()
+            if self._discarded or (body == self._last and now - self._saved_at < self.refresh_seconds):
+                return False
+            temporary = f"{self.path}.tmp"
+            with open(temporary, 'w', encoding='utf-8') as f:
+                json.dump({"version": CHECKPOINT_VERSION, "saved_at": now, **content}, f,
+                          separators=(',', ':'), ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.path)
+            self._last = body
+            self._saved_at = now
+        return True
+
+    def discard(self):
+        """Deletes the checkpoint and stops writing it, for a clean exit. Blocking."""
+        with self.lock:
+            self._discarded = True
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
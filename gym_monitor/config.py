@@ -0,0 +1,106 @@
+"""Shared configuration for the GUI and the headless monitor."""
+import os
+from pathlib import Path
+
+# --- Configuration ---
+# GYM_MONITOR_URL points every client at another server, e.g. gym_monitor.devtools.booking_server.
+URL = os.environ.get("GYM_MONITOR_URL", "https://fcbooking.cse.hku.hk/")
+REFRESH_INTERVAL_SECONDS = 60
+ALERT_TIMEOUT_SECONDS = 300  # 5 minutes
+GUI_FRAME_MS = 33   # the GUI applies queued updates this often (about 30 frames per second)
+# (start, end, seconds between polls); the first window containing the current
+# time wins, outside every window REFRESH_INTERVAL_SECONDS applies.
+POLL_WINDOWS = [
+    ("11:59:30", "12:02", 0.5),    # daily release of the slots 3 days ahead
+    ("11:55", "12:15", 5),
+    ("00:30", "07:00", 300),       # nothing to book overnight
+]
+MAX_REQUESTS_PER_HOUR = 1500
+HTTP_POOL_SIZE = 4
+CONNECT_TIMEOUT_SECONDS = 3.05
+READ_TIMEOUT_SECONDS = 10
+HTTP_MAX_RETRIES = 3
+# A request still unanswered after the HEDGE_QUANTILE of recent fetch times
+# (once HEDGE_MIN_SAMPLES are known, and at least HEDGE_MIN_SECONDS) is sent
+# again on a second connection; the first response wins.
+HEDGE_QUANTILE = 0.95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MIN_SECONDS = 0.25
+# More pages polled together with URL, e.g. venue-specific ones; each venue is
+# read from the first page that has its section. At most FETCH_CONCURRENCY are
+# downloaded at once, which with their hedges stays within HTTP_POOL_SIZE.
+EXTRA_URLS = []
+FETCH_CONCURRENCY = 2
+project_dir = Path(os.path.abspath(__file__)).parent.parent
+SECRET_CONFIG_PATH = project_dir / 'secret.yaml'
+logo_path = project_dir / 'asset' / 'logos'
+LOGO_CACHE_PATH = project_dir / '.cache' / 'logos'    # logos scaled down for the setup screen
+LOGO_SIZE = (200, 200)
+HISTORY_PATH = project_dir / 'history.sqlite3'
+HISTORY_RETENTION_DAYS = 180
+WATCH_RULES_PATH = project_dir / 'watch_rules.txt'   # the GUI's standing watch rules, one per line
+# Availability model built from the history: days of history it looks at, how
+# often it is rebuilt, and the poll interval of the hours it finds busiest.
+ANALYTICS_DAYS = 60
+ANALYTICS_REFRESH_SECONDS = 3600
+LEARNED_WINDOW_INTERVAL = 10
+# Warm restarts: state is checkpointed this often, and a checkpoint older than
+# the maximum age is ignored (the GUI then shows its setup screens again).
+CHECKPOINT_PATH = project_dir / 'checkpoint.json'
+CHECKPOINT_SECONDS = 5
+CHECKPOINT_MAX_AGE_SECONDS = 3600
+# Logs: JSON lines in LOG_PATH, rotated at LOG_MAX_BYTES and at midnight,
+# keeping LOG_BACKUPS old files. Modules can have their own level, and only
+# one in N of the messages logged on every cycle is kept (by message prefix).
+LOG_PATH = project_dir / 'logs' / 'gym_monitor.jsonl'
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 14
+LOG_MODULE_LEVELS = {}      # e.g. {"fetcher": "WARNING", "engine": "DEBUG"}
+LOG_SAMPLES = {
+    "Monitor thread: Checking for updates": 100,
+    "Fetching data from": 100,
+    "GUI has been updated": 100,
+}
+# Server mode: port of the local API and where the subscriptions are kept.
+SERVER_PORT = 8650
+METRICS_PORT = 8651     # Prometheus endpoint of the GUI (python -m gym_monitor takes --metrics-port); None disables it
+SUBSCRIPTIONS_PATH = project_dir / 'subscriptions.json'
+
+# venue name -> id of the <div> holding its schedule on the booking page
+VENUES = {
+    "CSE Active": "c10001Content",
+    "HKU B-Active": "c10002Content",
+}
+
+REQUIRED_EMAIL_KEYS = ['smtp_server', 'smtp_port', 'sender_email', 'sender_password']
+
+
+class ConfigError(Exception):
+    """Raised when secret.yaml is missing or invalid."""
+
+
+def load_email_config(recipient_email, path=SECRET_CONFIG_PATH):
+    """Reads the SMTP settings from `path` and attaches the recipient address."""
+    if not recipient_email or "@" not in recipient_email:
+        raise ConfigError("Please enter a valid email address.")
+    config = load_smtp_config(path)
+    config['recipient_email'] = recipient_email
+    return config
+
+
+def load_smtp_config(path=SECRET_CONFIG_PATH):
+    """Reads the SMTP settings from `path`, without a recipient (the server mode has many)."""
+    if not os.path.exists(path):
+        raise ConfigError(f"Error: '{path}' not found.")
+    import yaml     # only needed once email is set up
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            config = yaml.safe_load(f)
+    except (yaml.YAMLError, IOError) as e:
+        raise ConfigError(f"Error reading '{path}':\n{e}")
+    if not config or not all(key in config for key in REQUIRED_EMAIL_KEYS):
+        missing = [k for k in REQUIRED_EMAIL_KEYS if k not in (config or {})]
+        raise ConfigError(f"Error: Missing keys in YAML: {', '.join(missing)}")
+    if "@" not in config['sender_email']:
+        raise ConfigError("Error: 'sender_email' in YAML is not a valid email address.")
+    return config
@@ -0,0 +1,29 @@
+"""Detects watched slots that changed from FULL to available."""
+from .slots import Status
+
+
+def is_full(status):
+    return status.upper() == 'FULL'
+
+
+def detect_openings(state, snapshot):
+    """
+    Compares `snapshot` (a slots.Snapshot) against the previous statuses and
+    returns the (slot id, status text) of the watched slots that just became
+    available. Every changed status is stored, watched or not, so that on the
+    next cycle an unchanged page compares equal as a whole.
+    """
+    opened = []
+    with state.lock:
+        previous = state.previous
+        selected = state.selected_slots
+        for key in previous.statuses.changed_keys(snapshot.statuses):
+            old, new = previous.statuses[key], snapshot.statuses[key]
+            previous.statuses[key] = new
+            if new is Status.MISSING:
+                previous.texts.pop(key, None)
+                continue
+            text = previous.texts[key] = snapshot.text(key)
+            if key in selected and old is Status.FULL and new is Status.AVAILABLE:
+                opened.append((state.slots.slot_id(key), text))
+    return opened
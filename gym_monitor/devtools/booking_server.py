@@ -0,0 +1,322 @@
+"""
+A local stand-in for the booking site, so the monitor can run and be measured
+without reaching fcbooking.cse.hku.hk:
+
+    with BookingServer(Schedule.synthesize(days=3)) as site:
+        engine = MonitorEngine(url=site.url, ...)
+        ...
+        site.flip(slot_id)          # FULL -> "3 spaces left"; returns the perf_counter() time
+
+The page has the same structure as the live one (venue tab sections with date
+header rows and .row/.col slot rows). It is served with an ETag and answers
+If-None-Match with 304, like a well-behaved server would. A recorded page can
+be replayed instead of a synthesized schedule:
+
+    python -m gym_monitor.devtools.booking_server --record live.html         # save the live page
+    python -m gym_monitor.devtools.booking_server --replay live.html other.html --every 30
+    python -m gym_monitor.devtools.booking_server --days 4 --flip-every 10   # a random opening every 10 s
+
+then point the monitor at it with --url, or GYM_MONITOR_URL for the GUI.
+"""
+import argparse
+import datetime
+import hashlib
+import logging
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from ..config import VENUES
+from ..parser import make_slot_id
+
+_HEAD = '''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1, shrink-to-fit=no">
+<title>HKU Fitness Centre Booking</title>
+<link rel="stylesheet" href="/css/bootstrap.min.css">
+<link rel="stylesheet" href="/css/app.css">
+</head>
+<body>
+<nav class="navbar navbar-expand-lg navbar-dark bg-dark">
+  <a class="navbar-brand" href="/">Fitness Centre Booking</a>
+  <ul class="navbar-nav mr-auto">
+    <li class="nav-item"><a class="nav-link" href="/">Home</a>
+    <li class="nav-item"><a class="nav-link" href="/my-bookings">My Bookings</a>
+  </ul>
+</nav>
+<div class="container mt-3">
+  <div class="alert alert-info">Peak-time sessions are released 3 days in advance at 12:00&nbsp;noon.</div>
+  <div class="tab-content">
+'''
+_FOOT = '''  </div>
+</div>
+<script src="/js/jquery.min.js"></script>
+<script>
+  $(function () { $('[data-toggle="tooltip"]').tooltip(); /* <div> in a script is not markup */ });
+</script>
+</body>
+</html>
+'''
+_SLOT = '''      <div class="border-top py-1">
+        <div class="row align-items-center">
+          <div class="col">{time}</div>
+          <div class="col">
+            {status}
+          </div>
+          <div class="col-auto"><a class="btn btn-sm btn-primary" href="/book">Book</a></div>
+        </div>
+      </div>
+'''
+
+
+class Schedule:
+    """
+    A mutable booking schedule: venue name -> [(date text, [[time text, status], ...])].
+    render() turns it into a booking page, each venue in the <div> named in `venue_ids`.
+    """
+
+    def __init__(self, venues, venue_ids=VENUES):
+        self.venues = venues
+        self.venue_ids = venue_ids
+        self._status = {}   # slot id -> the [time, status] pair to edit
+        for venue, days in venues.items():
+            for date_text, slots in days:
+                for pair in slots:
+                    self._status[make_slot_id(venue, date_text, pair[0])] = pair
+
+    @classmethod
+    def synthesize(cls, days=3, start=None, full_ratio=0.75, slot_minutes=60, first_hour=7, last_hour=22,
+                   venues=VENUES, seed=1):
+        """
+        Every venue with `days` days from `start` (default tomorrow) of
+        `slot_minutes` slots. `venues` may be a {name: div id} dict like VENUES
+        to serve other venues.
+        """
+        rng = random.Random(seed)
+        start = start or datetime.date.today() + datetime.timedelta(days=1)
+        schedule = {}
+        for venue in venues:
+            schedule[venue] = []
+            for d in range(days):
+                day = start + datetime.timedelta(days=d)
+                slots = []
+                minute = first_hour * 60
+                while minute + slot_minutes <= last_hour * 60:
+                    end = minute + slot_minutes
+                    time_text = f"{minute // 60:02d}:{minute % 60:02d} - {end // 60:02d}:{end % 60:02d}"
+                    status = "FULL" if rng.random() < full_ratio else f"{rng.randint(1, 25)} spaces left"
+                    slots.append([time_text, status])
+                    minute = end
+                schedule[venue].append((day.strftime("%d %b %Y (%a)"), slots))
+        return cls(schedule, venue_ids=venues if isinstance(venues, dict) else VENUES)
+
+    def slot_ids(self, status=None):
+        """Every slot id, or those whose status is `status` (e.g. "FULL")."""
+        return [slot_id for slot_id, pair in self._status.items() if status is None or pair[1] == status]
+
+    def status(self, slot_id):
+        return self._status[slot_id][1]
+
+    def set_status(self, slot_id, status):
+        self._status[slot_id][1] = status
+
+    def render(self, venue_ids=None):
+        venue_ids = venue_ids or self.venue_ids
+        out = [_HEAD]
+        for venue, days in self.venues.items():
+            out.append(f'    <div class="tab-pane fade" id="{venue_ids[venue]}" role="tabpanel">\n')
+            for date_text, slots in days:
+                out.append(f'      <div class="py-2 grey text-center font-weight-bold">{date_text}</div>\n')
+                out.extend(_SLOT.format(time=time_text, status=status) for time_text, status in slots)
+            out.append('    </div>\n')
+        out.append(_FOOT)
+        return ''.join(out)
+
+
+class _BookingHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive, like the real server
+    disable_nagle_algorithm = True  # headers and body are separate writes
+
+    def do_GET(self):
+        site = self.server.site
+        if site.delay:
+            time.sleep(site.delay)
+        if site.stall_ratio and site.random.random() < site.stall_ratio:
+            time.sleep(site.stall)
+        body, etag = site.page()
+        with site.lock:
+            site.requests += 1
+        if etag and self.headers.get('If-None-Match') == etag:
+            with site.lock:
+                site.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if etag:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BookingServer:
+    """
+    Serves `schedule` (a Schedule) or replays `pages` (HTML strings, one after
+    the other on each advance()). `delay` slows every response down, and a
+    `stall_ratio` share of them by `stall` more seconds (a tail to hedge
+    against); `etag` False disables conditional requests.
+    """
+
+    def __init__(self, schedule=None, pages=None, host='127.0.0.1', port=0, delay=0.0, etag=True,
+                 stall_ratio=0.0, stall=1.0, seed=None):
+        if (schedule is None) == (pages is None):
+            raise ValueError("Pass either a schedule or pages to replay")
+        self.schedule = schedule
+        self.pages = list(pages or [])
+        self.page_index = 0
+        self.delay = delay
+        self.stall_ratio = stall_ratio
+        self.stall = stall
+        self.random = random.Random(seed)
+        self.etag = etag
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.not_modified = 0
+        self.flips = {}     # slot id -> perf_counter() time of its last flip
+        self._cached = None
+        self._server = ThreadingHTTPServer((host, port), _BookingHandler)
+        self._server.daemon_threads = True
+        self._server.site = self
+        self.host, self.port = self._server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}/"
+        self._timers = []
+
+    def page(self):
+        """(body bytes, ETag) of the current page, rendered once per change."""
+        with self.lock:
+            if self._cached is None:
+                html = self.schedule.render() if self.schedule is not None else self.pages[self.page_index]
+                body = html.encode('utf-8')
+                etag = f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"' if self.etag else None
+                self._cached = body, etag
+            return self._cached
+
+    def flip(self, slot_id, status="3 spaces left"):
+        """Changes the status of a slot. Returns the perf_counter() time the new page went live."""
+        with self.lock:
+            self.schedule.set_status(slot_id, status)
+            self._cached = None
+            flipped = self.flips[slot_id] = time.perf_counter()
+        return flipped
+
+    def flip_later(self, delay, slot_id, status="3 spaces left"):
+        timer = threading.Timer(delay, self.flip, (slot_id, status))
+        timer.daemon = True
+        timer.start()
+        self._timers.append(timer)
+
+    def advance(self):
+        """Replays the next page (wrapping around). Returns its index."""
+        with self.lock:
+            self.page_index = (self.page_index + 1) % len(self.pages)
+            self._cached = None
+            return self.page_index
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='booking-server', daemon=True).start()
+        return self
+
+    def stop(self):
+        for timer in self._timers:
+            timer.cancel()
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def record(url, path):
+    """Saves the page at `url` for replaying later."""
+    from ..transport import HttpClient
+    client = HttpClient()
+    try:
+        response = client.get(url)
+        response.raise_for_status()
+        Path(path).write_text(response.text, encoding='utf-8')
+    finally:
+        client.close()
+    logging.info(f"Saved {url} to {path} ({len(response.text)} characters).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gym_monitor.devtools.booking_server",
+                                     description="Local stand-in for the booking site.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--days', type=int, default=3, help="days of synthesized schedule per venue")
+    parser.add_argument('--full-ratio', type=float, default=0.75, help="share of synthesized slots that are FULL")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--flip-every', type=float, default=0, metavar='SECONDS',
+                        help="open a random FULL slot this often (synthesized schedule)")
+    parser.add_argument('--replay', nargs='+', type=Path, metavar='PAGE', help="serve these saved pages instead")
+    parser.add_argument('--every', type=float, default=0, metavar='SECONDS', help="advance to the next replayed page this often")
+    parser.add_argument('--delay', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--stall-ratio', type=float, default=0.0, help="share of responses delayed by --stall more seconds")
+    parser.add_argument('--stall', type=float, default=1.0, metavar='SECONDS')
+    parser.add_argument('--record', type=Path, metavar='PATH', help="save the page at --url to PATH and exit")
+    parser.add_argument('--url', help="page to --record (default: the configured booking site)")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    if args.record:
+        from ..config import URL
+        record(args.url or URL, args.record)
+        return 0
+    if args.replay:
+        site = BookingServer(pages=[p.read_text(encoding='utf-8') for p in args.replay],
+                             host=args.host, port=args.port, delay=args.delay,
+                             stall_ratio=args.stall_ratio, stall=args.stall, seed=args.seed)
+    else:
+        site = BookingServer(Schedule.synthesize(days=args.days, full_ratio=args.full_ratio, seed=args.seed),
+                             host=args.host, port=args.port, delay=args.delay,
+                             stall_ratio=args.stall_ratio, stall=args.stall, seed=args.seed)
+    site.start()
+    logging.info(f"Serving on {site.url} (Ctrl+C to stop)")
+    rng = random.Random(args.seed)
+    try:
+        while True:
+            interval = args.every if args.replay else args.flip_every
+            time.sleep(interval or 3600)
+            if args.replay and args.every:
+                logging.info(f"Now serving page {site.advance() + 1}/{len(site.pages)}")
+            elif args.flip_every:
+                full = site.schedule.slot_ids("FULL")
+                if full:
+                    slot_id = rng.choice(full)
+                    site.flip(slot_id)
+                    logging.info(f"Opened {slot_id}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        site.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+A minimal local SMTP server that accepts every message and keeps it in memory.
+
+It speaks just enough SMTP (EHLO/HELO, AUTH PLAIN/LOGIN, MAIL, RCPT, DATA,
+NOOP, RSET, QUIT) for smtplib, without TLS, so the mailer can be exercised
+with `smtp_ssl: false` and no real provider:
+
+    with SmtpSink() as sink:
+        config = sink.config(recipient_email='me@example.com')
+        ...
+        sink.messages  # [(sender, [recipients], raw message bytes), ...]
+"""
+import socketserver
+import threading
+
+
+class _SmtpHandler(socketserver.StreamRequestHandler):
+
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b'\r\n')
+
+    def handle(self):
+        sink = self.server.sink
+        sink.connections += 1
+        self._reply('220 localhost SmtpSink ready')
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+            if verb == 'EHLO':
+                self.wfile.write(b'250-localhost\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n')
+            elif verb == 'HELO':
+                self._reply('250 localhost')
+            elif verb == 'AUTH':
+                sink.logins += 1
+                if command.upper().startswith('AUTH LOGIN'):
+                    # Prompt for whatever of username/password was not sent
+                    # with the command; the answers are ignored.
+                    prompts = 2 if len(command.split()) == 2 else 1
+                    for _ in range(prompts):
+                        self._reply('334 VXNlcm5hbWU6')
+                        self.rfile.readline()
+                self._reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                sender, recipients = command[10:].strip(' <>'), []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command[8:].strip(' <>'))
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b'.\r\n', b'.\n'):
+                        break
+                    lines.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                with sink.lock:
+                    sink.messages.append((sender, recipients, b''.join(lines)))
+                self._reply('250 OK: queued')
+            elif verb in ('NOOP', 'RSET'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SmtpSink:
+    """Runs the server on a background thread; port 0 picks a free port."""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self._server = _Server((host, port), _SmtpHandler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.logins = 0
+        self._thread = None
+
+    def config(self, **overrides):
+        """SMTP settings in the secret.yaml format pointing at this sink."""
+        config = {'smtp_server': self.host, 'smtp_port': self.port, 'smtp_ssl': False,
+                  'sender_email': 'monitor@localhost', 'sender_password': 'password',
+                  'recipient_email': 'recipient@localhost'}
+        config.update(overrides)
+        return config
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,60 @@
+"""
+A local HTTP endpoint that records JSON POSTs, to point WebhookChannel at:
+
+    with WebhookSink() as sink:
+        engine.add_channel(WebhookChannel(sink.url, engine.client))
+        ...
+        sink.payloads  # decoded JSON bodies in arrival order
+
+`delay` makes every response slow, to check that a slow channel does not hold
+up the others.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        sink = self.server.sink
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if sink.delay:
+            time.sleep(sink.delay)
+        with sink.lock:
+            sink.payloads.append(json.loads(body or b'null'))
+        self.send_response(sink.status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class WebhookSink:
+
+    def __init__(self, host='127.0.0.1', port=0, delay=0.0, status=204):
+        self._server = ThreadingHTTPServer((host, port), _WebhookHandler)
+        self._server.daemon_threads = True
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}/hook"
+        self.delay = delay
+        self.status = status
+        self.lock = threading.Lock()
+        self.payloads = []
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='webhook-sink', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
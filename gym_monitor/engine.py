@@ -0,0 +1,511 @@
+"""
+The monitoring engine: polls the booking page, keeps the state of every slot
+and reports changes through callbacks. It has no GUI dependency; the Tk app and
+the headless daemon are both clients of it.
+
+Everything runs as tasks on one asyncio event loop owned by the engine, in a
+single background thread. Blocking work (HTTP requests, parsing, SMTP) is
+offloaded to small bounded thread pools, so the number of threads never
+depends on how many refreshes or alerts are in flight, and close() cancels
+every task at once.
+
+The engine can poll several pages (URL and EXTRA_URLS): they are downloaded
+concurrently, at most `fetch_concurrency` at a time, and merged into one
+snapshot, each venue read from the first page that has its section.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from .analytics import AvailabilityModel
+from .checkpoint import Checkpointer, decode_data, encode_data
+from .config import (URL, REFRESH_INTERVAL_SECONDS, VENUES, ANALYTICS_DAYS, ANALYTICS_REFRESH_SECONDS, LEARNED_WINDOW_INTERVAL,
+                     CHECKPOINT_SECONDS, EXTRA_URLS, FETCH_CONCURRENCY)
+from .detector import detect_openings
+from .fetcher import NOT_MODIFIED, Fetcher, fingerprint
+from .metrics import metrics
+from .notifier import EmailChannel, NotificationDispatcher
+from .parser import find_section, parse_section
+from .rules import Rule, RuleSet
+from .scheduler import PollScheduler
+from .state import StateStore
+from .transport import HttpClient
+
+
+def _log_failure(future):
+    if not future.cancelled() and future.exception() is not None:
+        logging.error(f"Background task failed: {future.exception()}")
+
+
+class MonitorEngine:
+    """
+    Callbacks are invoked from the engine's event loop thread; clients that
+    need to touch a GUI must hand them over to their own thread.
+
+    on_data(data)            -- a new snapshot was parsed
+    on_status(text, color)   -- a status line for the user
+    on_alert(slot_id)        -- a watched slot went from FULL to available, or a
+                                slot started to satisfy a watch rule (the rules
+                                are in fired_rules[slot_id] during the call)
+    on_email_failure()       -- email delivery keeps failing (alerts stay queued)
+    on_expired(slot_ids)     -- slots that have ended were forgotten
+    """
+
+    def __init__(self, url=URL, venues=VENUES, interval=REFRESH_INTERVAL_SECONDS, scheduler=None, client=None,
+                 history=None, max_workers=4, extra_urls=EXTRA_URLS, fetch_concurrency=FETCH_CONCURRENCY,
+                 on_data=None, on_status=None, on_alert=None, on_email_failure=None, on_expired=None):
+        self.url = url
+        self.venues = dict(venues)
+        self.scheduler = scheduler or PollScheduler(default_interval=interval)
+        self.client = client or HttpClient()
+        # Every request counts against the budget: retries, hedges, extra pages and refreshes.
+        self.client.on_request = self.scheduler.record_request
+        self.fetchers = [Fetcher(page_url, self.client) for page_url in [url, *extra_urls]]
+        self.fetcher = self.fetchers[0]
+        self.state = StateStore()
+        self.history = history
+        self.mailer = None
+        self.dispatcher = NotificationDispatcher(self._offload_notification)
+
+        self.on_data = on_data
+        self.on_status = on_status
+        self.on_alert = on_alert
+        self.on_email_failure = on_email_failure
+        self.on_expired = on_expired
+
+        self._loop = None
+        self._loop_thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gym-monitor-io')
+        # Notification channels get their own pool so a slow one cannot delay a fetch.
+        self._notify_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='gym-monitor-notify')
+        self._monitor_future = None
+        self._poll_lock = asyncio.Lock()
+        self._fetch_semaphore = asyncio.Semaphore(fetch_concurrency)
+
+        # Last parsed snapshot and the fingerprints it was built from, so a
+        # cycle whose input did not change can skip parsing and diffing.
+        self.last_data = None
+        self.last_snapshot = None
+        self.rules = RuleSet()
+        self._rule_snapshot = None    # the snapshot the rules were last matched against
+        self.fired_rules = {}         # slot id -> the rules it started to satisfy in the last cycle
+        self._pages = [None] * len(self.fetchers)   # (html, fingerprint) of the last download of each page
+        self._page_fingerprint = None
+        self._section_fingerprints = {}
+        self._snapshot_version = 0
+        self._diffed_versions = None
+        self.stats = Counter()
+        self.metrics = metrics
+        # Availability model over the history, and the chance of opening up
+        # (or None when unknown) of every slot seen on the page.
+        self.model = None
+        self.forecasts = {}
+        self._model_built = None
+        self.checkpointer = None
+
+    # --- Event loop ---
+    def _ensure_loop(self):
+        if self._loop is None:
+            self._loop = asyncio.new_event_loop()
+            self._loop_thread = threading.Thread(target=self._loop.run_forever, name='gym-monitor-loop', daemon=True)
+            self._loop_thread.start()
+        return self._loop
+
+    def submit(self, coro):
+        """Schedules `coro` on the engine loop from any thread. Returns a concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    def run_blocking(self, func, *args):
+        """
+        Runs a blocking call (file I/O) on the engine's thread pool, so a
+        callback on the loop need not wait for it. Errors are logged.
+        """
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(_log_failure)
+        return future
+
+    def close(self, timeout=2):
+        """Cancels every task, stops the loop and releases the thread pool and connections."""
+        if self._loop is not None and self._loop.is_running():
+            try:
+                self.submit(self._shutdown()).result(timeout)
+            except Exception as e:
+                logging.warning(f"Engine shutdown did not finish cleanly: {e}")
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop_thread.join(timeout)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._notify_executor.shutdown(wait=False, cancel_futures=True)
+        self.client.close()
+        if self.history is not None:
+            self.history.close()
+
+    async def _shutdown(self):
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _offload(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    async def _offload_notification(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._notify_executor, func, *args)
+
+    # --- Notifications ---
+    def add_channel(self, channel):
+        """Registers a notifier.Channel; safe to call from any thread."""
+        self._ensure_loop().call_soon_threadsafe(self.dispatcher.add_channel, channel)
+
+    def remove_channel(self, name):
+        self._ensure_loop().call_soon_threadsafe(self.dispatcher.remove_channel, name)
+
+    def start_mailer(self, config):
+        """Starts the Mailer without adding a channel; EmailChannels for any recipient can then use it."""
+        from .mailer import Mailer  # smtplib and email are only imported once email is set up
+        self.mailer = Mailer(config, self._offload_notification, url=self.url,
+                             on_failure=lambda: self._emit(self.on_email_failure))
+        self.submit(self.mailer.run())
+        return self.mailer
+
+    def enable_email(self, config):
+        self.add_channel(EmailChannel(self.start_mailer(config)))
+        logging.info(f"Email notifications enabled for recipient: {config['recipient_email']}")
+
+    @property
+    def email_enabled(self):
+        return self.mailer is not None
+
+    def notify(self, slot_id, channels=None):
+        """
+        Sends the alert for `slot_id` to the named notification channels (default:
+        every channel) without waiting for them.
+        """
+        status = self.state.status_of(slot_id)
+        self._ensure_loop().call_soon_threadsafe(self.dispatcher.dispatch, slot_id, status, channels)
+
+    def notification_stats(self, timeout=None):
+        """Per-channel delivery counters and latency. Blocks briefly."""
+        async def collect():
+            return self.dispatcher.stats()
+        return self.submit(collect()).result(timeout)
+
+    def metrics_text(self):
+        """Stage timings and every counter in the Prometheus text format. Blocks briefly."""
+        notifications = Counter()
+        try:
+            for name, stats in self.notification_stats(timeout=1).items():
+                for outcome in ('delivered', 'failed', 'deduplicated', 'dropped'):
+                    notifications[f"notify.{name}.{outcome}"] = stats[outcome]
+        except Exception as e:
+            logging.debug(f"Notification stats unavailable for the metrics: {e}")
+        return self.metrics.prometheus(self.stats, notifications)
+
+    # --- Polling ---
+    def _emit(self, callback, *args):
+        if callback:
+            callback(*args)
+
+    def _emit_status(self, text, color="black"):
+        self._emit(self.on_status, text, color)
+
+    async def poll(self, conditional=True):
+        """
+        Fetches the pages and returns (data, changed). Only venue sections whose
+        content changed are reparsed; when nothing changed the previous snapshot
+        is returned with changed=False. data is None if the download failed.
+        A page that fails while others answer is used as last downloaded.
+        """
+        async with self._poll_lock:
+            results = await self._fetch_pages(conditional and self.last_data is not None)
+            pages = [None if html is None or html is NOT_MODIFIED else html for html in results]
+            if all(html is None for html in results) or any(
+                    html is None and cached is None for html, cached in zip(pages, self._pages)):
+                self._emit_status("Error: Could not fetch data. Check connection.", "red")
+                return None, False
+            if None in results:
+                self.stats['stale_pages'] += results.count(None)
+            if all(html is NOT_MODIFIED for html in results):
+                self.stats['not_modified'] += 1
+                result = self.last_data, False
+            else:
+                result = await self._offload(self._process_page, pages)
+            self._evict_expired()
+            return result
+
+    async def _fetch_pages(self, conditional):
+        """The body, NOT_MODIFIED or None (failed) of every page, downloaded concurrently."""
+        if len(self.fetchers) == 1:
+            return [await self.fetcher.fetch_async(self._executor, conditional=conditional)]
+
+        async def fetch(fetcher):
+            async with self._fetch_semaphore:
+                return await fetcher.fetch_async(self._executor, conditional=conditional)
+        return await asyncio.gather(*(fetch(fetcher) for fetcher in self.fetchers))
+
+    def _evict_expired(self, now=None):
+        """Forgets the slots that have ended, so state stays the size of the page however long we run."""
+        expired = self.state.evict_expired(now)
+        if not expired:
+            return
+        logging.info(f"Forgot {len(expired)} slots that have ended.")
+        # Their keys get reused, so the cached snapshots must not refer to them any more.
+        if self.last_data is not None:
+            matched = self._rule_snapshot is self.last_snapshot
+            self.last_snapshot = self.state.snapshot(self.last_data)
+            if matched:
+                self._rule_snapshot = self.last_snapshot
+            elif self._rule_snapshot is not None:
+                # Rules have not seen the new page yet: keep the old baseline, minus the expired keys.
+                self._rule_snapshot = self._rule_snapshot.without(key for key, _ in expired)
+        self._emit(self.on_expired, [slot_id for _, slot_id in expired])
+
+    def _process_page(self, pages):
+        """
+        Fingerprints and parses the downloaded pages, one body per fetcher or
+        None to use the last download. Runs on the thread pool.
+        """
+        started = time.perf_counter()
+        for index, html in enumerate(pages):
+            if html is not None:
+                self._pages[index] = html, fingerprint(html)
+        page_fingerprint = tuple(page[1] for page in self._pages)
+        if page_fingerprint == self._page_fingerprint:
+            self.stats['unchanged_page'] += 1
+            self.metrics.observe('parse', time.perf_counter() - started)
+            return self.last_data, False
+        self._page_fingerprint = page_fingerprint
+
+        changed = False
+        data = {}
+        present = []
+        for name, div_id in self.venues.items():
+            section = None
+            for html, _ in self._pages:
+                section = find_section(html, div_id)
+                if section is not None:
+                    break
+            if section is None:
+                changed |= self._section_fingerprints.pop(name, None) is not None
+                continue
+            present.append(name)
+            section_fingerprint = fingerprint(section)
+            if self.last_data is not None and section_fingerprint == self._section_fingerprints.get(name):
+                slots = self.last_data.get(name)
+            else:
+                self._section_fingerprints[name] = section_fingerprint
+                slots = parse_section(name, section)
+                changed = True
+            if slots:
+                data[name] = slots
+        parsed = time.perf_counter()
+        self.metrics.observe('parse', parsed - started)
+        if not changed:
+            self.stats['unchanged_sections'] += 1
+            return self.last_data, False
+        self.last_data = data
+        self.last_snapshot = self.state.snapshot(data)
+        self._snapshot_version += 1
+        self.metrics.observe('snapshot', time.perf_counter() - parsed)
+        if self.history is not None:
+            with self.metrics.time('history'):
+                try:
+                    self.history.record(data, venues=present)
+                except Exception as e:
+                    logging.error(f"Failed to record poll history: {e}")
+                self._update_forecasts(data)
+        return data, True
+
+    def _update_forecasts(self, data):
+        """
+        Rebuilds the availability model every ANALYTICS_REFRESH_SECONDS and
+        forecasts the slots of `data` not seen yet. Runs in the executor.
+        """
+        now = time.monotonic()
+        forecasts = self.forecasts
+        if self._model_built is None or now - self._model_built >= ANALYTICS_REFRESH_SECONDS:
+            self._model_built = now
+            try:
+                self.model = AvailabilityModel.build(self.history, days=ANALYTICS_DAYS)
+            except Exception as e:
+                logging.error(f"Failed to build the availability model: {e}")
+                self.model = None
+            if self.model is not None:
+                windows = self.model.hot_windows(LEARNED_WINDOW_INTERVAL)
+                self.scheduler.set_learned_windows(windows)
+                if windows:
+                    logging.info(f"Polling every {LEARNED_WINDOW_INTERVAL}s during the busiest hours: {windows}")
+            forecasts = {}
+        if self.model is None:
+            return
+        new = [slot["id"] for slots in data.values() for slot in slots if slot["id"] not in forecasts]
+        if new:
+            found = self.model.forecast(new)
+            forecasts = dict(forecasts)
+            forecasts.update((slot_id, found.get(slot_id)) for slot_id in new)
+        # Replaced, never mutated, so other threads can read it without a lock.
+        self.forecasts = forecasts
+
+    def fetch_snapshot(self):
+        """Downloads the page and returns the current snapshot, or None if the download failed. Blocks."""
+        data, _ = self.submit(self.poll(conditional=False)).result()
+        return data
+
+    def refresh(self, initial=False, on_done=None):
+        """Fetches once in the background, outside the monitoring loop."""
+        self.submit(self._refresh(initial, on_done))
+
+    async def _refresh(self, initial, on_done):
+        try:
+            data, _ = await self.poll(conditional=False)
+            if data:
+                if initial:
+                    self.state.seed(data)
+                self._emit(self.on_data, data)
+                self._emit_status(f"Data loaded successfully. Last updated: {datetime.now().strftime('%H:%M:%S')}")
+        finally:
+            self._emit(on_done)
+
+    def check_once(self):
+        """Runs one monitoring cycle and returns the ids of the slots that opened up. Blocks."""
+        return self.submit(self._check()).result()
+
+    async def _check(self):
+        with self.metrics.time('cycle'):
+            return await self._check_cycle()
+
+    async def _check_cycle(self):
+        logging.info("Monitor thread: Checking for updates...")
+        data, changed = await self.poll()
+        if not data:
+            return []
+        self.stats['cycles'] += 1
+        versions = (self._snapshot_version, self.state.version)
+        if versions == self._diffed_versions:
+            # Same input as the last diff: nothing to parse, compare or redraw.
+            self.stats['short_circuited'] += 1
+            self._emit_status(f"Monitoring... Last checked: {datetime.now().strftime('%H:%M:%S')} "
+                              f"(unchanged, skipped {self.stats['short_circuited']}/{self.stats['cycles']})")
+            return []
+        self._diffed_versions = versions
+        if changed:
+            self._emit(self.on_data, data)
+        self._emit_status(f"Monitoring... Last checked: {datetime.now().strftime('%H:%M:%S')}")
+        opened = []
+        with self.metrics.time('diff'):
+            for slot_id, new_status in detect_openings(self.state, self.last_snapshot):
+                logging.info(f"CHANGE DETECTED! Slot {slot_id} is now available ({new_status}).")
+                opened.append(slot_id)
+            for slot_id in self._match_rules():
+                if slot_id not in opened:
+                    opened.append(slot_id)
+        self.stats['alerts'] += len(opened)
+        for slot_id in opened:
+            self._emit(self.on_alert, slot_id)
+        return opened
+
+    def _match_rules(self):
+        """Slots that started to satisfy a watch rule since the last snapshot matched."""
+        snapshot, previous = self.last_snapshot, self._rule_snapshot
+        self.fired_rules = {}
+        if snapshot is previous:
+            return []
+        self._rule_snapshot = snapshot
+        if previous is None:
+            return []   # the first snapshot is the baseline
+        fired = self.fired_rules = self.rules.changes(self.state.slots, previous, snapshot)
+        for slot_id, rules in fired.items():
+            logging.info(f"RULE MATCHED! Slot {slot_id} ({self.state.remember(slot_id, snapshot)}) "
+                         f"matches {', '.join(rule.text for rule in rules)}")
+        return list(fired)
+
+    # --- Checkpoints ---
+    def checkpoint(self):
+        """What a warm restart needs (see gym_monitor.checkpoint). Safe to call from any thread."""
+        return {"state": self.state.export(), "data": encode_data(self.last_data)}
+
+    def restore(self, saved):
+        """
+        Warm start from a checkpoint, before start(): the saved page becomes the
+        current snapshot and the baseline of the first fresh fetch, and the
+        watches and statuses are taken back. Returns the ids of the alerts that
+        were open.
+        """
+        data = decode_data(saved.get("data"))
+        if data:
+            self.last_data = data
+            self.last_snapshot = self.state.snapshot(data)
+            self._rule_snapshot = self.last_snapshot
+            self._snapshot_version += 1
+        alerts = self.state.restore(saved.get("state", {}))
+        logging.info(f"Restored {len(self.state.selected_slots)} watched slot(s) from the checkpoint.")
+        return alerts
+
+    def start_checkpoints(self, path, interval=CHECKPOINT_SECONDS, extra=None):
+        """Writes a checkpoint to `path` every `interval` seconds when something changed; `extra()` adds client fields."""
+        if self.checkpointer is not None:
+            return self.checkpointer
+        self.checkpointer = Checkpointer(path, self.checkpoint, extra)
+        self.submit(self._checkpoint_loop(interval))
+        return self.checkpointer
+
+    async def _checkpoint_loop(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._offload(self.checkpointer.save)
+            except Exception as e:
+                logging.error(f"Failed to write the checkpoint: {e}")
+
+    # --- Watch rules ---
+    def add_rule(self, text, owner=None, rule_id=None):
+        """
+        Compiles and adds a watch rule (see gym_monitor.rules). `rule_id` keeps
+        the id of a saved rule. Raises RuleError. Returns the Rule.
+        """
+        rule = Rule(text, owner, rule_id)
+        self._ensure_loop().call_soon_threadsafe(self.rules.add, rule)
+        logging.info(f"Watch rule added: {text}")
+        return rule
+
+    def remove_rule(self, rule_id):
+        self._ensure_loop().call_soon_threadsafe(self.rules.remove, rule_id)
+
+    def on_page(self, slot_id):
+        """Whether `slot_id` is on the last parsed page. Safe to call from any thread."""
+        key = self.state.slots.find(slot_id)
+        snapshot = self.last_snapshot
+        return key is not None and snapshot is not None and key in snapshot.records
+
+    @property
+    def is_running(self):
+        return self._monitor_future is not None and not self._monitor_future.done()
+
+    def start(self):
+        if self.is_running: return False
+        self._monitor_future = self.submit(self._monitor_loop())
+        logging.info("Monitoring has started.")
+        return True
+
+    def stop(self):
+        """Cancels the monitoring task; it stops at its current await point."""
+        if self._monitor_future is not None:
+            self._monitor_future.cancel()
+        logging.info("Monitoring has been stopped by the user.")
+
+    async def _monitor_loop(self):
+        try:
+            while True:
+                try:
+                    await self._check()
+                except Exception as e:
+                    logging.error(f"Unhandled exception in monitor worker: {e}", exc_info=True)
+                    self._emit_status(f"Error occurred: {e}. Retrying...", "red")
+                # 无论成功还是失败都会等待，避免立即重试导致刷屏
+                await asyncio.sleep(self.scheduler.next_delay())
+        finally:
+            logging.info("Monitor task has gracefully stopped.")
@@ -0,0 +1,59 @@
+"""Downloads the booking page."""
+import hashlib
+import logging
+
+import requests
+
+from .config import URL
+from .transport import HttpClient
+
+# Returned by Fetcher.fetch_async() when the server answered 304 Not Modified.
+NOT_MODIFIED = "NOT_MODIFIED"
+
+
+def fingerprint(text):
+    """Short content hash used to tell whether a page or a section changed."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+
+class Fetcher:
+    """
+    Fetches the raw HTML of the booking page. If the server sends an ETag or
+    Last-Modified header, the next request is conditional and an unchanged page
+    costs a 304 with no body.
+    """
+
+    def __init__(self, url=URL, client=None):
+        self.url = url
+        self.client = client or HttpClient()
+        self.etag = None
+        self.last_modified = None
+
+    def _conditional_headers(self):
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def _handle_response(self, response):
+        if response.status_code == 304:
+            return NOT_MODIFIED
+        response.raise_for_status()
+        self.etag = response.headers.get('ETag')
+        self.last_modified = response.headers.get('Last-Modified')
+        return response.text
+
+    async def fetch_async(self, executor=None, conditional=True):
+        """
+        Returns the page body, NOT_MODIFIED, or None if the request failed. Runs
+        on the engine's event loop; the blocking request runs on `executor`.
+        """
+        try:
+            logging.info(f"Fetching data from {self.url}")
+            headers = self._conditional_headers() if conditional else {}
+            return self._handle_response(await self.client.get_async(self.url, headers=headers, executor=executor))
+        except requests.RequestException as e:
+            logging.error(f"Failed to fetch HTML: {e}")
+            return None
@@ -0,0 +1,286 @@
+"""
+Append-only history of slot status transitions in a local SQLite file.
+
+Only changes are stored: one row per slot whose status differs from the last
+recorded one, so polling every half second costs nothing while the page is
+unchanged. Slots are stored once with their venue, weekday and start time so
+questions like "FULL -> available at HKU B-Active on weekdays 18:00-20:00 in the
+last 30 days" are answered from indexes.
+
+    python -m gym_monitor.history --venue "HKU B-Active" --weekdays 0-4 --start 18:00 --end 20:00 --days 30
+"""
+import argparse
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from .config import HISTORY_PATH, HISTORY_RETENTION_DAYS
+from .detector import is_full
+from .parser import parse_date, parse_time_range
+
+# Status kinds stored with every transition.
+FULL, AVAILABLE, GONE = 0, 1, 2
+KIND_NAMES = {FULL: 'FULL', AVAILABLE: 'available', GONE: 'gone'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS slots (
+    id INTEGER PRIMARY KEY,
+    slot_id TEXT NOT NULL UNIQUE,
+    venue TEXT NOT NULL,
+    date TEXT NOT NULL,
+    time TEXT NOT NULL,
+    day INTEGER,            -- date as a proleptic ordinal, NULL if unparsable
+    weekday INTEGER,        -- 0 = Monday
+    start_minute INTEGER    -- minutes since midnight
+);
+CREATE INDEX IF NOT EXISTS slots_by_venue ON slots (venue, weekday, start_minute);
+CREATE TABLE IF NOT EXISTS transitions (
+    slot INTEGER NOT NULL REFERENCES slots (id),
+    ts REAL NOT NULL,
+    from_kind INTEGER,      -- NULL for the first observation of a slot
+    to_kind INTEGER NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS transitions_by_slot ON transitions (slot, ts);
+CREATE INDEX IF NOT EXISTS transitions_by_time ON transitions (ts);
+"""
+
+
+def status_kind(status):
+    return FULL if is_full(status) else AVAILABLE
+
+
+class HistoryStore:
+    """
+    Thread-safe: record() runs on the engine's thread pool while queries may
+    come from the GUI or tooling.
+    """
+
+    def __init__(self, path=HISTORY_PATH, retention_days=HISTORY_RETENTION_DAYS):
+        self.path = str(path)
+        self.retention_days = retention_days
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._slot_keys = dict(self.conn.execute("SELECT slot_id, id FROM slots"))
+        # Last recorded (kind, status) per slot key, to detect changes in memory,
+        # and the venue of every slot that is not gone yet.
+        self._last = {}
+        self._live = {}
+        for slot, kind, status, venue in self.conn.execute(
+                "SELECT t.slot, t.to_kind, t.status, s.venue FROM transitions t JOIN slots s ON s.id = t.slot "
+                "WHERE t.rowid = (SELECT MAX(rowid) FROM transitions WHERE slot = t.slot)"):
+            self._last[slot] = (kind, status)
+            if kind != GONE:
+                self._live[slot] = venue
+        self._last_prune = 0.0
+        self.prune()
+
+    def _slot_key(self, slot):
+        key = self._slot_keys.get(slot["id"])
+        if key is None:
+            day = parse_date(slot["date"])
+            times = parse_time_range(slot["time"])
+            cursor = self.conn.execute(
+                "INSERT INTO slots (slot_id, venue, date, time, day, weekday, start_minute) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (slot["id"], slot["id"].split('|', 1)[0], slot["date"], slot["time"],
+                 day.toordinal() if day else None, day.weekday() if day else None, times[0] if times else None))
+            key = self._slot_keys[slot["id"]] = cursor.lastrowid
+        return key
+
+    def record(self, data, venues=None, ts=None):
+        """
+        Stores the transitions between the last recorded statuses and the
+        snapshot `data`. Slots of the given `venues` (default: those in `data`)
+        that are no longer listed are recorded as gone. Returns the number of
+        rows written.
+        """
+        ts = time.time() if ts is None else ts
+        venues = set(data) if venues is None else set(venues)
+        rows = []
+        with self.lock:
+            seen = set()
+            for venue_slots in data.values():
+                for slot in venue_slots:
+                    key = self._slot_key(slot)
+                    seen.add(key)
+                    current = (status_kind(slot["status"]), slot["status"])
+                    previous = self._last.get(key)
+                    if previous != current:
+                        rows.append((key, ts, previous[0] if previous else None, current[0], current[1]))
+                        self._last[key] = current
+                        self._live[key] = slot["id"].split('|', 1)[0]
+            for key, venue in list(self._live.items()):
+                if key not in seen and venue in venues:
+                    rows.append((key, ts, self._last[key][0], GONE, ''))
+                    self._last[key] = (GONE, '')
+                    del self._live[key]
+            if rows:
+                self.conn.executemany("INSERT INTO transitions VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.commit()
+        if ts - self._last_prune > 86400:
+            self.prune()
+        return len(rows)
+
+    def transitions(self, venue=None, from_kind=FULL, to_kind=AVAILABLE, weekdays=None,
+                    start_minute=None, end_minute=None, since=None, until=None, slot_id=None):
+        """
+        Transitions matching every given filter, oldest first, as
+        (slot_id, ts, from_kind, to_kind, status). Slots are filtered by start
+        time: start_minute <= start < end_minute. Pass from_kind/to_kind None
+        for any kind.
+        """
+        clauses, params = [], []
+        for column, value in (('s.venue', venue), ('s.slot_id', slot_id), ('t.from_kind', from_kind),
+                              ('t.to_kind', to_kind)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if weekdays is not None:
+            weekdays = sorted(set(weekdays))
+            clauses.append(f"s.weekday IN ({', '.join('?' * len(weekdays))})")
+            params.extend(weekdays)
+        if start_minute is not None:
+            clauses.append("s.start_minute >= ?")
+            params.append(start_minute)
+        if end_minute is not None:
+            clauses.append("s.start_minute < ?")
+            params.append(end_minute)
+        if since is not None:
+            clauses.append("t.ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("t.ts < ?")
+            params.append(until)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        query = (f"SELECT s.slot_id, t.ts, t.from_kind, t.to_kind, t.status FROM transitions t "
+                 f"JOIN slots s ON s.id = t.slot {where} ORDER BY t.ts")
+        with self.lock:
+            return self.conn.execute(query, params).fetchall()
+
+    def export(self, since=None):
+        """
+        Raw rows for bulk analysis: (slots, transitions) where slots are
+        (key, slot_id, venue, day, weekday, start_minute) and transitions are
+        (key, ts, from_kind, to_kind) with from_kind -1 for a first observation,
+        in no particular order. Only transitions since `since`, and only the
+        slots that have one of them.
+        """
+        since = since if since is not None else 0
+        with self.lock:
+            slots = self.conn.execute(
+                "SELECT id, slot_id, venue, day, weekday, start_minute FROM slots "
+                "WHERE id IN (SELECT DISTINCT slot FROM transitions WHERE ts >= ?)", (since,)).fetchall()
+            transitions = self.conn.execute(
+                "SELECT slot, ts, IFNULL(from_kind, -1), to_kind FROM transitions WHERE ts >= ?",
+                (since,)).fetchall()
+        return slots, transitions
+
+    def prune(self, retention_days=None):
+        """Deletes transitions older than the retention period and slots left without any."""
+        retention_days = self.retention_days if retention_days is None else retention_days
+        self._last_prune = time.time()
+        if not retention_days:
+            return 0
+        cutoff = time.time() - retention_days * 86400
+        with self.lock:
+            deleted = self.conn.execute("DELETE FROM transitions WHERE ts < ?", (cutoff,)).rowcount
+            if deleted:
+                orphans = [key for (key,) in self.conn.execute(
+                    "SELECT id FROM slots WHERE id NOT IN (SELECT DISTINCT slot FROM transitions)")]
+                self.conn.executemany("DELETE FROM slots WHERE id = ?", [(key,) for key in orphans])
+                orphans = set(orphans)
+                self._slot_keys = {slot_id: key for slot_id, key in self._slot_keys.items() if key not in orphans}
+                for key in orphans:
+                    self._last.pop(key, None)
+                    self._live.pop(key, None)
+            self.conn.commit()
+        if deleted:
+            logging.info(f"History: pruned {deleted} transitions older than {retention_days} days.")
+        return deleted
+
+    def compact(self):
+        """Reclaims the space of pruned rows and refreshes the query planner statistics."""
+        with self.lock:
+            self.conn.execute("ANALYZE")
+            self.conn.execute("VACUUM")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _parse_weekdays(text):
+    """'0-4' or '1,3' -> set of weekday numbers (0 = Monday)."""
+    days = set()
+    for part in text.split(','):
+        if '-' in part:
+            first, last = part.split('-')
+            days.update(range(int(first), int(last) + 1))
+        else:
+            days.add(int(part))
+    return days
+
+
+def _parse_minute(text):
+    hours, minutes = text.split(':')
+    return int(hours) * 60 + int(minutes)
+
+
+def print_refill_times(store, days):
+    """How long opened slots stayed available (all venues), if NumPy is installed."""
+    from .analytics import AvailabilityModel
+    model = AvailabilityModel.build(store, days=days)
+    if model is None:
+        return
+    percentiles = model.refill_percentiles()
+    if percentiles:
+        print(f"Time to refill over the last {days:g} days (all venues): "
+              + ', '.join(f"p{p} {_duration(seconds)}" for p, seconds in percentiles.items()))
+
+
+def _duration(seconds):
+    return f"{seconds:.0f}s" if seconds < 120 else f"{seconds / 60:.0f}min"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m gym_monitor.history",
+                                     description="Query recorded slot status transitions.")
+    parser.add_argument('--db', default=str(HISTORY_PATH))
+    parser.add_argument('--venue')
+    parser.add_argument('--weekdays', type=_parse_weekdays, help="e.g. 0-4 for Monday to Friday")
+    parser.add_argument('--start', type=_parse_minute, help="slots starting at or after HH:MM")
+    parser.add_argument('--end', type=_parse_minute, help="slots starting before HH:MM")
+    parser.add_argument('--days', type=float, default=30, help="look back this many days")
+    parser.add_argument('--any', action='store_true', help="every transition, not just FULL -> available")
+    parser.add_argument('--compact', action='store_true', help="prune old rows and vacuum the file, then exit")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db)
+    try:
+        if args.compact:
+            store.prune()
+            store.compact()
+            return 0
+        started = time.perf_counter()
+        kinds = {'from_kind': None, 'to_kind': None} if args.any else {}
+        rows = store.transitions(venue=args.venue, weekdays=args.weekdays, start_minute=args.start,
+                                 end_minute=args.end, since=time.time() - args.days * 86400, **kinds)
+        elapsed = (time.perf_counter() - started) * 1000
+        for slot_id, ts, from_kind, to_kind, status in rows:
+            change = f"{KIND_NAMES.get(from_kind, 'new')} -> {KIND_NAMES[to_kind]}"
+            print(f"{datetime.fromtimestamp(ts):%Y-%m-%d %H:%M:%S}  {slot_id}  {change}  {status}")
+        print(f"{len(rows)} transition(s) in {elapsed:.1f} ms")
+        print_refill_times(store, args.days)
+    finally:
+        store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
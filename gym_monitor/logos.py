@@ -0,0 +1,51 @@
+"""
+Logos for the setup screen, scaled down once and cached.
+
+The originals in asset/logos are full-size images; resizing one with LANCZOS
+on every start cost more than drawing the rest of the window. thumbnail()
+keeps a PNG of each logo at LOGO_SIZE in LOGO_CACHE_PATH, stamped with the
+source's modification time, and only rescales when the source changed. A
+cached PNG can be loaded by Tk itself, so Pillow is only imported on a miss.
+"""
+import logging
+import os
+import random
+
+from .config import LOGO_CACHE_PATH, LOGO_SIZE, logo_path
+
+SUPPORTED_FORMATS = ('.png', '.jpg', '.jpeg', '.gif')
+
+
+def random_logo(logos_dir=logo_path):
+    """A random image in `logos_dir`, or None if there is none."""
+    if not os.path.isdir(logos_dir):
+        logging.warning("'logos' 文件夹未找到，跳过显示图片。")
+        return None
+    images = [f for f in os.listdir(logos_dir) if f.lower().endswith(SUPPORTED_FORMATS)]
+    if not images:
+        logging.warning("'logos' 文件夹是空的，跳过显示图片。")
+        return None
+    return logos_dir / random.choice(images)
+
+
+def thumbnail(source, size=LOGO_SIZE, cache_dir=LOGO_CACHE_PATH):
+    """The path of a PNG of `source` scaled to `size`, made now if the cached one is missing or stale."""
+    cached = cache_dir / f"{source.stem}-{size[0]}x{size[1]}.png"
+    source_stat = os.stat(source)
+    try:
+        if os.stat(cached).st_mtime_ns == source_stat.st_mtime_ns:
+            return cached
+    except FileNotFoundError:
+        pass
+    from PIL import Image
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with Image.open(source) as image:
+        if image.mode not in ('RGB', 'RGBA', 'L', 'LA', 'P'):
+            image = image.convert('RGBA')
+        resized = image.resize(size, Image.Resampling.LANCZOS)
+    temporary = cached.with_suffix('.tmp')
+    resized.save(temporary, format='PNG')
+    os.utime(temporary, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    os.replace(temporary, cached)
+    logging.info(f"Cached a {size[0]}x{size[1]} thumbnail of {source.name}")
+    return cached
@@ -0,0 +1,181 @@
+"""
+Logging for monitors that run for weeks.
+
+Log calls come from the engine loop, the thread pools, the notification
+threads and the Tk thread. With basicConfig each of them formats and writes to
+the terminal itself, so a slow terminal or disk holds up whichever thread is
+logging, a poll included. setup_logging() puts a single QueueHandler on the
+root logger instead: a log call only appends the record to a queue, and a
+QueueListener thread does the writing, to
+
+    the terminal, in the usual "time - LEVEL - message" format, and
+    LOG_PATH, one JSON object per line, rotated at LOG_MAX_BYTES and at
+    midnight, keeping LOG_BACKUPS old files, so the logs stay bounded.
+
+Before a record is queued it passes two filters. ModuleLevelFilter gives
+modules their own level (LOG_MODULE_LEVELS, e.g. {"fetcher": "WARNING"});
+the code logs through the root logger, so a record's module is the file it
+came from. SampleFilter keeps one in N of the messages logged on every cycle
+(LOG_SAMPLES, by message prefix) and records N as the line's "sample".
+"""
+import atexit
+import copy
+import json
+import logging
+import queue
+import sys
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from pathlib import Path
+
+from .config import LOG_PATH, LOG_MAX_BYTES, LOG_BACKUPS, LOG_MODULE_LEVELS, LOG_SAMPLES
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: ts, level, module, thread, msg and, if set, sample."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            "level": record.levelname,
+            "module": record.module if record.name == 'root' else record.name,
+            "thread": record.threadName,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        sample = getattr(record, 'sample', None)
+        if sample:
+            entry["sample"] = sample
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class ModuleLevelFilter(logging.Filter):
+    """Drops records below the level of their module in `levels` ({module: level}), or below `default`."""
+
+    def __init__(self, levels, default=logging.INFO):
+        super().__init__()
+        self.levels = {module: logging.getLevelName(level) if isinstance(level, str) else level
+                       for module, level in levels.items()}
+        self.default = default
+
+    def filter(self, record):
+        module = record.module if record.name == 'root' else record.name
+        return record.levelno >= self.levels.get(module, self.default)
+
+
+class SampleFilter(logging.Filter):
+    """Passes one in N of the INFO-or-lower messages starting with each prefix in `samples` ({prefix: N})."""
+
+    def __init__(self, samples):
+        super().__init__()
+        self.samples = dict(samples)
+        self.counts = dict.fromkeys(self.samples, 0)
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not isinstance(record.msg, str):
+            return True
+        for prefix, every in self.samples.items():
+            if record.msg.startswith(prefix):
+                count = self.counts[prefix]
+                self.counts[prefix] = count + 1
+                if count % every:
+                    return False
+                record.sample = every
+                return True
+        return True
+
+
+class _QueueHandler(QueueHandler):
+    """
+    Queues a copy of the record with its message formatted and its traceback
+    as text (exc_text), so each handler can lay them out its own way.
+    """
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _traceback.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_traceback = logging.Formatter()
+
+
+class _QueueListener(QueueListener):
+    """A QueueListener whose stop() can be called again (by the client, then at exit)."""
+
+    def stop(self):
+        if self._thread is not None:
+            super().stop()
+
+
+class DailyRotatingFileHandler(RotatingFileHandler):
+    """A RotatingFileHandler that also rolls over at midnight, so every file covers at most a day."""
+
+    def __init__(self, filename, maxBytes=0, backupCount=0, encoding='utf-8'):
+        super().__init__(filename, maxBytes=maxBytes, backupCount=backupCount, encoding=encoding, delay=True)
+        self.rollover_at = self._next_midnight()
+
+    @staticmethod
+    def _next_midnight(now=None):
+        tomorrow = datetime.fromtimestamp(now or time.time()).date().toordinal() + 1
+        return datetime.fromordinal(tomorrow).timestamp()
+
+    def shouldRollover(self, record):
+        if record.created >= self.rollover_at:
+            return True
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        super().doRollover()
+        self.rollover_at = self._next_midnight()
+
+
+def setup_logging(path=LOG_PATH, level=logging.INFO, module_levels=LOG_MODULE_LEVELS, samples=LOG_SAMPLES,
+                  console=True, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS):
+    """
+    Routes every log record through a queue to the terminal (if `console`) and
+    to JSON lines in `path` (unless it is None). Returns the running
+    QueueListener; it is also stopped, flushing what is queued, at exit.
+    """
+    handlers = []
+    if console:
+        stream = logging.StreamHandler(sys.stderr)
+        stream.setFormatter(logging.Formatter(TEXT_FORMAT, DATE_FORMAT))
+        handlers.append(stream)
+    if path is not None:
+        path = Path(path)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = DailyRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups)
+        except OSError as e:
+            print(f"Cannot write the log file '{path}': {e}", file=sys.stderr)
+        else:
+            handler.setFormatter(JsonFormatter())
+            handlers.append(handler)
+
+    records = queue.SimpleQueue()
+    producer = _QueueHandler(records)
+    levels = ModuleLevelFilter(module_levels, default=level)
+    producer.addFilter(levels)
+    if samples:
+        producer.addFilter(SampleFilter(samples))
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(producer)
+    # The root level lets through whatever some module wants; the filter does the rest.
+    root.setLevel(min([level, *levels.levels.values()]))
+
+    listener = _QueueListener(records, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
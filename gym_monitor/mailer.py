@@ -0,0 +1,226 @@
+"""
+Email delivery for slot alerts.
+
+SmtpSession keeps one authenticated SMTP connection open between messages and
+reconnects when the server dropped it. Mailer collects the alerts raised within
+`digest_window` seconds (normally one poll cycle) into a single digest email and
+delivers the digests in order from a queue, backing off after failures instead
+of giving up on email. A digest the server rejects for good (a refused
+recipient, any other 5xx) is logged and dropped, so it cannot hold up the
+digests behind it.
+"""
+import asyncio
+import logging
+import random
+import smtplib
+import time
+from collections import deque
+from email.header import Header
+from email.mime.text import MIMEText
+from email.utils import formataddr
+
+from .config import URL
+from .metrics import metrics
+from .notifier import describe_slot
+
+
+def uses_ssl(config):
+    """Implicit TLS (SMTP_SSL) on any port unless `smtp_ssl: false` is set."""
+    return bool(config.get('smtp_ssl', True))
+
+
+class SmtpSession:
+    """
+    A reusable SMTP connection. send() is blocking and must only be called from
+    one thread at a time. `timings` holds the duration in seconds of the last
+    connect, login and send; all of them also go to gym_monitor.metrics.
+    """
+
+    def __init__(self, config, timeout=15, idle_check_seconds=30):
+        self.config = config
+        self.timeout = timeout
+        self.idle_check_seconds = idle_check_seconds
+        self.timings = {}
+        self._conn = None
+        self._last_used = 0.0
+
+    def connect(self):
+        cfg = self.config
+        start = time.perf_counter()
+        if uses_ssl(cfg):
+            conn = smtplib.SMTP_SSL(cfg['smtp_server'], cfg['smtp_port'], timeout=self.timeout)
+        else:
+            conn = smtplib.SMTP(cfg['smtp_server'], cfg['smtp_port'], timeout=self.timeout)
+            if cfg.get('smtp_starttls'):
+                conn.starttls()
+        self.timings['connect'] = time.perf_counter() - start
+        metrics.observe('smtp.connect', self.timings['connect'])
+        try:
+            if cfg.get('sender_password'):
+                start = time.perf_counter()
+                conn.login(cfg['sender_email'], cfg['sender_password'])
+                self.timings['login'] = time.perf_counter() - start
+                metrics.observe('smtp.login', self.timings['login'])
+        except Exception:
+            conn.close()
+            raise
+        self._conn = conn
+        self._last_used = time.monotonic()
+        logging.info(f"SMTP connection to {cfg['smtp_server']}:{cfg['smtp_port']} established.")
+
+    def _is_alive(self):
+        """Sends NOOP if the connection has been idle long enough for the server to drop it."""
+        if time.monotonic() - self._last_used < self.idle_check_seconds:
+            return True
+        try:
+            return self._conn.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def send(self, message, recipient=None):
+        cfg = self.config
+        recipients = [recipient or cfg['recipient_email']]
+        if self._conn is not None and not self._is_alive():
+            self.close()
+        if self._conn is None:
+            self.connect()
+        start = time.perf_counter()
+        try:
+            self._conn.sendmail(cfg['sender_email'], recipients, message.as_string())
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server closed the connection since our last check; retry once on a new one.
+            self.close()
+            self.connect()
+            start = time.perf_counter()
+            self._conn.sendmail(cfg['sender_email'], recipients, message.as_string())
+        self.timings['send'] = time.perf_counter() - start
+        metrics.observe('smtp.send', self.timings['send'])
+        self._last_used = time.monotonic()
+
+    def close(self):
+        if self._conn is None:
+            return
+        try:
+            self._conn.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+        finally:
+            self._conn.close()
+            self._conn = None
+
+
+def is_permanent(error):
+    """
+    True for an SMTP error that retrying the same message cannot fix. A failed
+    login is not one: it is a setting that fails every digest until fixed.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def build_digest(config, slot_ids, url=URL, recipient=None):
+    """One email listing every slot in `slot_ids`, to `recipient` (default: the configured one)."""
+    details = [describe_slot(slot_id) for slot_id in slot_ids]
+    if len(details) == 1:
+        subject = f'HKU Gym Slot Available: {details[0]}'
+        body = f'An appointment slot is now available:\n\n{details[0]}'
+    else:
+        subject = f'HKU Gym: {len(details)} slots available'
+        body = 'These appointment slots are now available:\n\n' + '\n'.join(f'- {d}' for d in details)
+    message = MIMEText(f'{body}\n\nPlease check the website to book: {url}', 'plain', 'utf-8')
+    message['From'] = formataddr(('HKU Gym Monitor', config['sender_email']), 'utf-8')
+    message['To'] = formataddr(('Recipient', recipient or config['recipient_email']), 'utf-8')
+    message['Subject'] = Header(subject, 'utf-8')
+    return message
+
+
+class Mailer:
+    """
+    Lives on the engine's event loop. add() may only be called on that loop;
+    run() is the delivery task. `offload` runs a blocking call off the loop and
+    is awaited; every SMTP call goes through it, closing the session included. on_failure() is called once each time delivery has failed
+    `report_after` times in a row; queued digests are kept and retried.
+
+    Digests are collected per recipient, so one Mailer and one SMTP session
+    serve every subscriber of the server mode.
+    """
+
+    def __init__(self, config, offload, url=URL, digest_window=1.0, report_after=3,
+                 max_queued=20, backoff_base=2.0, backoff_max=300.0, on_failure=None):
+        self.config = config
+        self.session = SmtpSession(config)
+        self.url = url
+        self.digest_window = digest_window
+        self.report_after = report_after
+        self.max_queued = max_queued
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.on_failure = on_failure
+        self._offload = offload
+        self._pending = {}      # recipient (None: the configured one) -> slot ids
+        self._flush_handle = None
+        self._outbox = deque()
+        self._outbox_ready = asyncio.Event()
+        self.failures = 0
+
+    @property
+    def recipient(self):
+        return self.config.get('recipient_email')
+
+    def add(self, slot_id, recipient=None):
+        """Adds a slot to the digest being collected for `recipient`."""
+        pending = self._pending.setdefault(recipient, [])
+        if slot_id in pending:
+            return
+        pending.append(slot_id)
+        if self._flush_handle is None:
+            self._flush_handle = asyncio.get_running_loop().call_later(self.digest_window, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        for recipient, slot_ids in pending.items():
+            self._outbox.append((build_digest(self.config, slot_ids, self.url, recipient), slot_ids, recipient))
+        while len(self._outbox) > self.max_queued:
+            _, dropped, _ = self._outbox.popleft()
+            logging.warning(f"Email queue full, dropping the digest for {len(dropped)} slot(s).")
+        self._outbox_ready.set()
+
+    def backoff_delay(self, failures):
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (failures - 1))
+        return random.uniform(delay / 2, delay)
+
+    async def run(self):
+        try:
+            while True:
+                await self._outbox_ready.wait()
+                self._outbox_ready.clear()
+                while self._outbox:
+                    message, slot_ids, recipient = self._outbox[0]
+                    try:
+                        await self._offload(self.session.send, message, recipient)
+                    except Exception as e:
+                        if is_permanent(e):
+                            self._outbox.popleft()
+                            metrics.inc('smtp.rejected')
+                            logging.error(f"Email to {recipient or self.recipient} for {', '.join(slot_ids)} "
+                                          f"was rejected ({e}); dropping it.")
+                            continue
+                        self.failures += 1
+                        delay = self.backoff_delay(self.failures)
+                        logging.error(f"Email attempt {self.failures} for {len(slot_ids)} slot(s) failed: {e}. "
+                                      f"Retrying in {delay:.1f}s.")
+                        await self._offload(self.session.close)
+                        if self.failures == self.report_after and self.on_failure:
+                            self.on_failure()
+                        await asyncio.sleep(delay)
+                        continue
+                    self._outbox.popleft()
+                    self.failures = 0
+                    logging.info(f"Sent alert email for {len(slot_ids)} slot(s): {', '.join(slot_ids)}")
+        finally:
+            # QUIT can hang as long as the send did; never on the loop.
+            await self._offload(self.session.close)
@@ -0,0 +1,165 @@
+"""
+Timings and counters of the hot path, cheap enough to leave on.
+
+Each stage of a cycle records how long it took: the fetch and its parts
+(fetch.connect and fetch.tls for new connections, fetch.headers until
+the response headers, fetch.transfer for the body), parse, snapshot, history,
+diff, the whole cycle, the GUI update, and notification delivery per channel
+kind and SMTP. A stage keeps its last WINDOW samples in a ring buffer, so
+recording is a few list operations and percentiles reflect recent behaviour;
+they are only computed when somebody asks.
+
+StartupTimer reports how long the app took to become useful (imports, first
+window, engine, first data), so a slow restart can be told apart from a slow
+poll.
+
+The numbers are served in the Prometheus text format by api.MetricsServer (the
+GUI and `python -m gym_monitor --metrics-port`) and by the API's GET /metrics
+in server mode, and summarized in the GUI's status bar.
+"""
+import logging
+import threading
+import time
+from array import array
+from collections import Counter
+from contextlib import contextmanager
+
+WINDOW = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class RollingHistogram:
+    """The last `size` samples of one stage, plus the count and sum of all of them."""
+
+    __slots__ = ('size', 'count', 'total', '_samples', '_next')
+
+    def __init__(self, size=WINDOW):
+        self.size = size
+        self.count = 0
+        self.total = 0.0
+        self._samples = array('d')
+        self._next = 0
+
+    def observe(self, value):
+        if len(self._samples) < self.size:
+            self._samples.append(value)
+        else:
+            self._samples[self._next] = value
+            self._next = (self._next + 1) % self.size
+        self.count += 1
+        self.total += value
+
+    def quantiles(self, quantiles=QUANTILES):
+        if not self._samples:
+            return [None] * len(quantiles)
+        ordered = sorted(self._samples)
+        return [ordered[min(len(ordered) - 1, int(q * len(ordered)))] for q in quantiles]
+
+
+class Metrics:
+    """Stage histograms and counters. Thread-safe; every thread of the app records into the same instance."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.lock = threading.Lock()
+        self._histograms = {}
+        self.counters = Counter()
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None:
+                histogram = self._histograms[stage] = RollingHistogram(self.window)
+            histogram.observe(seconds)
+
+    def inc(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def quantile(self, stage, q, min_samples=1):
+        """The q-quantile of the recent samples of `stage`, or None while it has fewer than `min_samples`."""
+        with self.lock:
+            histogram = self._histograms.get(stage)
+            if histogram is None or min(histogram.count, histogram.size) < min_samples:
+                return None
+            return histogram.quantiles((q,))[0]
+
+    @contextmanager
+    def time(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def summary(self):
+        """{stage: {"count", "sum", "p50", "p95", "p99"}} with times in seconds."""
+        with self.lock:
+            histograms = [(stage, h.count, h.total, h.quantiles()) for stage, h in self._histograms.items()]
+        return {stage: {"count": count, "sum": total,
+                        **{f"p{round(q * 100)}": value for q, value in zip(QUANTILES, values)}}
+                for stage, count, total, values in sorted(histograms)}
+
+    def brief(self, stages=('fetch', 'parse', 'diff', 'gui_update')):
+        """A one-line p50/p95 summary in milliseconds for a status bar."""
+        summary = self.summary()
+        parts = []
+        for stage in stages:
+            entry = summary.get(stage)
+            if entry and entry["p50"] is not None:
+                parts.append(f"{stage} {entry['p50'] * 1000:.1f}/{entry['p95'] * 1000:.1f}")
+        return f"p50/p95 ms: {'  '.join(parts)}" if parts else ''
+
+    def prometheus(self, *counters):
+        """The Prometheus text exposition of the stages, our counters and any extra Counter-like dicts."""
+        lines = [
+            f"# HELP gym_monitor_stage_seconds Duration of each monitoring stage (quantiles over the last {self.window}).",
+            "# TYPE gym_monitor_stage_seconds summary",
+        ]
+        for stage, entry in self.summary().items():
+            label = _label(stage)
+            for q in QUANTILES:
+                value = entry[f"p{round(q * 100)}"]
+                if value is not None:
+                    lines.append(f'gym_monitor_stage_seconds{{stage="{label}",quantile="{q}"}} {value:.6g}')
+            lines.append(f'gym_monitor_stage_seconds_sum{{stage="{label}"}} {entry["sum"]:.6g}')
+            lines.append(f'gym_monitor_stage_seconds_count{{stage="{label}"}} {entry["count"]}')
+        with self.lock:
+            merged = Counter(self.counters)
+        for extra in counters:
+            merged.update(extra)
+        lines += ["# HELP gym_monitor_events_total Events counted by the monitor.",
+                  "# TYPE gym_monitor_events_total counter"]
+        lines += [f'gym_monitor_events_total{{event="{_label(name)}"}} {value}' for name, value in sorted(merged.items())]
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# The process-wide instance; the transport, engine, notifier and GUI all record here.
+metrics = Metrics()
+
+
+class StartupTimer:
+    """
+    Seconds from `started` (a time.perf_counter() taken before the imports) to
+    each startup phase. Phases are also recorded as startup.<phase> stages.
+    """
+
+    def __init__(self, started=None):
+        self.started = time.perf_counter() if started is None else started
+        self.phases = {}
+
+    def mark(self, phase):
+        if phase in self.phases:
+            return self.phases[phase]
+        elapsed = self.phases[phase] = time.perf_counter() - self.started
+        metrics.observe(f'startup.{phase}', elapsed)
+        return elapsed
+
+    def report(self):
+        """Logs every phase so far, e.g. "Startup: imports 85 ms, engine 240 ms, first_data 610 ms"."""
+        logging.info("Startup: " + ', '.join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases.items()))
+
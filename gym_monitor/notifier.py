@@ -0,0 +1,243 @@
+"""
+Delivery of slot alerts outside the GUI.
+
+NotificationDispatcher lives on the engine's event loop and gives every channel
+(desktop, email, webhook) its own queue and worker tasks, so a slow channel
+never holds up the others or the GUI popup. Each channel drops repeats of the
+same slot within its dedup window, is rate limited with a token bucket, and
+records how long alerts took from dispatch to delivery (also kept per channel
+kind in gym_monitor.metrics as notify.desktop, notify.email, notify.webhook).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime
+
+from .metrics import metrics
+
+
+def describe_slot(slot_id):
+    return slot_id.replace('|', ' - ')
+
+
+def send_desktop_notification(slot_id):
+    """Shows a system notification through plyer. Returns True on success."""
+    message = f"A spot has opened up for:\n\n{describe_slot(slot_id)}"
+    try:
+        from plyer import notification
+        notification.notify(
+            title='Slot Available!',
+            message=message,
+            app_name='HKU Fitness Monitor',
+            timeout=15  # 通知显示 15 秒
+        )
+        logging.info(f"System notification sent for {slot_id}")
+        return True
+    except Exception as e:
+        logging.warning(f"Failed to send system notification: {e}")
+        return False
+
+
+class Alert:
+    __slots__ = ('slot_id', 'status', 'created', 'detected_at')
+
+    def __init__(self, slot_id, status=None):
+        self.slot_id = slot_id
+        self.status = status
+        self.created = time.monotonic()
+        self.detected_at = datetime.now()
+
+    def payload(self):
+        venue, date, time_slot = (self.slot_id.split('|') + ['', ''])[:3]
+        return {"slot_id": self.slot_id, "venue": venue, "date": date, "time": time_slot,
+                "status": self.status, "detected_at": self.detected_at.isoformat(timespec='seconds')}
+
+
+class Channel:
+    """
+    Base class of a notification channel. Subclasses implement deliver(), a
+    coroutine that raises on failure; blocking work should go through
+    self.offload. `rate` alerts per `per` seconds are allowed; a repeat of a
+    slot within `dedup_seconds` is dropped.
+    """
+    name = 'channel'
+
+    def __init__(self, workers=1, rate=10, per=60.0, dedup_seconds=60.0, max_queued=100, attempts=2):
+        self.workers = workers
+        self.rate = rate
+        self.per = per
+        self.dedup_seconds = dedup_seconds
+        self.max_queued = max_queued
+        self.attempts = attempts
+        self.offload = None     # set by the dispatcher
+
+    async def deliver(self, alert):
+        raise NotImplementedError
+
+
+class DesktopChannel(Channel):
+    name = 'desktop'
+
+    async def deliver(self, alert):
+        if not await self.offload(send_desktop_notification, alert.slot_id):
+            raise RuntimeError("plyer could not show the notification")
+
+
+class EmailChannel(Channel):
+    """
+    Hands alerts to the Mailer, which batches them into digests and retries on
+    its own. `recipient` overrides the configured address.
+    """
+    name = 'email'
+
+    def __init__(self, mailer, recipient=None, **kwargs):
+        kwargs.setdefault('rate', 60)
+        super().__init__(**kwargs)
+        self.mailer = mailer
+        self.recipient = recipient
+        if recipient:
+            self.name = f'email {recipient}'
+
+    async def deliver(self, alert):
+        self.mailer.add(alert.slot_id, self.recipient)
+
+
+class WebhookChannel(Channel):
+    """POSTs the alert as JSON to `url` using the shared HTTP client's session."""
+    name = 'webhook'
+
+    def __init__(self, url, client, **kwargs):
+        kwargs.setdefault('workers', 2)
+        super().__init__(**kwargs)
+        self.url = url
+        self.client = client
+        self.name = f'webhook {url}'
+
+    def _post(self, payload):
+        response = self.client.session.post(self.url, json=payload, timeout=self.client.timeout)
+        response.raise_for_status()
+
+    async def deliver(self, alert):
+        await self.offload(self._post, alert.payload())
+
+
+class _ChannelRunner:
+    """Queue, workers, limits and metrics of one channel."""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = asyncio.Queue(channel.max_queued)
+        self.tokens = float(channel.rate)
+        self.refilled = time.monotonic()
+        self.last_sent = {}     # slot id -> monotonic time it was last accepted
+        self.latencies = deque(maxlen=500)
+        self.counts = {'delivered': 0, 'failed': 0, 'deduplicated': 0, 'dropped': 0}
+        self.tasks = []
+
+    def accept(self, alert):
+        now = alert.created
+        last = self.last_sent.get(alert.slot_id)
+        if last is not None and now - last < self.channel.dedup_seconds:
+            self.counts['deduplicated'] += 1
+            return
+        if len(self.last_sent) > 1000:
+            horizon = now - self.channel.dedup_seconds
+            self.last_sent = {k: t for k, t in self.last_sent.items() if t >= horizon}
+        try:
+            self.queue.put_nowait(alert)
+        except asyncio.QueueFull:
+            self.counts['dropped'] += 1
+            logging.warning(f"Notification queue of {self.channel.name} is full, dropping {alert.slot_id}")
+            return
+        self.last_sent[alert.slot_id] = now
+
+    async def _take_token(self):
+        channel = self.channel
+        while True:
+            now = time.monotonic()
+            self.tokens = min(channel.rate, self.tokens + (now - self.refilled) * channel.rate / channel.per)
+            self.refilled = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) * channel.per / channel.rate)
+
+    async def work(self):
+        channel = self.channel
+        while True:
+            alert = await self.queue.get()
+            try:
+                await self._take_token()
+                for attempt in range(channel.attempts):
+                    try:
+                        await channel.deliver(alert)
+                        break
+                    except Exception as e:
+                        logging.warning(f"{channel.name} notification for {alert.slot_id} failed "
+                                        f"(attempt {attempt + 1}/{channel.attempts}): {e}")
+                        if attempt < channel.attempts - 1:
+                            await asyncio.sleep(0.5 * (attempt + 1))
+                else:
+                    self.counts['failed'] += 1
+                    continue
+                self.counts['delivered'] += 1
+                latency = time.monotonic() - alert.created
+                self.latencies.append(latency)
+                metrics.observe(f'notify.{type(channel).name}', latency)
+            finally:
+                self.queue.task_done()
+
+    def stats(self):
+        stats = dict(self.counts, queued=self.queue.qsize())
+        if self.latencies:
+            ordered = sorted(self.latencies)
+            stats['latency_p50_ms'] = round(ordered[len(ordered) // 2] * 1000, 1)
+            stats['latency_max_ms'] = round(ordered[-1] * 1000, 1)
+        return stats
+
+
+class NotificationDispatcher:
+    """
+    Fans alerts out to the registered channels, which are known by name. All
+    methods run on the engine loop.
+    """
+
+    def __init__(self, offload):
+        self.offload = offload
+        self._runners = {}
+
+    def add_channel(self, channel):
+        if channel.name in self._runners:
+            return
+        channel.offload = self.offload
+        runner = _ChannelRunner(channel)
+        loop = asyncio.get_running_loop()
+        runner.tasks = [loop.create_task(runner.work()) for _ in range(channel.workers)]
+        self._runners[channel.name] = runner
+        logging.info(f"Notification channel added: {channel.name}")
+
+    def remove_channel(self, name):
+        """Stops a channel's workers; alerts still queued for it are dropped."""
+        runner = self._runners.pop(name, None)
+        if runner is None:
+            return
+        for task in runner.tasks:
+            task.cancel()
+        logging.info(f"Notification channel removed: {name}")
+
+    def dispatch(self, slot_id, status=None, channels=None):
+        """Sends the alert to the channels named in `channels`, or to all of them."""
+        alert = Alert(slot_id, status)
+        if channels is None:
+            for runner in self._runners.values():
+                runner.accept(alert)
+            return
+        for name in channels:
+            runner = self._runners.get(name)
+            if runner is not None:
+                runner.accept(alert)
+
+    def stats(self):
+        """Per-channel counters and delivery latency."""
+        return {name: runner.stats() for name, runner in self._runners.items()}
@@ -0,0 +1,276 @@
+"""
+Turns the booking page into per-venue slot records.
+
+The page is large but we only need the two venue sections, so instead of
+building a full BeautifulSoup tree we locate each section with a regex and walk
+its <div> tags with a small tokenizer. parse_schedule_soup() is the original
+BeautifulSoup implementation, kept as the reference for bench/bench_parser.py.
+"""
+import html as html_lib
+import re
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+
+from .config import VENUES
+from .slots import Status, free_spots
+
+# Every <div ...> or </div> tag. Only divs change the nesting we care about, so
+# unclosed <p>/<li> or void tags elsewhere on the page cannot confuse the walk.
+# Comments and <script>/<style> bodies are matched as a whole ("skip") so that
+# markup inside them is not taken for tags, as html.parser does.
+_RAW_TEXT = r'!--.*?-->|(?P<raw>script|style)\b[^>]*>.*?</(?P=raw)\s*>'
+_DIV_TAG_RE = re.compile(r'<(?:(?P<skip>%s)|(?P<close>/?)div\b(?P<attrs>[^>]*)>)' % _RAW_TEXT, re.I | re.S)
+_CLASS_RE = re.compile(r'''(?<![\w-])class\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s"'>]+))''', re.I)
+_TAG_OR_COMMENT_RE = re.compile(r'<(?:%s|[^>]*>)' % _RAW_TEXT, re.I | re.S)
+_section_re_cache = {}
+_time_range_cache = {}
+
+# Formats tried for the date header once any "(Mon)" suffix is removed.
+_DATE_FORMATS = ("%d %b %Y", "%d %B %Y", "%Y-%m-%d", "%d/%m/%Y", "%d-%m-%Y", "%a, %d %b %Y",
+                 "%A, %d %B %Y", "%b %d, %Y", "%B %d, %Y", "%A %d %B %Y", "%a %d %b %Y")
+_YEARLESS_FORMATS = ("%d %b", "%d %B", "%b %d", "%B %d", "%d/%m", "%a, %d %b", "%A, %d %B")
+_PARENS_RE = re.compile(r'\s*\([^)]*\)\s*')
+_TIME_RANGE_RE = re.compile(r'(\d{1,2})[:.](\d{2})\s*([AaPp][Mm])?\s*(?:-|–|to)\s*(\d{1,2})[:.](\d{2})\s*([AaPp][Mm])?')
+
+
+def make_slot_id(venue_name, date, time_slot):
+    return f"{venue_name}|{date}|{time_slot}"
+
+
+def parse_date(text, today=None):
+    """
+    Parses a date header such as "19 Oct 2026 (Mon)" or "2026-10-19". Headers
+    without a year get the year that puts them closest to `today`. Returns a
+    datetime.date, or None if the text is not a recognised date.
+    """
+    cleaned = _PARENS_RE.sub(' ', text).strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(cleaned, fmt).date()
+        except ValueError:
+            pass
+    today = today or date.today()
+    for fmt in _YEARLESS_FORMATS:
+        try:
+            parsed = datetime.strptime(f"{cleaned} {today.year}", f"{fmt} %Y").date()
+        except ValueError:
+            continue
+        if (parsed - today).days > 183:
+            parsed = parsed.replace(year=today.year - 1)
+        elif (today - parsed).days > 183:
+            parsed = parsed.replace(year=today.year + 1)
+        return parsed
+    return None
+
+
+def _to_minutes(hours, minutes, meridiem):
+    hours = int(hours) % 24
+    if meridiem:
+        hours = hours % 12 + (12 if meridiem.lower() == 'pm' else 0)
+    return hours * 60 + int(minutes)
+
+
+def parse_time_range(text):
+    """
+    "07:00 - 08:30" or "7:00pm-8:00pm" -> (start, end) in minutes since
+    midnight, or None. A lone am/pm on the end time applies to both ends.
+    """
+    m = _TIME_RANGE_RE.search(text)
+    if not m:
+        return None
+    start_h, start_m, start_ap, end_h, end_m, end_ap = m.groups()
+    start = _to_minutes(start_h, start_m, start_ap or end_ap)
+    end = _to_minutes(end_h, end_m, end_ap or start_ap)
+    if start_ap is None and end_ap and start > end:
+        start = _to_minutes(start_h, start_m, 'am')
+    return start, end
+
+
+def slot_times(day, time_slot):
+    """
+    (start, end) datetimes of a slot on `day` (a date, or None) with the time
+    range text `time_slot`, or (None, None) if either is unparsable.
+    """
+    if day is None:
+        return None, None
+    times = _time_range_cache.get(time_slot, False)
+    if times is False:
+        times = _time_range_cache[time_slot] = parse_time_range(time_slot)
+    if times is None:
+        return None, None
+    start, end = times
+    midnight = datetime.combine(day, time())
+    # A range such as "23:00 - 00:30" ends the next day.
+    return (midnight + timedelta(minutes=start),
+            midnight + timedelta(minutes=end + (1440 if end <= start else 0)))
+
+
+def _slot(venue_name, date_text, day, time_slot, status):
+    starts, ends = slot_times(day, time_slot)
+    return {"id": make_slot_id(venue_name, date_text, time_slot), "date": date_text, "time": time_slot,
+            "status": status, "kind": Status.of(status), "spots": free_spots(status),
+            "starts": starts, "ends": ends}
+
+
+def slot_record(venue_name, date_text, time_slot, status):
+    """The record parse_section() produces for one slot, e.g. to rebuild a saved page."""
+    return _slot(venue_name, date_text, parse_date(date_text), time_slot, status)
+
+
+def _section_start_re(div_id):
+    pattern = _section_re_cache.get(div_id)
+    if pattern is None:
+        # Not data-id= or any other attribute ending in "id".
+        pattern = re.compile(r'''<div\b[^>]*(?<![\w-])id\s*=\s*["']?%s["'\s>/]''' % re.escape(div_id), re.I)
+        _section_re_cache[div_id] = pattern
+    return pattern
+
+
+def _classes(attrs):
+    m = _CLASS_RE.search(attrs)
+    if not m:
+        return ()
+    return (m.group(1) or m.group(2) or m.group(3) or '').split()
+
+
+def _text(fragment):
+    """Same result as BeautifulSoup's get_text(strip=True) for a simple fragment."""
+    if '<' not in fragment and '&' not in fragment:
+        return fragment.strip()
+    parts = (html_lib.unescape(part).strip() for part in _TAG_OR_COMMENT_RE.sub('\0', fragment).split('\0'))
+    return ''.join(part for part in parts if part)
+
+
+def _section_start(html, div_id):
+    """Index just past the opening tag of <div id=div_id>, or -1."""
+    m = _section_start_re(div_id).search(html)
+    if not m:
+        return -1
+    return html.index('>', m.start()) + 1
+
+
+def find_section(html, div_id):
+    """Returns the inner HTML of <div id=div_id>, or None if the page has no such section."""
+    start = _section_start(html, div_id)
+    if start < 0:
+        return None
+    depth = 1
+    for tag in _DIV_TAG_RE.finditer(html, start):
+        if tag['skip']:
+            continue
+        if tag['close']:
+            depth -= 1
+            if depth == 0:
+                return html[start:tag.start()]
+        elif not tag['attrs'].endswith('/'):
+            depth += 1
+    return html[start:]
+
+
+def parse_section(venue_name, html, start=0):
+    """
+    Walks the direct children of a venue section beginning at `start` and stops
+    at the section's closing tag: "py-2 grey" divs are date headers,
+    "border-top" divs hold a .row whose first two .col divs, nested ones
+    included, in the order they open, are the time and the status.
+    """
+    slots = []
+    current_date = "Unknown Date"
+    current_day = None
+    depth = 0
+    child_kind = None       # 'date' or 'slot' for the child being walked
+    child_start = 0
+    row_depth = None        # depth of the .row inside the current slot child
+    row_seen = False
+    open_cols = []          # (depth, index in cols, start) of the .col divs not closed yet
+    cols = []
+    for tag in _DIV_TAG_RE.finditer(html, start):
+        if tag['skip']:
+            continue
+        if tag['close']:
+            if open_cols and open_cols[-1][0] == depth:
+                _, index, col_start = open_cols.pop()
+                cols[index] = _text(html[col_start:tag.start()])
+            elif depth == row_depth:
+                row_depth = None
+            depth -= 1
+            if depth == 0:
+                if child_kind == 'date':
+                    current_date = _text(html[child_start:tag.start()])
+                    current_day = parse_date(current_date)
+                elif child_kind == 'slot':
+                    # A .col left open ends with its slot, as in html.parser.
+                    for _, index, col_start in open_cols:
+                        cols[index] = _text(html[col_start:tag.start()])
+                    if len(cols) >= 2:
+                        slots.append(_slot(venue_name, current_date, current_day, cols[0], cols[1]))
+                child_kind = None
+            elif depth < 0:
+                break
+            continue
+        attrs = tag['attrs']
+        if attrs.endswith('/'):
+            continue
+        depth += 1
+        if depth == 1:
+            classes = _classes(attrs)
+            if 'py-2' in classes and 'grey' in classes:
+                child_kind = 'date'
+            elif 'border-top' in classes:
+                child_kind = 'slot'
+            else:
+                child_kind = None
+            child_start = tag.end()
+            row_depth, row_seen, open_cols, cols = None, False, [], []
+        elif child_kind == 'slot':
+            if row_depth is not None:
+                if 'col' in _classes(attrs):
+                    open_cols.append((depth, len(cols), tag.end()))
+                    cols.append('')
+            elif not row_seen and 'row' in _classes(attrs):
+                row_depth = depth
+                row_seen = True
+    return slots
+
+
+def parse_schedule(html, venues=VENUES):
+    """
+    Returns {venue name: [slot, ...]} where each slot is a dict with
+    "id", "date", "time", "status", "kind" (the status as a slots.Status),
+    "spots" (free places, see slots.free_spots) and "starts"/"ends" (datetimes,
+    or None when the date or time is unparsable), in page order.
+    """
+    parsed_data = defaultdict(list)
+    for name, div_id in venues.items():
+        start = _section_start(html, div_id)
+        if start < 0: continue
+        slots = parse_section(name, html, start)
+        if slots:
+            parsed_data[name] = slots
+    return parsed_data
+
+
+def parse_schedule_soup(html, venues=VENUES):
+    """The original BeautifulSoup tree walk. Slow; used as the reference implementation."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    parsed_data = defaultdict(list)
+    for name, div_id in venues.items():
+        content_div = soup.find('div', id=div_id)
+        if not content_div: continue
+        current_date = "Unknown Date"
+        current_day = None
+        for element in content_div.find_all(recursive=False):
+            if 'py-2' in element.get('class', []) and 'grey' in element.get('class', []):
+                current_date = element.get_text(strip=True)
+                current_day = parse_date(current_date)
+            elif 'border-top' in element.get('class', []):
+                row = element.find('div', class_='row')
+                if row:
+                    cols = row.find_all('div', class_='col')
+                    if len(cols) >= 2:
+                        time_slot = cols[0].get_text(strip=True)
+                        status = cols[1].get_text(strip=True)
+                        parsed_data[name].append(_slot(name, current_date, current_day, time_slot, status))
+    return parsed_data
@@ -0,0 +1,241 @@
+"""
+Watch rules: standing conditions instead of hand-picked rows.
+
+A rule is a list of key=value terms, all of which must hold:
+
+    venue="CSE Active" days=tue,thu time=18:00-      any CSE Active slot on Tuesday or Thursday from 18:00
+    days=mon-fri time=07:00-09:00 min=3              weekday mornings with at least 3 places
+    dates=2026-10-20..2026-10-31                     anything in that period
+
+    venue   venue names, comma separated (case-insensitive)
+    days    mon..sun, ranges like mon-fri, "weekdays" or "weekends"
+    time    START-END on the slot's start time; either side may be left out
+    dates   a date or FROM..TO; either side may be left out
+    min     free places, read from the status text ("3 spaces left"); default 1
+
+A rule fires when a slot starts to satisfy it: it was full, had too few places
+or was not on the page yet, and now has enough. Rules are compiled into an
+index by (venue, weekday, hour), so a poll costs a lookup per changed slot
+rather than a scan of every rule against every slot.
+"""
+import itertools
+import logging
+import os
+import shlex
+import threading
+from collections import defaultdict
+
+from .parser import parse_date
+from .scheduler import parse_clock
+from .slots import UNKNOWN_SPOTS, changed_keys
+
+_DAY_NAMES = ('mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun')
+_DAY_GROUPS = {'weekdays': range(0, 5), 'weekends': range(5, 7), 'all': range(7)}
+_last_rule_id = 0
+_rule_id_lock = threading.Lock()
+
+
+class RuleError(ValueError):
+    """Raised for a rule that cannot be parsed."""
+
+
+def _next_rule_id(saved=None):
+    """A new rule id, or `saved` (the id of a rule read back from a file), which is then never handed out."""
+    global _last_rule_id
+    with _rule_id_lock:
+        if saved is None:
+            _last_rule_id += 1
+            return _last_rule_id
+        _last_rule_id = max(_last_rule_id, saved)
+        return saved
+
+
+def _parse_day(text):
+    try:
+        return _DAY_NAMES.index(text[:3].lower())
+    except ValueError:
+        raise RuleError(f"Unknown day {text!r}, expected mon..sun")
+
+
+def _parse_days(value):
+    days = set()
+    for part in value.split(','):
+        part = part.strip().lower()
+        if part in _DAY_GROUPS:
+            days.update(_DAY_GROUPS[part])
+        elif '-' in part:
+            first, last = (_parse_day(p) for p in part.split('-', 1))
+            days.update(range(first, last + 1) if first <= last else [*range(first, 7), *range(0, last + 1)])
+        elif part:
+            days.add(_parse_day(part))
+    return frozenset(days)
+
+
+def _parse_minutes(text):
+    try:
+        return parse_clock(text) // 60
+    except ValueError:
+        raise RuleError(f"Invalid time {text!r}, expected HH:MM")
+
+
+def _parse_rule_date(text):
+    day = parse_date(text)
+    if day is None:
+        raise RuleError(f"Invalid date {text!r}")
+    return day
+
+
+class Rule:
+    """One compiled rule. `owner` is the subscriber it belongs to (None in the GUI and CLI)."""
+
+    __slots__ = ('id', 'text', 'owner', 'venues', 'weekdays', 'start_minute', 'end_minute',
+                 'date_from', 'date_to', 'min_spots')
+
+    def __init__(self, text, owner=None, rule_id=None):
+        self.id = _next_rule_id(rule_id)
+        self.text = text
+        self.owner = owner
+        self.venues = None          # lower-case venue names, None for any
+        self.weekdays = None        # frozenset of 0..6, None for any
+        self.start_minute = 0
+        self.end_minute = 1440
+        self.date_from = None
+        self.date_to = None
+        self.min_spots = 1
+        try:
+            terms = shlex.split(text)
+        except ValueError as e:
+            raise RuleError(f"Invalid rule {text!r}: {e}")
+        for term in terms:
+            key, sep, value = term.partition('=')
+            key = key.lower()
+            if not sep or not value:
+                raise RuleError(f"Expected key=value, got {term!r}")
+            if key in ('venue', 'venues'):
+                self.venues = frozenset(v.strip().lower() for v in value.split(',') if v.strip())
+            elif key in ('day', 'days'):
+                self.weekdays = _parse_days(value)
+            elif key == 'time':
+                start, _, end = value.partition('-')
+                self.start_minute = _parse_minutes(start) if start else 0
+                self.end_minute = _parse_minutes(end) if end else 1440
+            elif key in ('date', 'dates'):
+                first, sep, last = value.partition('..')
+                self.date_from = _parse_rule_date(first) if first else None
+                self.date_to = _parse_rule_date(last) if last else (None if sep else self.date_from)
+            elif key in ('min', 'spots'):
+                try:
+                    self.min_spots = int(value)
+                except ValueError:
+                    raise RuleError(f"Invalid number of places {value!r}")
+                if not 1 <= self.min_spots < UNKNOWN_SPOTS:
+                    raise RuleError(f"min must be between 1 and {UNKNOWN_SPOTS - 1}")
+            else:
+                raise RuleError(f"Unknown rule term {key!r}")
+        if self.start_minute >= self.end_minute:
+            raise RuleError("The time range is empty")
+
+    def __repr__(self):
+        return f"Rule({self.id}: {self.text!r})"
+
+    def index_keys(self):
+        """The (venue, weekday, hour) cells of the index this rule is filed under."""
+        hours = range(self.start_minute // 60, (self.end_minute - 1) // 60 + 1)
+        weekdays = sorted(self.weekdays) if self.weekdays is not None else range(7)
+        venues = sorted(self.venues) if self.venues is not None else [None]
+        return itertools.product(venues, weekdays, hours)
+
+    def satisfied_by(self, spots):
+        """Whether a slot with `spots` free places (see slots.free_spots) has enough."""
+        if spots == UNKNOWN_SPOTS:
+            return self.min_spots == 1
+        return spots >= self.min_spots
+
+    def covers(self, starts):
+        """Whether a slot starting at the datetime `starts` is within the rule's time and dates."""
+        minute = starts.hour * 60 + starts.minute
+        if not self.start_minute <= minute < self.end_minute:
+            return False
+        day = starts.date()
+        return (self.date_from is None or day >= self.date_from) and (self.date_to is None or day <= self.date_to)
+
+    def to_dict(self):
+        return {"id": self.id, "rule": self.text}
+
+
+def load_rules(path):
+    """The rule texts in a file, one per line; blank lines and # comments are skipped."""
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith('#')]
+
+
+def save_rules(path, texts):
+    try:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.writelines(f"{text}\n" for text in texts)
+    except OSError as e:
+        logging.error(f"Could not save the watch rules to '{path}': {e}")
+
+
+class RuleSet:
+    """
+    Every standing rule, indexed by (venue, weekday, hour). Not locked: it is
+    changed and matched on the engine's event loop (see MonitorEngine.add_rule).
+    """
+
+    def __init__(self):
+        self._rules = {}
+        self._index = defaultdict(list)     # (venue or None, weekday, hour) -> rules
+
+    def __len__(self):
+        return len(self._rules)
+
+    def __iter__(self):
+        return iter(list(self._rules.values()))
+
+    def add(self, rule):
+        self._rules[rule.id] = rule
+        for cell in rule.index_keys():
+            self._index[cell].append(rule)
+        return rule
+
+    def remove(self, rule_id):
+        """Removes a rule. Returns it, or None if there was no such rule."""
+        rule = self._rules.pop(rule_id, None)
+        if rule is None:
+            return None
+        for cell in rule.index_keys():
+            rules = self._index[cell]
+            rules.remove(rule)
+            if not rules:
+                del self._index[cell]
+        return rule
+
+    def candidates(self, venue, starts):
+        """Rules filed under the venue, weekday and hour of a slot."""
+        weekday, hour = starts.weekday(), starts.hour
+        return self._index.get((venue.lower(), weekday, hour), []) + self._index.get((None, weekday, hour), [])
+
+    def changes(self, registry, old, new):
+        """
+        Compares two slots.Snapshots and returns {slot id: [rules]} for the slots
+        that started to satisfy a rule. Only the keys whose free places changed
+        are looked at.
+        """
+        fired = {}
+        if not self._rules:
+            return fired
+        old_spots = old.spots
+        for key in changed_keys(old_spots, new.spots):
+            slot = new.records.get(key)
+            if slot is None or slot["starts"] is None:
+                continue
+            before = old_spots[key] if key < len(old_spots) else 0
+            rules = [rule for rule in self.candidates(registry.venue(key), slot["starts"])
+                     if rule.covers(slot["starts"]) and rule.satisfied_by(slot["spots"])
+                     and not rule.satisfied_by(before)]
+            if rules:
+                fired[slot["id"]] = rules
+        return fired
@@ -0,0 +1,132 @@
+"""
+Decides how long to wait between polls.
+
+Peak slots are released 3 days ahead at 12:00, so the default policy polls
+every half second just around noon, every few seconds in the minutes around it,
+slowly overnight and at REFRESH_INTERVAL_SECONDS otherwise. A per-hour request
+budget caps the load on the booking site whatever the windows say.
+"""
+import random
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from .config import REFRESH_INTERVAL_SECONDS, POLL_WINDOWS, MAX_REQUESTS_PER_HOUR
+
+
+def parse_clock(text):
+    """'HH:MM' or 'HH:MM:SS' -> seconds since midnight."""
+    parts = [int(p) for p in text.split(':')]
+    if len(parts) == 2:
+        parts.append(0)
+    hours, minutes, seconds = parts
+    if not (0 <= hours <= 24 and 0 <= minutes < 60 and 0 <= seconds < 60):
+        raise ValueError(f"Invalid time of day: {text!r}")
+    return hours * 3600 + minutes * 60 + seconds
+
+
+class PollWindow:
+    """
+    A daily time range polled every `interval` seconds. `end` may be earlier
+    than `start` for a range that crosses midnight. `weekdays` (0=Monday)
+    restricts the window to some days; it applies to the day the window starts.
+    """
+
+    def __init__(self, start, end, interval, weekdays=None):
+        self.start = parse_clock(start)
+        self.end = parse_clock(end)
+        self.interval = float(interval)
+        self.weekdays = frozenset(weekdays) if weekdays is not None else None
+
+    def __repr__(self):
+        return f"PollWindow({self.start}s-{self.end}s every {self.interval}s)"
+
+    def _runs_on(self, day):
+        return self.weekdays is None or day.weekday() in self.weekdays
+
+    def contains(self, now):
+        seconds = now.hour * 3600 + now.minute * 60 + now.second + now.microsecond / 1e6
+        if self.start <= self.end:
+            return self.start <= seconds < self.end and self._runs_on(now)
+        if seconds >= self.start:
+            return self._runs_on(now)
+        return seconds < self.end and self._runs_on(now - timedelta(days=1))
+
+    def seconds_until_start(self, now):
+        """Seconds until the window next opens (0 if it is open now)."""
+        if self.contains(now):
+            return 0.0
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        for days in range(8):
+            opening = midnight + timedelta(days=days, seconds=self.start)
+            if opening > now and self._runs_on(opening):
+                return (opening - now).total_seconds()
+        return float('inf')
+
+
+def parse_window(spec):
+    """'HH:MM-HH:MM=SECONDS' -> PollWindow, as accepted by the --window option."""
+    try:
+        span, interval = spec.split('=')
+        start, end = span.split('-')
+        return PollWindow(start.strip(), end.strip(), float(interval))
+    except ValueError:
+        raise ValueError(f"Invalid poll window {spec!r}, expected HH:MM-HH:MM=SECONDS")
+
+
+class PollScheduler:
+    """
+    next_delay() returns the wait before the next poll: the interval of the
+    first window containing the current time (or `default_interval`), with
+    +/- `jitter` relative noise, shortened so a faster window is not entered
+    late, and lengthened when the last hour already used `max_requests_per_hour`.
+    Windows learned from the history (set_learned_windows) apply only where no
+    configured window does.
+    """
+
+    def __init__(self, windows=None, default_interval=REFRESH_INTERVAL_SECONDS, jitter=0.1,
+                 max_requests_per_hour=MAX_REQUESTS_PER_HOUR, clock=datetime.now):
+        if windows is None:
+            windows = [PollWindow(*window) for window in POLL_WINDOWS]
+        self.windows = list(windows)
+        self.learned_windows = []
+        self.default_interval = float(default_interval)
+        self.jitter = jitter
+        self.max_requests_per_hour = max_requests_per_hour
+        self.clock = clock
+        self._request_times = deque()
+
+    def set_learned_windows(self, windows):
+        self.learned_windows = list(windows)
+
+    def interval_at(self, now):
+        for window in self.windows:
+            if window.contains(now):
+                return window.interval
+        for window in self.learned_windows:
+            if window.contains(now):
+                return window.interval
+        return self.default_interval
+
+    def record_request(self):
+        """Counts one request against the hourly budget. Safe to call from any thread."""
+        self._request_times.append(time.monotonic())
+
+    def _budget_delay(self):
+        if not self.max_requests_per_hour:
+            return 0.0
+        horizon = time.monotonic() - 3600
+        while self._request_times and self._request_times[0] <= horizon:
+            self._request_times.popleft()
+        if len(self._request_times) < self.max_requests_per_hour:
+            return 0.0
+        return self._request_times[0] - horizon
+
+    def next_delay(self):
+        now = self.clock()
+        interval = self.interval_at(now)
+        delay = interval * (1 + random.uniform(-self.jitter, self.jitter))
+        for window in self.windows + self.learned_windows:
+            if window.interval < interval:
+                delay = min(delay, window.seconds_until_start(now))
+        return max(delay, self._budget_delay())
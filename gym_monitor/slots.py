@@ -0,0 +1,209 @@
+"""
+Compact slot model for the detection hot path.
+
+Slot ids ("venue|date|time") are interned once into small integer keys, and a
+snapshot's statuses are stored as one byte per key, normalised to a Status at
+parse time. Detecting changes is then a comparison of two byte arrays: equal
+arrays cost a single memcmp, and otherwise one pass over them yields the keys
+that changed, with no string handling at all.
+
+Slots end, and a monitor runs for weeks: the registry keeps a heap of slot end
+times so expired slots are released in O(log n) each and their keys reused,
+keeping every per-key structure as large as the page rather than the uptime.
+"""
+import heapq
+import re
+import threading
+from datetime import datetime
+from enum import IntEnum
+
+
+class Status(IntEnum):
+    MISSING = 0     # not on the page
+    FULL = 1
+    AVAILABLE = 2
+
+    @classmethod
+    def of(cls, text):
+        """Normalises a status text from the page."""
+        if text == 'N/A':
+            return cls.MISSING
+        return cls.FULL if text.upper() == 'FULL' else cls.AVAILABLE
+
+
+_COUNT_RE = re.compile(r'\d+')
+UNKNOWN_SPOTS = 255     # available, but the status text gives no count
+
+
+def free_spots(text):
+    """Free places in a status text: 0 for FULL, the first number in it (capped at 254), else UNKNOWN_SPOTS."""
+    status = Status.of(text)
+    if status is not Status.AVAILABLE:
+        return 0
+    m = _COUNT_RE.search(text)
+    if m is None:
+        return UNKNOWN_SPOTS
+    return min(int(m.group()), UNKNOWN_SPOTS - 1)
+
+
+def changed_keys(a, b):
+    """Indexes at which two bytearrays differ (the shorter is padded with zeros), in one pass."""
+    if len(a) < len(b):
+        a = a + bytes(len(b) - len(a))
+    elif len(b) < len(a):
+        b = b + bytes(len(a) - len(b))
+    if a == b:
+        return []
+    return [key for key, (old, new) in enumerate(zip(a, b)) if old != new]
+
+
+class SlotRegistry:
+    """
+    Interns slot ids: every id gets an integer key, stable until the slot
+    expires, and its venue is split off once. Thread-safe.
+    """
+
+    __slots__ = ('_keys', '_ids', '_venues', '_ends', '_free', '_expiry', '_lock')
+
+    def __init__(self):
+        self._keys = {}
+        self._ids = []
+        self._venues = []
+        self._ends = []
+        self._free = []         # keys of expired slots, reused for new ones
+        self._expiry = []       # heap of (end datetime, key)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """The number of keys handed out so far, i.e. the size arrays indexed by key need."""
+        return len(self._ids)
+
+    def key(self, slot_id, ends=None):
+        """
+        Returns the key of `slot_id`, assigning one if it is new. `ends` (a
+        datetime) schedules the slot's expiry if none is scheduled yet.
+        """
+        key = self._keys.get(slot_id)
+        if key is None or (ends is not None and self._ends[key] is None):
+            with self._lock:
+                key = self._keys.get(slot_id)
+                if key is None:
+                    venue = slot_id.split('|', 1)[0]
+                    if self._free:
+                        key = self._free.pop()
+                        self._ids[key], self._venues[key], self._ends[key] = slot_id, venue, None
+                    else:
+                        key = len(self._ids)
+                        self._ids.append(slot_id)
+                        self._venues.append(venue)
+                        self._ends.append(None)
+                    self._keys[slot_id] = key
+                if ends is not None and self._ends[key] is None:
+                    self._ends[key] = ends
+                    heapq.heappush(self._expiry, (ends, key))
+        return key
+
+    def expire(self, now):
+        """Releases every slot that ended at or before `now`. Returns their (key, slot id) pairs."""
+        if not self._expiry or self._expiry[0][0] > now:
+            return []
+        expired = []
+        with self._lock:
+            while self._expiry and self._expiry[0][0] <= now:
+                _, key = heapq.heappop(self._expiry)
+                slot_id = self._ids[key]
+                del self._keys[slot_id]
+                self._ids[key] = self._venues[key] = self._ends[key] = None
+                self._free.append(key)
+                expired.append((key, slot_id))
+        return expired
+
+    def find(self, slot_id):
+        """Returns the key of `slot_id`, or None if it was never seen or has expired."""
+        return self._keys.get(slot_id)
+
+    def slot_id(self, key):
+        return self._ids[key]
+
+    def venue(self, key):
+        return self._venues[key]
+
+
+class StatusArray:
+    """One Status per slot key, stored as a bytearray that grows on demand."""
+
+    __slots__ = ('codes',)
+
+    def __init__(self, size=0):
+        self.codes = bytearray(size)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, key):
+        return Status(self.codes[key]) if key < len(self.codes) else Status.MISSING
+
+    def __setitem__(self, key, status):
+        if key >= len(self.codes):
+            self.codes.extend(bytes(key + 1 - len(self.codes)))
+        self.codes[key] = status
+
+    def changed_keys(self, other):
+        """Keys whose status differs between this array and `other`, in one pass."""
+        return changed_keys(self.codes, other.codes)
+
+
+class Snapshot:
+    """
+    The statuses of one parsed page by slot key, with the status texts for
+    display. Snapshots built from a page also keep the free places per key and
+    the slot records.
+    """
+
+    __slots__ = ('statuses', 'texts', 'spots', 'records')
+
+    def __init__(self, statuses=None, texts=None, spots=None, records=None):
+        self.statuses = statuses if statuses is not None else StatusArray()
+        self.texts = texts if texts is not None else {}
+        self.spots = spots if spots is not None else bytearray()
+        self.records = records if records is not None else {}
+
+    @classmethod
+    def from_data(cls, registry, data, now=None):
+        """
+        Builds the snapshot of parsed `data`, interning new slot ids into
+        `registry`. Slots that ended before `now` are left out.
+        """
+        now = now or datetime.now()
+        keyed = [(registry.key(slot["id"], slot["ends"]), slot) for venue_slots in data.values()
+                 for slot in venue_slots if slot["ends"] is None or slot["ends"] > now]
+        statuses = StatusArray(len(registry))
+        codes = statuses.codes
+        spots = bytearray(len(registry))
+        texts = {}
+        records = {}
+        for key, slot in keyed:
+            codes[key] = slot["kind"]
+            spots[key] = slot["spots"]
+            texts[key] = slot["status"]
+            records[key] = slot
+        return cls(statuses, texts, spots, records)
+
+    def text(self, key):
+        return self.texts.get(key, 'N/A')
+
+    def without(self, keys):
+        """A copy with `keys` (e.g. of expired slots, about to be reused) as if they were not on the page."""
+        statuses = StatusArray()
+        statuses.codes = bytearray(self.statuses.codes)
+        spots = bytearray(self.spots)
+        texts = dict(self.texts)
+        records = dict(self.records)
+        for key in keys:
+            if key < len(statuses.codes):
+                statuses.codes[key] = Status.MISSING
+            if key < len(spots):
+                spots[key] = 0
+            texts.pop(key, None)
+            records.pop(key, None)
+        return Snapshot(statuses, texts, spots, records)
@@ -0,0 +1,149 @@
+"""Monitoring state shared between the engine thread and its clients."""
+import threading
+from datetime import datetime
+
+from .slots import SlotRegistry, Snapshot, Status
+
+
+class StateStore:
+    """
+    Holds the watched slots, the last seen status of each slot and the slots
+    that currently have an alert open. All access goes through the lock so the
+    worker thread and the GUI thread can both use it.
+
+    Slots are tracked by the integer keys of `slots`; the methods take and
+    return slot ids.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.slots = SlotRegistry()
+        self.selected_slots = set()     # keys
+        self.previous = Snapshot()
+        self.active_alerts = set()      # keys
+        # Bumped whenever a change could make the next diff report something
+        # even if the page itself is unchanged (new watch, re-armed alert).
+        self.version = 0
+
+    def snapshot(self, data):
+        return Snapshot.from_data(self.slots, data)
+
+    def seed(self, data):
+        """Records the statuses of a freshly loaded snapshot."""
+        snapshot = self.snapshot(data)
+        with self.lock:
+            for key in snapshot.texts:
+                self.previous.statuses[key] = snapshot.statuses[key]
+            self.previous.texts.update(snapshot.texts)
+
+    def evict_expired(self, now=None):
+        """
+        Forgets every slot that has ended: its status, watch and open alert.
+        Returns the (key, slot id) pairs of the evicted slots. Cheap when
+        nothing expired.
+        """
+        now = now or datetime.now()
+        with self.lock:
+            expired = self.slots.expire(now)
+            for key, _ in expired:
+                self.selected_slots.discard(key)
+                self.active_alerts.discard(key)
+                self.previous.texts.pop(key, None)
+                self.previous.statuses[key] = Status.MISSING
+        return expired
+
+    def export(self):
+        """The watches, last seen statuses and open alerts by slot id, for a checkpoint."""
+        with self.lock:
+            slot_id = self.slots.slot_id
+            return {"selected": sorted(slot_id(key) for key in self.selected_slots),
+                    "statuses": {slot_id(key): text for key, text in self.previous.texts.items()},
+                    "alerts": sorted(slot_id(key) for key in self.active_alerts)}
+
+    def restore(self, saved):
+        """
+        Takes back what export() returned, for the slots the registry knows
+        (those of the restored page), so slots that ended meanwhile stay
+        forgotten. Returns the ids of the alerts that were open; reopening them
+        is up to the client.
+        """
+        with self.lock:
+            for slot_id, text in saved.get("statuses", {}).items():
+                key = self.slots.find(slot_id)
+                if key is not None:
+                    self.previous.statuses[key] = Status.of(text)
+                    self.previous.texts[key] = text
+            for slot_id in saved.get("selected", ()):
+                key = self.slots.find(slot_id)
+                if key is not None:
+                    self.selected_slots.add(key)
+            self.version += 1
+        return [slot_id for slot_id in saved.get("alerts", ()) if self.slots.find(slot_id) is not None]
+
+    def status_of(self, slot_id):
+        """The last status text seen for `slot_id`, or None."""
+        key = self.slots.find(slot_id)
+        with self.lock:
+            return self.previous.texts.get(key) if key is not None else None
+
+    def remember(self, slot_id, snapshot):
+        """Takes the status of `slot_id` from `snapshot` (for slots alerted by a rule). Returns its text."""
+        key = self.slots.find(slot_id)
+        with self.lock:
+            self.previous.statuses[key] = snapshot.statuses[key]
+            text = self.previous.texts[key] = snapshot.text(key)
+        return text
+
+    def venue_of(self, slot_id):
+        key = self.slots.find(slot_id)
+        return self.slots.venue(key) if key is not None else None
+
+    def select(self, slot_id):
+        with self.lock:
+            self.selected_slots.add(self.slots.key(slot_id))
+            self.version += 1
+
+    def deselect(self, slot_id):
+        """Stops watching `slot_id`. Returns True if it was being watched."""
+        key = self.slots.find(slot_id)
+        with self.lock:
+            if key in self.selected_slots:
+                self.selected_slots.remove(key)
+                return True
+            return False
+
+    def is_selected(self, slot_id):
+        with self.lock:
+            return self.slots.find(slot_id) in self.selected_slots
+
+    def selected_snapshot(self):
+        """The ids of the watched slots."""
+        with self.lock:
+            return {self.slots.slot_id(key) for key in self.selected_slots}
+
+    def open_alert(self, slot_id):
+        """Marks an alert as open. Returns False if one is already open for this slot."""
+        key = self.slots.key(slot_id)
+        with self.lock:
+            if key in self.active_alerts:
+                return False
+            self.active_alerts.add(key)
+            return True
+
+    def acknowledge(self, slot_id):
+        """The user has seen the alert: stop watching the slot. Returns True if it was watched."""
+        with self.lock:
+            self.active_alerts.discard(self.slots.find(slot_id))
+            return self.deselect(slot_id)
+
+    def rearm(self, slot_id):
+        """The alert was dismissed without acknowledgement: allow re-notification."""
+        key = self.slots.find(slot_id)
+        with self.lock:
+            self.active_alerts.discard(key)
+            if key in self.previous.texts:
+                self.previous.statuses[key] = Status.FULL
+                self.previous.texts[key] = 'FULL'
+                self.version += 1
+                return True
+            return False
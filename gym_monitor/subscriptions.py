@@ -0,0 +1,254 @@
+"""
+Shared watches for the server mode (`python -m gym_monitor --serve`).
+
+One engine polls the booking page for everybody. Each subscriber has a set of
+watched slots and their own notification channels (an email address, webhook
+URLs). The registry keeps the inverted index slot id -> subscribers, so an
+opening only costs a lookup of the slot's watchers, and the engine's watched
+slots are exactly the slots somebody watches. Channels are shared between
+subscribers that use the same destination and removed with their last user.
+Subscribers can also have watch rules (gym_monitor.rules); the engine owns the
+compiled rules and the registry keeps track of whose they are. Rule ids are
+saved with the rules, so the ids a subscriber was given stay valid after a
+restart.
+"""
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+
+from .notifier import EmailChannel, WebhookChannel
+
+
+class Subscriber:
+    __slots__ = ('name', 'email', 'webhooks', 'slots', 'rules')
+
+    def __init__(self, name, email=None, webhooks=()):
+        self.name = name
+        self.email = email or None
+        self.webhooks = tuple(webhooks)
+        self.slots = set()
+        self.rules = {}     # rule id -> rule text
+
+    def channel_names(self):
+        names = [f'webhook {url}' for url in self.webhooks]
+        if self.email:
+            names.append(f'email {self.email}')
+        return names
+
+    def to_dict(self):
+        return {"name": self.name, "email": self.email, "webhooks": list(self.webhooks), "slots": sorted(self.slots),
+                "rules": [{"id": rule_id, "rule": text} for rule_id, text in self.rules.items()]}
+
+
+class SubscriptionRegistry:
+    """
+    Thread-safe: the HTTP API changes it from its request threads while the
+    engine looks up watchers on its loop. `path`, if given, is a JSON file the
+    subscriptions are loaded from and saved to after every change, so every
+    method that changes them blocks on file I/O and must not be called on the
+    engine loop (see MonitorEngine.run_blocking).
+    """
+
+    def __init__(self, engine, path=None):
+        self.engine = engine
+        self.path = path
+        self.lock = threading.RLock()
+        self._subscribers = {}
+        self._watchers = defaultdict(set)       # slot id -> subscriber names
+        self._channel_users = defaultdict(int)  # channel name -> number of subscribers using it
+        if path and os.path.exists(path):
+            self._load()
+
+    # --- Subscribers ---
+    def subscribe(self, name, email=None, webhooks=()):
+        """Adds a subscriber, or replaces the channels of an existing one. Returns it."""
+        if email and self.engine.mailer is None:
+            raise ValueError("Email is not configured on this server.")
+        with self.lock:
+            subscriber = self._subscribers.get(name)
+            if subscriber is None:
+                subscriber = self._subscribers[name] = Subscriber(name)
+            self._release_channels(subscriber)
+            subscriber.email = email or None
+            subscriber.webhooks = tuple(webhooks)
+            self._acquire_channels(subscriber)
+            self._save()
+        logging.info(f"Subscriber {name} registered ({len(subscriber.channel_names())} channel(s)).")
+        return subscriber
+
+    def unsubscribe(self, name):
+        """Removes a subscriber with all their watches. Returns False if there was none."""
+        with self.lock:
+            subscriber = self._subscribers.pop(name, None)
+            if subscriber is None:
+                return False
+            for slot_id in list(subscriber.slots):
+                self._unwatch(subscriber, slot_id)
+            for rule_id in subscriber.rules:
+                self.engine.remove_rule(rule_id)
+            self._release_channels(subscriber)
+            self._save()
+        logging.info(f"Subscriber {name} removed.")
+        return True
+
+    def subscribers(self):
+        with self.lock:
+            return [subscriber.to_dict() for subscriber in self._subscribers.values()]
+
+    def get(self, name):
+        with self.lock:
+            subscriber = self._subscribers.get(name)
+            return subscriber.to_dict() if subscriber else None
+
+    # --- Watches ---
+    def watch(self, name, slot_id):
+        """
+        Adds a watch. Raises KeyError for an unknown subscriber and ValueError
+        for a slot that is not on the booking page, so made-up ids cannot pile up.
+        """
+        if not self.engine.on_page(slot_id):
+            raise ValueError(f"Slot {slot_id!r} is not on the booking page (see GET /slots).")
+        with self.lock:
+            if self._add_watch(self._subscribers[name], slot_id):
+                self._save()
+
+    def _add_watch(self, subscriber, slot_id):
+        if slot_id in subscriber.slots:
+            return False
+        subscriber.slots.add(slot_id)
+        watchers = self._watchers[slot_id]
+        if not watchers:
+            self.engine.state.select(slot_id)
+        watchers.add(subscriber.name)
+        return True
+
+    def unwatch(self, name, slot_id):
+        """Removes a watch. Returns False if the subscriber was not watching the slot."""
+        with self.lock:
+            subscriber = self._subscribers.get(name)
+            if subscriber is None or slot_id not in subscriber.slots:
+                return False
+            self._unwatch(subscriber, slot_id)
+            self._save()
+            return True
+
+    def _unwatch(self, subscriber, slot_id):
+        subscriber.slots.discard(slot_id)
+        watchers = self._watchers.get(slot_id)
+        if watchers is None:
+            return
+        watchers.discard(subscriber.name)
+        if not watchers:
+            del self._watchers[slot_id]
+            self.engine.state.deselect(slot_id)
+
+    def add_rule(self, name, text, rule_id=None):
+        """Adds a watch rule for a subscriber. Raises KeyError or rules.RuleError. Returns the Rule."""
+        with self.lock:
+            subscriber = self._subscribers[name]
+            rule = self.engine.add_rule(text, owner=name, rule_id=rule_id)
+            subscriber.rules[rule.id] = text
+            self._save()
+            return rule
+
+    def remove_rule(self, name, rule_id):
+        """Removes a subscriber's rule. Returns False if they have no such rule."""
+        with self.lock:
+            subscriber = self._subscribers.get(name)
+            if subscriber is None or subscriber.rules.pop(rule_id, None) is None:
+                return False
+            self.engine.remove_rule(rule_id)
+            self._save()
+            return True
+
+    def forget(self, slot_ids):
+        """Drops every watch of slots that no longer exist (see MonitorEngine.on_expired)."""
+        with self.lock:
+            changed = False
+            for slot_id in slot_ids:
+                for name in self._watchers.pop(slot_id, ()):
+                    self._subscribers[name].slots.discard(slot_id)
+                    changed = True
+            if changed:
+                self._save()
+
+    def watchers(self, slot_id):
+        with self.lock:
+            return set(self._watchers.get(slot_id, ()))
+
+    def watch_count(self):
+        with self.lock:
+            return sum(len(names) for names in self._watchers.values())
+
+    def channels_for(self, slot_id):
+        """
+        The channel names of everybody watching `slot_id` or owning a rule that
+        fired for it this cycle, each once. Called from on_alert, on the engine loop.
+        """
+        owners = {rule.owner for rule in self.engine.fired_rules.get(slot_id, ())}
+        with self.lock:
+            owners.update(self._watchers.get(slot_id, ()))
+            channels = set()
+            for name in owners:
+                subscriber = self._subscribers.get(name)
+                if subscriber is not None:
+                    channels.update(subscriber.channel_names())
+            return channels
+
+    # --- Channels ---
+    def _acquire_channels(self, subscriber):
+        for url in subscriber.webhooks:
+            name = f'webhook {url}'
+            if self._channel_users[name] == 0:
+                self.engine.add_channel(WebhookChannel(url, self.engine.client))
+            self._channel_users[name] += 1
+        if subscriber.email:
+            name = f'email {subscriber.email}'
+            if self._channel_users[name] == 0:
+                self.engine.add_channel(EmailChannel(self.engine.mailer, recipient=subscriber.email))
+            self._channel_users[name] += 1
+
+    def _release_channels(self, subscriber):
+        for name in subscriber.channel_names():
+            self._channel_users[name] -= 1
+            if self._channel_users[name] <= 0:
+                del self._channel_users[name]
+                self.engine.remove_channel(name)
+
+    # --- Persistence ---
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Could not read the subscriptions in '{self.path}': {e}")
+            return
+        path, self.path = self.path, None     # no saving while loading
+        try:
+            for entry in saved:
+                try:
+                    self.subscribe(entry["name"], entry.get("email"), entry.get("webhooks", ()))
+                except ValueError as e:
+                    logging.warning(f"Subscriber {entry['name']}: {e} Email alerts disabled.")
+                    self.subscribe(entry["name"], None, entry.get("webhooks", ()))
+                # Loaded before the first fetch; a watch whose slot has gone is forgotten when it expires.
+                for slot_id in entry.get("slots", ()):
+                    self._add_watch(self._subscribers[entry["name"]], slot_id)
+                for rule in entry.get("rules", ()):
+                    try:
+                        self.add_rule(entry["name"], rule["rule"], rule.get("id"))
+                    except ValueError as e:
+                        logging.warning(f"Subscriber {entry['name']}: skipping rule {rule['rule']!r}: {e}")
+        finally:
+            self.path = path
+        logging.info(f"Loaded {len(self._subscribers)} subscriber(s) watching {len(self._watchers)} slot(s).")
+
+    def _save(self):
+        if not self.path:
+            return
+        temporary = f"{self.path}.tmp"
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.subscribers(), f, indent=1)
+        os.replace(temporary, self.path)
@@ -0,0 +1,219 @@
+"""
+HTTP transport shared by everything that talks to the booking site.
+
+A single requests.Session keeps TLS connections alive between polls, so a poll
+normally costs one request on an open connection instead of a fresh TCP+TLS
+handshake. Transient failures are retried quickly with jittered exponential
+backoff instead of waiting for the next poll.
+
+A slow response holds up every venue, and it is the slow polls (the tail, not
+the median) that make us miss a slot. get_async() therefore hedges: when an
+attempt has not answered within the recent p95 of fetch times, the same
+request goes out again on another pooled connection and whichever answers
+first is used. That costs about one request in twenty extra.
+
+Every request is timed into gym_monitor.metrics: fetch, fetch.headers and
+fetch.transfer, and for a new connection fetch.connect (name resolution and
+TCP connect) and fetch.tls, taken from urllib3 connection classes that time
+their setup around urllib3's own code.
+"""
+import asyncio
+import logging
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from .config import (HTTP_POOL_SIZE, CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS, HTTP_MAX_RETRIES,
+                     HEDGE_QUANTILE, HEDGE_MIN_SAMPLES, HEDGE_MIN_SECONDS)
+from .metrics import metrics
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+class _TimedConnectionMixin:
+    """
+    Times the setup of a new connection: urllib3's own _new_conn(), i.e. name
+    resolution and the TCP connect to the first address that answers.
+    """
+    _setup_seconds = 0.0
+
+    def _new_conn(self):
+        started = time.perf_counter()
+        sock = super()._new_conn()
+        self._setup_seconds = time.perf_counter() - started
+        metrics.observe('fetch.connect', self._setup_seconds)
+        metrics.inc('fetch.new_connections')
+        return sock
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+
+    def connect(self):
+        self._setup_seconds = 0.0
+        started = time.perf_counter()
+        super().connect()
+        metrics.observe('fetch.tls', time.perf_counter() - started - self._setup_seconds)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedAdapter(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _TimedHTTPConnectionPool,
+                                                   'https': _TimedHTTPSConnectionPool}
+
+
+class HttpClient:
+    """
+    A pooled keep-alive client. `get` retries connection errors, timeouts and
+    429/5xx responses up to `max_retries` times. The first retry happens after
+    at most `first_retry_delay` seconds; later ones back off exponentially from
+    `backoff_base` up to `backoff_max`, each with random jitter. With `hedge`,
+    get_async() sends a second request when the first is slower than usual.
+    on_request(), if set, is called for every request sent -- retries and
+    hedges included -- so a request budget sees what the site actually got.
+    """
+
+    def __init__(self, pool_size=HTTP_POOL_SIZE, connect_timeout=CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=READ_TIMEOUT_SECONDS, max_retries=HTTP_MAX_RETRIES,
+                 first_retry_delay=0.2, backoff_base=1.0, backoff_max=8.0, hedge=True):
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.on_request = None
+        self.first_retry_delay = first_retry_delay
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.session = requests.Session()
+        # Retries are done here, not by urllib3, so they can use our backoff.
+        adapter = _TimedAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({
+            'User-Agent': 'HKU-Gym-Monitor',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive',
+        })
+
+    def backoff_delay(self, retry):
+        """Seconds to wait before retry number `retry` (0-based)."""
+        if retry == 0:
+            return random.uniform(0, self.first_retry_delay)
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (retry - 1))
+        return random.uniform(delay / 2, delay)
+
+    def _attempt(self, url, headers, last_attempt):
+        """One request. Returns (response, None), or (None, reason) if it is worth retrying."""
+        if self.on_request is not None:
+            self.on_request()
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            metrics.inc('fetch.errors')
+            if last_attempt:
+                raise
+            return None, e
+        total = time.perf_counter() - started
+        headers_seconds = response.elapsed.total_seconds()
+        metrics.observe('fetch', total)
+        metrics.observe('fetch.headers', headers_seconds)
+        metrics.observe('fetch.transfer', max(0.0, total - headers_seconds))
+        if response.status_code in RETRY_STATUS_CODES and not last_attempt:
+            response.close()
+            return None, f"HTTP {response.status_code}"
+        return response, None
+
+    def _retry_delay(self, url, reason, retry):
+        delay = self.backoff_delay(retry)
+        logging.warning(f"Request to {url} failed ({reason}); retry {retry + 1}/{self.max_retries} in {delay:.2f}s")
+        return delay
+
+    def get(self, url, headers=None):
+        """
+        GETs `url`, retrying transient failures. Returns the last response
+        (which may still carry a retryable status) or raises the last
+        requests.RequestException.
+        """
+        for attempt in range(self.max_retries + 1):
+            response, reason = self._attempt(url, headers, attempt == self.max_retries)
+            if response is not None:
+                return response
+            time.sleep(self._retry_delay(url, reason, attempt))
+
+    def hedge_delay(self):
+        """Seconds to wait for an answer before hedging, or None while there is no p95 to go by."""
+        if not self.hedge:
+            return None
+        p95 = metrics.quantile('fetch', HEDGE_QUANTILE, min_samples=HEDGE_MIN_SAMPLES)
+        return None if p95 is None else max(HEDGE_MIN_SECONDS, p95)
+
+    async def _hedged_attempt(self, url, headers, last_attempt, executor):
+        """_attempt() on `executor`, sent a second time if the first is slower than hedge_delay()."""
+        loop = asyncio.get_running_loop()
+        first = loop.run_in_executor(executor, self._attempt, url, headers, last_attempt)
+        delay = self.hedge_delay()
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+        metrics.inc('fetch.hedges')
+        second = loop.run_in_executor(executor, self._attempt, url, headers, last_attempt)
+        pending = {first, second}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if not attempt.cancelled() and not attempt.exception() and attempt.result()[0] is not None:
+                        winner = attempt
+                        break
+        finally:
+            # A request on a worker thread cannot be stopped; close the loser's response when it arrives.
+            for attempt in (first, second):
+                if attempt is not winner:
+                    attempt.add_done_callback(_close_response)
+        if winner is None:
+            return first.result()      # both failed: report the first one's error
+        if winner is second:
+            metrics.inc('fetch.hedge_wins')
+        return winner.result()
+
+    async def get_async(self, url, headers=None, executor=None):
+        """
+        Like get(), but the request runs on `executor`, is hedged, and the
+        backoff waits do not block the event loop.
+        """
+        for attempt in range(self.max_retries + 1):
+            response, reason = await self._hedged_attempt(url, headers, attempt == self.max_retries, executor)
+            if response is not None:
+                return response
+            await asyncio.sleep(self._retry_delay(url, reason, attempt))
+
+    def close(self):
+        self.session.close()
+
+
+def _close_response(attempt):
+    if not attempt.cancelled() and not attempt.exception():
+        response, _ = attempt.result()
+        if response is not None:
+            response.close()
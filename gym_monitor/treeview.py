@@ -0,0 +1,93 @@
+"""
+Incremental rendering of a venue schedule into a ttk.Treeview.
+
+Rebuilding the whole tree on every poll stalls the Tk main thread and loses the
+scroll position. TreeRenderer remembers what it displayed and only inserts,
+deletes, moves or edits the rows that differ. It only calls Treeview methods,
+so it does not import tkinter itself.
+"""
+from datetime import datetime
+
+
+def date_row_id(date):
+    return f"date_{date}"
+
+
+def format_chance(probability):
+    return '' if probability is None else f"{probability:.0%}"
+
+
+class TreeRenderer:
+    """Keeps one Treeview in sync with a list of slot records."""
+
+    def __init__(self, tree):
+        self.tree = tree
+        self._rows = {}     # iid -> (values, tags) as currently displayed
+        self._order = []    # iids in display order
+
+    def _desired_rows(self, slots, selected, forecasts):
+        rows = []
+        last_date = None
+        now = datetime.now()
+        for slot in slots:
+            if slot["ends"] is not None and slot["ends"] <= now:
+                continue    # already over; its date header goes with the last one
+            if slot["date"] != last_date:
+                rows.append((date_row_id(slot["date"]), (f'--- {slot["date"]} ---', '', ''), ('date',)))
+                last_date = slot["date"]
+            tags = ('selected',) if slot["id"] in selected else ()
+            rows.append((slot["id"], (slot["time"], slot["status"], format_chance(forecasts.get(slot["id"]))), tags))
+        return rows
+
+    def render(self, slots, selected, forecasts=None):
+        """
+        Applies the differences between the displayed rows and `slots`, with
+        the chance of opening up from `forecasts` (slot id -> probability).
+        Returns the number of tree calls.
+        """
+        tree = self.tree
+        desired = self._desired_rows(slots, selected, forecasts or {})
+        desired_ids = {iid for iid, _, _ in desired}
+        calls = 0
+
+        stale = [iid for iid in self._order if iid not in desired_ids]
+        if stale:
+            tree.delete(*stale)
+            calls += 1
+            for iid in stale:
+                del self._rows[iid]
+        kept = [iid for iid in self._order if iid in self._rows]
+        # Rows only move when the page reorders existing slots, which is rare;
+        # in that case every kept row is put back at its index.
+        reordered = [iid for iid, _, _ in desired if iid in self._rows] != kept
+
+        for index, (iid, values, tags) in enumerate(desired):
+            shown = self._rows.get(iid)
+            if shown is None:
+                tree.insert('', index, iid=iid, values=values, tags=tags)
+                calls += 1
+            else:
+                if reordered:
+                    tree.move(iid, '', index)
+                    calls += 1
+                if shown != (values, tags):
+                    tree.item(iid, values=values, tags=tags)
+                    calls += 1
+            self._rows[iid] = (values, tags)
+        self._order = [iid for iid, _, _ in desired]
+        return calls
+
+    def set_selected(self, iid, selected):
+        """Updates the highlight of one slot row without a render pass."""
+        shown = self._rows.get(iid)
+        if shown is None or not self.tree.exists(iid):
+            return
+        tags = ('selected',) if selected else ()
+        self.tree.item(iid, tags=tags)
+        self._rows[iid] = (shown[0], tags)
+
+    def clear(self):
+        if self._order:
+            self.tree.delete(*self._order)
+        self._rows.clear()
+        self._order = []
@@ -0,0 +1,64 @@
+"""
+The one channel from background threads to the GUI thread.
+
+Calling root.after(0, ...) from the engine for every snapshot and status line
+queues one Tk event each, and with fast polling they pile up faster than the
+main loop redraws. UpdateQueue collects them instead; the GUI drains it once
+per frame (GUI_FRAME_MS), so main-thread work per frame is bounded however
+fast the engine polls:
+
+    put(key, callback, *args)   coalesced: only the latest call per key runs
+                                (the snapshot to render, the status text)
+    post(callback, *args)       every call runs, in order
+    urgent(callback, *args)     runs first in the next frame (alerts)
+
+Like treeview.py it does not import tkinter; the GUI owns the timer.
+"""
+import logging
+import threading
+from collections import deque
+
+from .metrics import metrics
+
+
+class UpdateQueue:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._urgent = deque()
+        self._posted = deque()
+        self._latest = {}   # key -> (callback, args); a newer put replaces the entry
+
+    def put(self, key, callback, *args):
+        with self.lock:
+            if key in self._latest:
+                metrics.inc('gui.coalesced')
+            self._latest[key] = (callback, args)
+
+    def post(self, callback, *args):
+        with self.lock:
+            self._posted.append((callback, args))
+
+    def urgent(self, callback, *args):
+        with self.lock:
+            self._urgent.append((callback, args))
+
+    def __len__(self):
+        with self.lock:
+            return len(self._urgent) + len(self._posted) + len(self._latest)
+
+    def drain(self):
+        """Runs everything queued so far on the calling thread. Returns the number of calls."""
+        with self.lock:
+            if not (self._urgent or self._posted or self._latest):
+                return 0
+            batch = [*self._urgent, *self._posted, *self._latest.values()]
+            self._urgent.clear()
+            self._posted.clear()
+            self._latest = {}
+        for callback, args in batch:
+            try:
+                callback(*args)
+            except Exception:
+                logging.exception(f"GUI update {getattr(callback, '__name__', callback)} failed")
+        return len(batch)
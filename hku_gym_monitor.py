@@ -1,146 +1,316 @@
+import time
+STARTED = time.perf_counter()   # 启动计时从这里开始，见 StartupTimer
 import tkinter as tk
 from tkinter import ttk, messagebox
-import requests
-from bs4 import BeautifulSoup
-import threading
-import time
 import logging
-from datetime import datetime
-from collections import defaultdict
-import os
-import yaml
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
-from email.utils import formataddr
-from pathlib import Path
-from PIL import ImageTk, Image 
-import random
-from plyer import notification  # 【!! 新增 !!】 导入 plyer 库
-
-# --- Configuration ---
-URL = "https://fcbooking.cse.hku.hk/"
-REFRESH_INTERVAL_SECONDS = 60
-ALERT_TIMEOUT_SECONDS = 300  # 5 minutes
-current_dir = Path(os.path.abspath(__file__)).parent
-SECRET_CONFIG_PATH = current_dir / 'secret.yaml'
-logo_path = current_dir / 'asset' / 'logos'
+
+from gym_monitor.checkpoint import load_checkpoint
+from gym_monitor.config import ALERT_TIMEOUT_SECONDS, GUI_FRAME_MS, SECRET_CONFIG_PATH, HISTORY_PATH, WATCH_RULES_PATH, METRICS_PORT, VENUES, CHECKPOINT_PATH, CHECKPOINT_MAX_AGE_SECONDS, ConfigError, load_email_config
+from gym_monitor.logos import random_logo, thumbnail
+from gym_monitor.logs import setup_logging
+from gym_monitor.metrics import StartupTimer
+from gym_monitor.rules import RuleError, load_rules, save_rules
+from gym_monitor.treeview import TreeRenderer
+from gym_monitor.updates import UpdateQueue
+# 引擎 (requests、asyncio)、历史记录、邮件和 NumPy 都在第一个窗口显示之后才导入
 
 # --- Set up Logging ---
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
+# 日志先进队列，由后台线程写到终端和 logs/ 下按大小和日期轮换的 JSON 文件
+setup_logging()
 
 
-class TimedAlert(tk.Toplevel):
+class AlertManager:
     """
-    A custom pop-up window with a countdown timer.
-    Forces itself to the front and correctly handles modality to prevent freezing.
-    """
-    def __init__(self, parent, title, message, slot_id, on_acknowledge_callback, on_close_callback):
-        super().__init__(parent)
-        self.transient(parent)
-
-        # --- FINAL SOLUTION FOR POP-UP ---
-        # 1. Force the window to be the topmost window, ensuring it's visible.
-        self.attributes('-topmost', True)
+    One reusable pop-up window listing every slot that opened up, with a
+    countdown per row. A single ticker updates all countdowns once a second,
+    however many alerts are pending, and stops when the list is empty.
 
-        self.title(title)
-        self.geometry("450x150")
-        self.resizable(False, False)
-
-        # 2. Lift the window to the top of the stacking order and force focus.
-        self.lift()
-        self.focus_force()
-        # ------------------------------------
-
-        self.slot_id = slot_id
+    A row that is acknowledged calls on_acknowledge_callback(slot_id); a row
+    whose countdown runs out, or that is still pending when the window is
+    closed, calls on_close_callback(slot_id) -- the same contract TimedAlert had.
+    """
+    def __init__(self, parent, on_acknowledge_callback, on_close_callback, timeout_seconds=ALERT_TIMEOUT_SECONDS):
+        self.parent = parent
         self._on_acknowledge_callback = on_acknowledge_callback
         self._on_close_callback = on_close_callback
-        self._countdown_seconds = ALERT_TIMEOUT_SECONDS
-        self._timer_id = None
-        self._acknowledged = False
-
-        # --- Widgets ---
-        message_label = ttk.Label(self, text=message, wraplength=430, justify='center')
-        message_label.pack(pady=(10, 10), padx=10, fill='x', expand=True)
-
-        self.timer_label = ttk.Label(self, text="")
-        self.timer_label.pack(pady=5)
-
-        acknowledge_button = ttk.Button(self, text="Acknowledge & Stop Monitoring", command=self._on_acknowledge)
-        acknowledge_button.pack(pady=10)
-
-        # --- Protocol Handlers ---
-        self.protocol("WM_DELETE_WINDOW", self._on_close)
-
-        self._start_countdown()
-
-        # 【!! 修改 !!】 注释掉了 grab_set，防止它在弹窗被遮挡时冻结主窗口
-        # 3. Defer grab_set to prevent the main window from freezing on some OS.
-        # self.after(500, self.grab_set) 
-
-        # 4. (Recommended) After 1 second, turn off the 'topmost' attribute.
-        # The window will still be modal and on top of the parent app,
-        # but it won't obstruct other unrelated applications.
-        self.after(1000, lambda: self.attributes('-topmost', False))
-
-    def _start_countdown(self):
-        """Initiates the countdown timer."""
-        self._update_timer()
+        self.timeout_seconds = timeout_seconds
+        self._deadlines = {}    # slot_id -> time.monotonic() deadline, in arrival order
+        self._ticker_id = None
+        self.window = None
+        self.tree = None
+
+    def _build_window(self):
+        window = tk.Toplevel(self.parent)
+        window.transient(self.parent)
+        window.title("Slot Available!")
+        window.geometry("560x260")
+        window.protocol("WM_DELETE_WINDOW", self._on_window_close)
+
+        ttk.Label(window, text="A spot has opened up for:", justify='center').pack(pady=(10, 5), padx=10)
+        self.tree = ttk.Treeview(window, columns=('Slot', 'Status', 'Closes'), show='headings', height=6)
+        self.tree.heading('Slot', text='Slot')
+        self.tree.heading('Status', text='Availability')
+        self.tree.heading('Closes', text='Resumes in')
+        self.tree.column('Slot', width=320)
+        self.tree.column('Status', width=110, anchor='center')
+        self.tree.column('Closes', width=90, anchor='center')
+        self.tree.pack(fill='both', expand=True, padx=10)
+        self.tree.bind("<Double-1>", lambda e: self._acknowledge_selected())
+
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(pady=10)
+        ttk.Button(btn_frame, text="Acknowledge & Stop Monitoring", command=self._acknowledge_selected).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Acknowledge All", command=self._acknowledge_all).pack(side='left', padx=5)
+        self.window = window
 
-    def _update_timer(self):
-        """Updates the countdown label every second."""
-        if self._countdown_seconds >= 0:
-            mins, secs = divmod(self._countdown_seconds, 60)
-            self.timer_label.config(text=f"This window will close and resume monitoring in {mins:02d}:{secs:02d}")
-            self._countdown_seconds -= 1
-            self._timer_id = self.after(1000, self._update_timer)
+    def _raise_window(self):
+        if self.window is None:
+            self._build_window()
         else:
-            self._on_close()
-
-    def _on_acknowledge(self):
-        """Handles the user clicking the acknowledge button."""
-        logging.info(f"User acknowledged slot: {self.slot_id}. Monitoring for this slot will stop.")
-        self._acknowledged = True
-        if self._on_acknowledge_callback:
-            self._on_acknowledge_callback(self.slot_id)
-        self._on_close()
+            self.window.deiconify()
+        # 先置顶并获取焦点，确保弹窗可见；1 秒后取消置顶，以免遮挡其他程序
+        # (不使用 grab_set，防止它在弹窗被遮挡时冻结主窗口)
+        self.window.attributes('-topmost', True)
+        self.window.lift()
+        self.window.focus_force()
+        self.window.after(1000, lambda: self.window.attributes('-topmost', False))
+
+    def add(self, slot_id, status=''):
+        """Lists a new alert and brings the window to the front."""
+        if slot_id in self._deadlines: return
+        self._raise_window()
+        self._deadlines[slot_id] = time.monotonic() + self.timeout_seconds
+        self.tree.insert('', 'end', iid=slot_id, values=(slot_id.replace('|', ' - '), status, self._remaining_text(self.timeout_seconds)))
+        if self._ticker_id is None:
+            self._ticker_id = self.window.after(1000, self._tick)
+
+    @property
+    def pending(self):
+        return list(self._deadlines)
+
+    def _remaining_text(self, seconds):
+        mins, secs = divmod(max(0, int(seconds)), 60)
+        return f"{mins:02d}:{secs:02d}"
+
+    def _tick(self):
+        """The one timer: refreshes every countdown and expires the rows that ran out."""
+        self._ticker_id = None
+        now = time.monotonic()
+        for slot_id, deadline in list(self._deadlines.items()):
+            if deadline <= now:
+                self._remove(slot_id, acknowledged=False)
+            else:
+                self.tree.set(slot_id, 'Closes', self._remaining_text(deadline - now))
+        if self._deadlines:
+            self._ticker_id = self.window.after(1000, self._tick)
+
+    def _remove(self, slot_id, acknowledged):
+        self._deadlines.pop(slot_id, None)
+        if self.tree.exists(slot_id):
+            self.tree.delete(slot_id)
+        if acknowledged:
+            logging.info(f"User acknowledged slot: {slot_id}. Monitoring for this slot will stop.")
+            if self._on_acknowledge_callback:
+                self._on_acknowledge_callback(slot_id)
+        elif self._on_close_callback:
+            self._on_close_callback(slot_id)
+        if not self._deadlines:
+            self._hide()
+
+    def discard(self, slot_id):
+        """Drops a pending alert without calling back, e.g. because the slot has ended."""
+        if self._deadlines.pop(slot_id, None) is None: return
+        if self.tree.exists(slot_id):
+            self.tree.delete(slot_id)
+        if not self._deadlines:
+            self._hide()
+
+    def _acknowledge_selected(self):
+        for slot_id in self.tree.selection():
+            self._remove(slot_id, acknowledged=True)
+
+    def _acknowledge_all(self):
+        for slot_id in list(self._deadlines):
+            self._remove(slot_id, acknowledged=True)
+
+    def _on_window_close(self):
+        """Closing the window dismisses every pending alert without acknowledging it."""
+        for slot_id in list(self._deadlines):
+            self._remove(slot_id, acknowledged=False)
+        self._hide()
+
+    def _hide(self):
+        if self._ticker_id is not None:
+            self.window.after_cancel(self._ticker_id)
+            self._ticker_id = None
+        if self.window is not None:
+            self.window.withdraw()
+
+
+class RulesDialog:
+    """
+    Lists the standing watch rules (see gym_monitor/rules.py) and lets the user
+    add and remove them. Rules are kept in WATCH_RULES_PATH between runs.
+    """
+    def __init__(self, parent, engine, path=WATCH_RULES_PATH):
+        self.parent = parent
+        self.engine = engine
+        self.path = path
+        self.rules = {}     # rule id -> text, in the order they were added
+        self.window = None
+        for text in load_rules(path):
+            try:
+                self.rules[engine.add_rule(text).id] = text
+            except RuleError as e:
+                logging.warning(f"Skipping watch rule {text!r}: {e}")
+
+    def show(self):
+        if self.window is not None and self.window.winfo_exists():
+            self.window.deiconify()
+            self.window.lift()
+            return
+        window = tk.Toplevel(self.parent)
+        window.transient(self.parent)
+        window.title("Watch Rules")
+        window.geometry("560x320")
+        ttk.Label(window, text='Alert on any slot matching a rule, e.g.  venue="CSE Active" days=tue,thu time=18:00-  min=2',
+                  wraplength=520).pack(pady=(10, 5), padx=10)
+        self.listbox = tk.Listbox(window, height=8)
+        self.listbox.pack(fill='both', expand=True, padx=10)
+        self.entry = ttk.Entry(window)
+        self.entry.pack(fill='x', padx=10, pady=5)
+        self.entry.bind("<Return>", lambda e: self._add())
+        self.error_label = ttk.Label(window, text="", foreground="red")
+        self.error_label.pack()
+        btn_frame = ttk.Frame(window)
+        btn_frame.pack(pady=5)
+        ttk.Button(btn_frame, text="Add Rule", command=self._add).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Remove Selected", command=self._remove_selected).pack(side='left', padx=5)
+        self.window = window
+        self._refresh_list()
+
+    def _refresh_list(self):
+        self.listbox.delete(0, 'end')
+        for text in self.rules.values():
+            self.listbox.insert('end', text)
+
+    def _add(self):
+        text = self.entry.get().strip()
+        if not text: return
+        try:
+            rule = self.engine.add_rule(text)
+        except RuleError as e:
+            self.error_label.config(text=str(e))
+            return
+        self.rules[rule.id] = text
+        self.error_label.config(text="")
+        self.entry.delete(0, 'end')
+        self._refresh_list()
+        save_rules(self.path, self.rules.values())
 
-    def _on_close(self):
-        """Cleans up and closes the window."""
-        if self._timer_id:
-            self.after_cancel(self._timer_id)
-        if not self._acknowledged and self._on_close_callback:
-            self._on_close_callback(self.slot_id)
-        self.destroy()
+    def _remove_selected(self):
+        rule_ids = list(self.rules)
+        for index in self.listbox.curselection():
+            self.engine.remove_rule(rule_ids[index])
+            del self.rules[rule_ids[index]]
+        self._refresh_list()
+        save_rules(self.path, self.rules.values())
 
 
 class FitnessScheduleMonitor:
-    def __init__(self, root):
+    def __init__(self, root, startup=None):
         self.root = root
         self.root.title("HKU Fitness Centre Monitor")
         self.root.geometry("900x600")
-
-        self.monitoring_thread = None
-        self.is_monitoring = threading.Event()
-        self.selected_slots = set()
-        self.previous_statuses = {}
-        self.active_alerts = set()
+        self.startup = startup or StartupTimer()
+        self.startup.mark('imports')
+        self.engine = None
+        self.metrics_server = None
+        self.recipient = None
+        # 后台线程的界面更新都放进这个队列，主循环每帧处理一次
+        self.updates = UpdateQueue()
+        self._pump_id = self.root.after(GUI_FRAME_MS, self._pump_updates)
         
         self.logo_image = None
-        
-        self.email_enabled = False
-        self.email_config = {}
-        self.email_max_retries = 3
 
         self.container = ttk.Frame(self.root)
         self.container.pack(fill='both', expand=True)
 
-        self._create_setup_ui()
         self.root.protocol("WM_DELETE_WINDOW", self._quit_app)
+        # 上次没有正常退出（崩溃或被杀掉）且检查点未过期，就跳过设置界面，直接恢复监控；
+        # 正常退出时检查点会被删掉，下次启动照常显示设置界面
+        saved = load_checkpoint(CHECKPOINT_PATH, CHECKPOINT_MAX_AGE_SECONDS)
+        if saved and saved.get("data"):
+            self._warm_start(saved)
+            return
+        self._create_setup_ui()
+        # 先把窗口画出来，再在空闲时启动引擎
+        self.root.after_idle(self._ensure_engine)
+
+    def _warm_start(self, saved):
+        self._ensure_engine()
+        client = saved.get("client", {})
+        if client.get("recipient"):
+            try:
+                self.engine.enable_email(load_email_config(client["recipient"], SECRET_CONFIG_PATH))
+                self.recipient = client["recipient"]
+            except ConfigError as e:
+                logging.warning(f"{e} Email notifications are off until the next setup.")
+        alerts = self.engine.restore(saved)
+        self._create_main_ui(warm=True)
+        # 先显示上次的快照；第一次新抓取会和它比较，停机期间空出来的时段照样提醒
+        self._update_gui(self.engine.last_data, fresh=False)
+        self.startup.mark('warm_snapshot')
+        for slot_id in alerts:
+            if self.state.open_alert(slot_id):
+                self.alert_manager.add(slot_id, self.state.status_of(slot_id) or '')
+        if client.get("monitoring"):
+            self.start_monitoring()
+        else:
+            self.engine.refresh()
+        logging.info("Warm start from the checkpoint.")
+
+    def _checkpoint_extra(self):
+        # 在引擎的线程里调用，只读属性
+        return {"client": {"recipient": self.recipient, "monitoring": self.engine.is_running}}
+
+    def _ensure_engine(self):
+        if self.engine is not None: return
+        self.startup.mark('window')
+        from gym_monitor.api import MetricsServer
+        from gym_monitor.engine import MonitorEngine
+        from gym_monitor.history import HistoryStore
+        from gym_monitor.notifier import DesktopChannel
+
+        # 记录每个时段的状态变化，供之后查询 (python -m gym_monitor.history)
+        try:
+            history = HistoryStore(HISTORY_PATH)
+        except Exception as e:
+            logging.error(f"Could not open the history database: {e}")
+            history = None
+
+        # 轮询、解析和变化检测都在引擎里完成，GUI 只负责显示
+        self.engine = MonitorEngine(
+            history=history,
+            on_data=lambda data: self.updates.put('data', self._update_gui, data),
+            on_status=lambda text, color="black": self.updates.put('status', self._update_status, text, color),
+            on_alert=lambda slot_id: self.updates.urgent(self._show_alert, slot_id),
+            on_email_failure=lambda: self.updates.put('email_failure', self._show_email_failure_alert),
+            on_expired=lambda slot_ids: self.updates.post(self._on_slots_expired, slot_ids)
+        )
+        self.state = self.engine.state
+        # 系统通知和邮件由引擎在后台发送，不会阻塞弹窗
+        self.engine.add_channel(DesktopChannel())
+        self.alert_manager = AlertManager(self.root, self._on_alert_acknowledge, self._on_alert_close)
+        self.rules_dialog = RulesDialog(self.root, self.engine)
+
+        # 各阶段耗时，Prometheus 可以从 http://127.0.0.1:METRICS_PORT/metrics 抓取
+        if METRICS_PORT:
+            try:
+                self.metrics_server = MetricsServer(self.engine.metrics_text, port=METRICS_PORT).start()
+            except OSError as e:
+                logging.warning(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
+        self.startup.mark('engine')
 
     def _create_setup_ui(self):
         for widget in self.container.winfo_children():
@@ -156,36 +326,14 @@ class FitnessScheduleMonitor:
 
         # --- 2. 添加图片 (Logo) ---
         try:
-            # 1. 定义存放Logo的文件夹路径
-            logos_dir = logo_path
-
-            # 2. 检查文件夹是否存在，并且不是一个文件
-            if os.path.isdir(logos_dir):
-                # 3. 获取文件夹中所有支持格式的图片文件名
-                supported_formats = ('.png', '.jpg', '.jpeg', '.gif')
-                images = [f for f in os.listdir(logos_dir) if f.lower().endswith(supported_formats)]
-
-                # 4. 如果文件夹里有图片，就随机选一张
-                if images:
-                    # 5. 随机选择一个图片文件名
-                    random_logo_name = random.choice(images)
-                    # 6. 构建这张图片的完整路径
-                    image_path = logos_dir / random_logo_name
-
-                    logging.info(f"随机加载Logo: {random_logo_name}")
-
-                    original_image = Image.open(image_path)
-                    resized_image = original_image.resize((200, 200), Image.Resampling.LANCZOS)
-                    self.logo_image = ImageTk.PhotoImage(resized_image)
-                    
-                    image_label = ttk.Label(setup_frame, image=self.logo_image)
-                    image_label.pack(pady=10)
-                else:
-                    # 如果文件夹是空的，打印一条日志
-                    logging.warning("'logos' 文件夹是空的，跳过显示图片。")
-            else:
-                # 如果 'logos' 文件夹不存在，也打印一条日志
-                logging.warning("'logos' 文件夹未找到，跳过显示图片。")
+            # 随机选一张 Logo；缩小后的图片缓存在 .cache/logos，原图没改过就直接用缓存
+            image_path = random_logo()
+            if image_path is not None:
+                logging.info(f"随机加载Logo: {image_path.name}")
+                self.logo_image = tk.PhotoImage(file=str(thumbnail(image_path)))
+                
+                image_label = ttk.Label(setup_frame, image=self.logo_image)
+                image_label.pack(pady=10)
 
         except Exception as e:
             logging.error(f"加载随机图片时出错: {e}")
@@ -231,7 +379,10 @@ class FitnessScheduleMonitor:
         back_button = ttk.Button(btn_frame, text="Back", command=self._create_setup_ui)
         back_button.pack(side='left', padx=10)
 
-    def _create_main_ui(self):
+    def _create_main_ui(self, warm=False):
+        self._ensure_engine()
+        self.startup.mark('main_ui')
+        self.engine.start_checkpoints(CHECKPOINT_PATH, extra=self._checkpoint_extra)
         for widget in self.container.winfo_children():
             widget.destroy()
         control_frame = ttk.Frame(self.container, padding="10")
@@ -250,54 +401,44 @@ class FitnessScheduleMonitor:
         self.stop_button.pack(side='left', padx=5)
         self.refresh_button = ttk.Button(control_frame, text="Refresh Now", command=self._force_refresh)
         self.refresh_button.pack(side='left', padx=5)
-        self.venues = {
-            "CSE Active": {"id": "c10001Content", "tree": None},
-            "HKU B-Active": {"id": "c10002Content", "tree": None}
-        }
+        self.rules_button = ttk.Button(control_frame, text="Watch Rules...", command=self.rules_dialog.show)
+        self.rules_button.pack(side='left', padx=5)
+        self.venues = {name: {"id": div_id, "tree": None, "renderer": None} for name, div_id in VENUES.items()}
         for i, (name, venue_data) in enumerate(self.venues.items()):
             frame = ttk.LabelFrame(schedule_frame, text=name, padding="10")
             frame.grid(row=0, column=i, sticky="nsew", padx=5, pady=5)
             schedule_frame.grid_columnconfigure(i, weight=1)
-            tree = ttk.Treeview(frame, columns=('Time', 'Status'), show='headings', selectmode='browse')
+            tree = ttk.Treeview(frame, columns=('Time', 'Status', 'Chance'), show='headings', selectmode='browse')
             tree.heading('Time', text='Time')
             tree.heading('Status', text='Availability')
+            tree.heading('Chance', text='Chance')
             tree.column('Time', width=150)
             tree.column('Status', width=100, anchor='center')
+            tree.column('Chance', width=60, anchor='center')
             tree.pack(fill='both', expand=True)
             tree.bind("<<TreeviewSelect>>", lambda e, venue_name=name: self._on_single_selection(e, venue_name))
             tree.tag_configure('selected', background='yellow')
             venue_data["tree"] = tree
+            venue_data["renderer"] = TreeRenderer(tree)
         schedule_frame.grid_rowconfigure(0, weight=1)
+        self.stats_label = ttk.Label(status_frame, text="", anchor='e', foreground='grey')
+        self.stats_label.pack(side='right')
         self.status_label = ttk.Label(status_frame, text="Ready. Fetching initial data...", anchor='w')
         self.status_label.pack(fill='x')
-        self.root.after(100, self.initial_load)
+        if not warm:
+            self.root.after(100, self.initial_load)
+        self.root.after(2000, self._update_stats)
 
     def _confirm_and_proceed(self):
         recipient_email = self.recipient_email_entry.get().strip()
-        if not recipient_email or "@" not in recipient_email:
-            self.error_label.config(text="Please enter a valid email address.")
-            return
-        required_keys = ['smtp_server', 'smtp_port', 'sender_email', 'sender_password']
-        if not os.path.exists(SECRET_CONFIG_PATH):
-            self.error_label.config(text=f"Error: '{SECRET_CONFIG_PATH}' not found.")
-            return
         try:
-            with open(SECRET_CONFIG_PATH, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
-            if not config or not all(key in config for key in required_keys):
-                missing = [k for k in required_keys if k not in (config or {})]
-                self.error_label.config(text=f"Error: Missing keys in YAML: {', '.join(missing)}")
-                return
-            if "@" not in config['sender_email']:
-                self.error_label.config(text="Error: 'sender_email' in YAML is not a valid email address.")
-                return
-            self.email_config = config
-            self.email_config['recipient_email'] = recipient_email
-            self.email_enabled = True
-            logging.info(f"Email notifications enabled for recipient: {recipient_email}")
-        except (yaml.YAMLError, IOError) as e:
-            self.error_label.config(text=f"Error reading '{SECRET_CONFIG_PATH}':\n{e}")
+            config = load_email_config(recipient_email, SECRET_CONFIG_PATH)
+        except ConfigError as e:
+            self.error_label.config(text=str(e))
             return
+        self._ensure_engine()
+        self.engine.enable_email(config)
+        self.recipient = recipient_email
         self._create_main_ui()
 
     def _on_single_selection(self, event, current_venue_name):
@@ -307,54 +448,28 @@ class FitnessScheduleMonitor:
                 if other_tree.selection():
                     other_tree.selection_set('')
 
-    def _fetch_and_parse(self):
-        try:
-            logging.info(f"Fetching data from {URL}")
-            response = requests.get(URL, timeout=10)
-            response.raise_for_status()
-            soup = BeautifulSoup(response.text, 'html.parser')
-            parsed_data = defaultdict(list)
-            for name, venue_data in self.venues.items():
-                content_div = soup.find('div', id=venue_data["id"])
-                if not content_div: continue
-                current_date = "Unknown Date"
-                for element in content_div.find_all(recursive=False):
-                    if 'py-2' in element.get('class', []) and 'grey' in element.get('class', []):
-                        current_date = element.get_text(strip=True)
-                    elif 'border-top' in element.get('class', []):
-                        row = element.find('div', class_='row')
-                        if row:
-                            cols = row.find_all('div', class_='col')
-                            if len(cols) >= 2:
-                                time_slot = cols[0].get_text(strip=True)
-                                status = cols[1].get_text(strip=True)
-                                slot_id = f"{name}|{current_date}|{time_slot}"
-                                parsed_data[name].append({"id": slot_id, "date": current_date, "time": time_slot, "status": status})
-            return parsed_data
-        except requests.RequestException as e:
-            logging.error(f"Failed to fetch HTML: {e}")
-            self._update_status(f"Error: Could not fetch data. Check connection.", "red")
-            return None
-
-    def _update_gui(self, data):
+    def _update_gui(self, data, fresh=True):
         if not data: return
-        for name, venue_data in self.venues.items():
-            tree = venue_data["tree"]
-            current_selection = tree.selection()
-            tree.delete(*tree.get_children())
-            last_date = None
-            for slot in data.get(name, []):
-                if slot["date"] != last_date:
-                    tree.insert('', 'end', values=(f'--- {slot["date"]} ---', ''), iid=f"date_{slot['date']}", tags=('date',))
-                    last_date = slot["date"]
-                tags = ('selected',) if slot["id"] in self.selected_slots else ()
-                tree.insert('', 'end', values=(slot["time"], slot["status"]), iid=slot["id"], tags=tags)
-            if current_selection:
-                try:
-                    tree.selection_set(current_selection)
-                except tk.TclError: # Item might not exist anymore
-                    pass
+        # 只更新有变化的行，选中状态和滚动位置会自然保留
+        with self.engine.metrics.time('gui_update'):
+            selected = self.state.selected_snapshot()
+            for name, venue_data in self.venues.items():
+                venue_data["renderer"].render(data.get(name, []), selected, self.engine.forecasts)
         logging.info("GUI has been updated with the latest data.")
+        if fresh and 'first_data' not in self.startup.phases:
+            self.startup.mark('first_data')
+            self.startup.report()
+
+    def _update_stats(self):
+        # 状态栏右侧显示各阶段耗时的 p50/p95，每两秒刷新
+        if not self.stats_label.winfo_exists(): return
+        self.stats_label.config(text=self.engine.metrics.brief())
+        self.root.after(2000, self._update_stats)
+
+    def _pump_updates(self):
+        # 提醒先处理；快照和状态文字在一帧内只保留最新的一条
+        self.updates.drain()
+        self._pump_id = self.root.after(GUI_FRAME_MS, self._pump_updates)
 
     def _update_status(self, text, color="black"):
         self.status_label.config(text=text, foreground=color)
@@ -363,51 +478,46 @@ class FitnessScheduleMonitor:
         self._force_refresh(initial=True)
 
     def _force_refresh(self, initial=False):
-        def task():
-            if not initial:
-                self.root.after(0, lambda: self.refresh_button.config(state='disabled'))
-                self.root.after(0, lambda: self._update_status("Refreshing..."))
-            data = self._fetch_and_parse()
-            if data:
-                if initial:
-                    for venue_slots in data.values():
-                        for slot in venue_slots: self.previous_statuses[slot['id']] = slot['status']
-                self.root.after(0, self._update_gui, data)
-                self.root.after(0, lambda: self._update_status(f"Data loaded successfully. Last updated: {datetime.now().strftime('%H:%M:%S')}"))
-            if not initial:
-                self.root.after(0, lambda: self.refresh_button.config(state='normal'))
-        threading.Thread(target=task, daemon=True).start()
+        if initial:
+            self.engine.refresh(initial=True)
+            return
+        self.refresh_button.config(state='disabled')
+        self._update_status("Refreshing...")
+        self.engine.refresh(on_done=lambda: self.updates.post(lambda: self.refresh_button.config(state='normal')))
 
     def _select_highlighted(self):
+        selected = []
         for venue_data in self.venues.values():
             tree = venue_data["tree"]
             for item_id in tree.selection():
                 if not item_id.startswith("date_"):
-                    self.selected_slots.add(item_id)
-                    tree.item(item_id, tags=('selected',))
-        logging.info(f"Selected slots for monitoring: {self.selected_slots}")
+                    self.state.select(item_id)
+                    venue_data["renderer"].set_selected(item_id, True)
+                    selected.append(item_id)
+        # 只记录这次选中的，日志行不会随监控的时段数增长
+        logging.info(f"Selected {len(selected)} slot(s) for monitoring, {len(self.state.selected_slots)} in total.")
+        logging.debug(f"Selected: {selected}")
 
     def _deselect_highlighted(self):
+        deselected = []
         for venue_data in self.venues.values():
             tree = venue_data["tree"]
             for item_id in tree.selection():
-                if item_id in self.selected_slots:
-                    self.selected_slots.remove(item_id)
-                    tree.item(item_id, tags=())
-        logging.info(f"Deselected slots: {self.selected_slots}")
+                if self.state.deselect(item_id):
+                    venue_data["renderer"].set_selected(item_id, False)
+                    deselected.append(item_id)
+        logging.info(f"Deselected {len(deselected)} slot(s), {len(self.state.selected_slots)} still monitored.")
+        logging.debug(f"Deselected: {deselected}")
 
     def start_monitoring(self):
-        if self.monitoring_thread and self.monitoring_thread.is_alive(): return
-        self.is_monitoring.set()
-        self.monitoring_thread = threading.Thread(target=self._monitor_worker, daemon=True)
-        self.monitoring_thread.start()
+        if not self.engine.start(): return
         self.start_button.config(state='disabled')
         self.stop_button.config(state='normal')
         self._update_status("Monitoring started...")
-        logging.info("Monitoring has started.")
 
     def stop_monitoring(self):
-        self.is_monitoring.clear()
+        if self.engine is None: return
+        self.engine.stop()
         
         # 检查 start_button 是否存在，如果存在再修改它的状态
         if hasattr(self, 'start_button'):
@@ -420,146 +530,58 @@ class FitnessScheduleMonitor:
         # 同样检查 status_label，因为 _update_status 会用到它
         if hasattr(self, 'status_label'):
             self.status_label.config(text="Monitoring stopped.")
-            
-        logging.info("Monitoring has been stopped by the user.")
 
     # 【!! 修改 !!】 更新了 _show_alert 方法
     def _show_alert(self, slot_id):
-        if slot_id in self.active_alerts: return
-        self.active_alerts.add(slot_id)
-        
-        if self.email_enabled:
-            email_thread = threading.Thread(target=self._send_email_alert, args=(slot_id,), daemon=True)
-            email_thread.start()
+        if not self.state.open_alert(slot_id): return
             
-        message = f"A spot has opened up for:\n\n{slot_id.replace('|', ' - ')}"
-
-        # --- 【!! 新增 !!】 发送系统通知 ---
-        try:
-            notification.notify(
-                title='Slot Available!',
-                message=message,
-                app_name='HKU Fitness Monitor',
-                timeout=15  # 通知显示 15 秒
-            )
-            logging.info(f"System notification sent for {slot_id}")
-        except Exception as e:
-            # 即便系统通知失败，日志记录警告，但程序应继续弹出Tkinter窗口
-            logging.warning(f"Failed to send system notification: {e}")
-        # ---------------------------------
-        
-        # 仍然显示 Tkinter 弹窗，但它现在不会冻结主窗口了
-        TimedAlert(
-            parent=self.root,
-            title="Slot Available!",
-            message=message,
-            slot_id=slot_id,
-            on_acknowledge_callback=self._on_alert_acknowledge,
-            on_close_callback=self._on_alert_close
-        )
+        # 先把它加到提醒窗口里（所有提醒共用一个窗口和一个计时器）
+        with self.engine.metrics.time('gui_alert'):
+            self.alert_manager.add(slot_id, self.state.status_of(slot_id) or '')
         logging.info(f"Alert window shown for available slot: {slot_id}")
 
+        # --- 系统通知、邮件等渠道交给引擎的通知队列，慢的渠道不会拖慢弹窗 ---
+        self.engine.notify(slot_id)
+
+    def _on_slots_expired(self, slot_ids):
+        for slot_id in slot_ids:
+            self.alert_manager.discard(slot_id)
+        if hasattr(self, 'status_label'):
+            self._update_gui(self.engine.last_data)
+
     def _on_alert_acknowledge(self, slot_id):
-        if slot_id in self.selected_slots:
-            self.selected_slots.remove(slot_id)
-            venue_name = slot_id.split('|')[0]
+        if self.state.acknowledge(slot_id):
+            venue_name = self.state.venue_of(slot_id)
             if venue_name in self.venues:
-                tree = self.venues[venue_name]['tree']
-                if tree.exists(slot_id): tree.item(slot_id, tags=())
-        if slot_id in self.active_alerts:
-            self.active_alerts.remove(slot_id)
+                self.venues[venue_name]['renderer'].set_selected(slot_id, False)
 
     def _on_alert_close(self, slot_id):
         logging.info(f"Alert for {slot_id} closed without acknowledgement. Resuming full monitoring.")
-        if slot_id in self.active_alerts:
-            self.active_alerts.remove(slot_id)
-        if slot_id in self.previous_statuses:
+        if self.state.rearm(slot_id):
             logging.info(f"Resetting previous status for {slot_id} to FULL to allow re-notification.")
-            self.previous_statuses[slot_id] = 'FULL'
-
-    def _monitor_worker(self):
-        while self.is_monitoring.is_set():
-            try:  # 【!! 新增 !!】 在循环开始时添加 try
-                logging.info("Monitor thread: Checking for updates...")
-                data = self._fetch_and_parse()
-                
-                if data:
-                    self.root.after(0, self._update_gui, data)
-                    self.root.after(0, lambda: self._update_status(f"Monitoring... Last checked: {datetime.now().strftime('%H:%M:%S')}"))
-                    
-                    flat_data = {slot['id']: slot['status'] for venue in data.values() for slot in venue}
-                    
-                    # 使用 list() 来创建一个快照，防止在迭代时被主线程修改 (你已经这么做了，很好)
-                    for slot_id in list(self.selected_slots): 
-                        prev_status = self.previous_statuses.get(slot_id, 'N/A')
-                        new_status = flat_data.get(slot_id, 'N/A')
-                        
-                        if prev_status.upper() == 'FULL' and new_status.upper() != 'FULL' and new_status != 'N/A':
-                            logging.info(f"CHANGE DETECTED! Slot {slot_id} is now available ({new_status}).")
-                            self.root.after(0, self._show_alert, slot_id)
-                        
-                        # 在两个线程都在访问它之前，确保 previous_statuses 的更新是安全的
-                        # (虽然在此特定情况下风险较低，但最佳实践是使用锁)
-                        self.previous_statuses[slot_id] = new_status
-                
-                # 如果 data 为 None (例如 _fetch_and_parse 捕获到了错误)
-                # else:
-                #    logging.warning("Monitor thread: No data received, skipping check cycle.")
-            
-            except Exception as e: # 【!! 新增 !!】 捕获所有可能的异常
-                logging.error(f"Unhandled exception in monitor worker: {e}", exc_info=True)
-                # 发生错误时，也在UI上显示，这样用户就知道出问题了
-                try:
-                    self.root.after(0, lambda: self._update_status(f"Error occurred: {e}. Retrying...", "red"))
-                except Exception as e_gui:
-                    logging.error(f"Failed to update GUI with error status: {e_gui}")
-                # 即使出错，也要继续等待，而不是让循环立即重试导致刷屏
-            
-            finally: # 【!! 新增 !!】 确保等待逻辑总能执行
-                # 将等待逻辑移出 try 块，确保无论成功还是失败都会等待
-                for _ in range(REFRESH_INTERVAL_SECONDS):
-                    if not self.is_monitoring.is_set(): 
-                        break
-                    time.sleep(1)
-
-        logging.info("Monitor worker thread has gracefully stopped.")
-
-    def _send_email_alert(self, slot_id):
-        if not self.email_enabled: return
-        cfg = self.email_config
-        slot_details = slot_id.replace('|', ' - ')
-        message = MIMEText(f'An appointment slot is now available:\n\n{slot_details}\n\nPlease check the website to book: {URL}', 'plain', 'utf-8')
-        message['From'] = formataddr(('HKU Gym Monitor', cfg['sender_email']), 'utf-8')
-        message['To'] = formataddr(('Recipient', cfg['recipient_email']), 'utf-8')
-        message['Subject'] = Header(f'HKU Gym Slot Available: {slot_details}', 'utf-8')
-        for attempt in range(self.email_max_retries):
-            try:
-                smtp_connection = smtplib.SMTP_SSL(cfg['smtp_server'], cfg['smtp_port'], timeout=15)
-                smtp_connection.login(cfg['sender_email'], cfg['sender_password'])
-                smtp_connection.sendmail(cfg['sender_email'], [cfg['recipient_email']], message.as_string())
-                smtp_connection.quit()
-                logging.info(f"Successfully sent email for slot {slot_id} on attempt {attempt + 1}.")
-                return
-            except Exception as e:
-                logging.error(f"Email attempt {attempt + 1} for {slot_id} failed: {e}")
-                if attempt < self.email_max_retries - 1:
-                    time.sleep(10)
-                else:
-                    logging.error("All email attempts failed. Disabling email notifications for this session.")
-                    self.email_enabled = False
-                    self.root.after(0, self._show_email_failure_alert)
 
     def _show_email_failure_alert(self):
         messagebox.showerror(
             "Email Failure",
-            "Failed to send email notification after multiple retries.\n\nEmail functionality has been disabled for this session. Desktop alerts will continue."
+            "Failed to send email notification after multiple retries.\n\nAlerts stay queued and will be retried in the background. Desktop alerts will continue."
         )
 
     def _quit_app(self):
+        self.root.after_cancel(self._pump_id)
+        # 正常退出：删掉检查点，下次启动回到设置界面（只有崩溃后才热启动）
+        if self.engine is not None and self.engine.checkpointer is not None:
+            try:
+                self.engine.checkpointer.discard()
+            except OSError as e:
+                logging.error(f"Failed to delete the checkpoint: {e}")
         self.stop_monitoring()
+        if self.metrics_server is not None:
+            self.metrics_server.stop()
+        if self.engine is not None:
+            self.engine.close()
         self.root.destroy()
 
 if __name__ == "__main__":
     root = tk.Tk()
-    app = FitnessScheduleMonitor(root)
+    app = FitnessScheduleMonitor(root, StartupTimer(STARTED))
     root.mainloop()
\ No newline at end of file
@@ -1,48 +1,71 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.header import Header
-import yaml
-from email.utils import formataddr # <--- 导入 formataddr
+"""
+SMTP 诊断工具 / SMTP diagnostics.
+
+Sends test messages through the same SmtpSession the monitor uses and reports
+how long connect, login and each send took. The first message pays for the
+connection; the following ones reuse it.
+
+    python test_email.py                 # 使用 secret.yaml 中的配置
+    python test_email.py --count 3       # 在同一个连接上发送 3 封
+    python test_email.py --local         # 使用本地的模拟 SMTP 服务器，不需要 secret.yaml
+"""
+import argparse
+import sys
+import time
 from pathlib import Path
-# 从 YAML 文件读取配置信息
+
+import yaml
+
+from gym_monitor.devtools.smtp_sink import SmtpSink
+from gym_monitor.mailer import SmtpSession, build_digest
+
 current_dir = Path(__file__).parent
-with open(current_dir/'secret.yaml', 'r', encoding='utf-8') as f:
-  config = yaml.safe_load(f)
-
-smtp_server = config['smtp_server']
-smtp_port = config['smtp_port']
-sender_email = config['sender_email']
-sender_password = config['sender_password']
-recipient_email = config.get('recipient_email')  # 可选：默认收件人
-
-if not recipient_email:
-    recipient_email = sender_email  # 如果未指定收件人，则发送给自己
-
-# --- 邮件内容 (保持不变) ---
-message = MIMEText('This is a test! Hello, World!', 'plain', 'utf-8')
-
-# --- 关键修改部分：正确设置 From 和 To 标头 ---
-# 使用 formataddr 来格式化发件人和收件人信息
-# 它会自动处理昵称的编码，并确保整体格式符合 RFC 标准
-message['From'] = formataddr(('发件人昵称', sender_email), 'utf-8')
-message['To'] = formataddr(('收件人昵称', recipient_email), 'utf-8')
-
-# --- 主题设置 (可以保持不变，但用 formataddr 也是好习惯) ---
-message['Subject'] = Header('邮件主题', 'utf-8')
-
-
-# --- 发送逻辑 (保持不变) ---
-try:
-    smtp_connection = smtplib.SMTP_SSL(smtp_server, smtp_port)
-    # 如果不需要调试信息，可以注释掉下面这行
-    # smtp_connection.set_debuglevel(1) 
-    smtp_connection.login(sender_email, sender_password)
-    smtp_connection.sendmail(sender_email, [recipient_email], message.as_string())
-    smtp_connection.quit()
-    
-    print("邮件发送成功！")
-    print(f"发件人: {message['From']}, 收件人: {message['To']}, 主题: {message['Subject']}")
-    
-
-except Exception as e:
-    print(f"邮件发送失败：{e}")
\ No newline at end of file
+
+
+def load_config(path):
+    # 从 YAML 文件读取配置信息
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f)
+    if not config.get('recipient_email'):
+        config['recipient_email'] = config['sender_email']  # 如果未指定收件人，则发送给自己
+    return config
+
+
+def run(config, count):
+    session = SmtpSession(config)
+    print(f"发件人: {config['sender_email']}, 收件人: {config['recipient_email']}, "
+          f"服务器: {config['smtp_server']}:{config['smtp_port']}")
+    try:
+        for i in range(count):
+            message = build_digest(config, [f"Test|message {i + 1}|{time.strftime('%H:%M:%S')}"])
+            session.timings.clear()
+            start = time.perf_counter()
+            session.send(message)
+            total = time.perf_counter() - start
+            parts = ', '.join(f"{name} {seconds * 1000:.1f} ms" for name, seconds in session.timings.items())
+            print(f"邮件 {i + 1} 发送成功: {parts} (total {total * 1000:.1f} ms)")
+    except Exception as e:
+        print(f"邮件发送失败：{e}")
+        return 1
+    finally:
+        session.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send test emails and report SMTP timings.")
+    parser.add_argument('--config', default=str(current_dir / 'secret.yaml'))
+    parser.add_argument('--count', type=int, default=1, help="messages to send over one connection")
+    parser.add_argument('--local', action='store_true', help="send to a local stand-in SMTP server")
+    args = parser.parse_args(argv)
+
+    if args.local:
+        with SmtpSink() as sink:
+            status = run(sink.config(), args.count)
+            print(f"本地服务器收到 {len(sink.messages)} 封邮件, {sink.connections} 个连接, {sink.logins} 次登录")
+            return status
+    return run(load_config(args.config), args.count)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import time
+from datetime import date, timedelta
+
+import pytest
+
+from gym_monitor.history import HistoryStore
+from gym_monitor.parser import slot_record
+
+pytest.importorskip("numpy")
+from gym_monitor.analytics import AvailabilityModel  # noqa: E402
+
+VENUE = "CSE Active"
+
+
+def _slot(day, status):
+    return slot_record(VENUE, day.strftime("%d %b %Y (%a)"), "18:00 - 19:00", status)
+
+
+def test_forecast_ignores_slots_outside_the_window(tmp_path):
+    store = HistoryStore(tmp_path / "history.sqlite3")
+    now = time.time()
+    monday = date.today() - timedelta(days=date.today().weekday())
+    try:
+        # Ten older Mondays, seen FULL long before the window...
+        for week in range(1, 11):
+            store.record({VENUE: [_slot(monday - timedelta(weeks=week + 20), "FULL")]}, ts=now - 150 * 86400)
+        # ...and five recent ones that all opened up.
+        for week in range(5):
+            day = monday - timedelta(weeks=week)
+            store.record({VENUE: [_slot(day, "FULL")]}, venues=[], ts=now - 1000)
+            store.record({VENUE: [_slot(day, "3 spaces left")]}, venues=[], ts=now - 500)
+        model = AvailabilityModel.build(store, days=60)
+        slot_id = _slot(monday + timedelta(weeks=1), "FULL")["id"]
+        assert model.forecast([slot_id])[slot_id] == pytest.approx(6 / 7)
+        assert model.refill_percentiles() == {}     # none of them filled up again
+    finally:
+        store.close()
@@ -0,0 +1,33 @@
+from gym_monitor.checkpoint import Checkpointer, load_checkpoint
+
+
+def test_discarded_checkpoint_is_not_written_again(tmp_path):
+    path = tmp_path / 'checkpoint.json'
+    content = {'state': {'selected': ['a']}}
+    checkpointer = Checkpointer(path, lambda: dict(content))
+    assert checkpointer.save()
+    assert load_checkpoint(path)['state'] == content['state']
+
+    checkpointer.discard()
+    content['state'] = {'selected': ['a', 'b']}
+    assert not checkpointer.save()
+    assert load_checkpoint(path) is None
+    checkpointer.discard()
+
+
+def test_unchanged_checkpoint_stays_young_enough_to_warm_start(tmp_path, monkeypatch):
+    import types
+    from gym_monitor import checkpoint
+    from gym_monitor.config import CHECKPOINT_MAX_AGE_SECONDS, CHECKPOINT_SECONDS
+
+    clock = [1_000_000.0]
+    monkeypatch.setattr(checkpoint, 'time', types.SimpleNamespace(time=lambda: clock[0]))
+    path = tmp_path / 'checkpoint.json'
+    checkpointer = Checkpointer(path, lambda: {'state': {'selected': ['a']}})
+    writes = 0
+    # A night with nothing changing, saved every CHECKPOINT_SECONDS as the engine does.
+    while clock[0] < 1_000_000.0 + 2 * CHECKPOINT_MAX_AGE_SECONDS:
+        writes += checkpointer.save()
+        clock[0] += CHECKPOINT_SECONDS
+    assert 1 < writes < 10
+    assert load_checkpoint(path, CHECKPOINT_MAX_AGE_SECONDS) is not None
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from gym_monitor.detector import detect_openings
+from gym_monitor.parser import slot_record
+from gym_monitor.state import StateStore
+
+
+def _page(*statuses):
+    day = (date.today() + timedelta(days=1)).strftime("%d %b %Y (%a)")
+    return {"CSE Active": [slot_record("CSE Active", day, f"{hour:02d}:00 - {hour + 1:02d}:00", status)
+                           for hour, status in enumerate(statuses, start=7)]}
+
+
+def test_unchanged_page_compares_equal_after_an_unwatched_change():
+    state = StateStore()
+    state.seed(_page("FULL", "FULL"))
+    watched = _page("FULL", "FULL")["CSE Active"][0]["id"]
+    state.select(watched)
+
+    # Only the unwatched slot changes: nothing to report, but its status is kept.
+    snapshot = state.snapshot(_page("FULL", "3 spaces left"))
+    assert detect_openings(state, snapshot) == []
+    again = state.snapshot(_page("FULL", "3 spaces left"))
+    assert state.previous.statuses.changed_keys(again.statuses) == []
+    assert detect_openings(state, again) == []
+
+    snapshot = state.snapshot(_page("2 spaces left", "3 spaces left"))
+    assert detect_openings(state, snapshot) == [(watched, "2 spaces left")]
+    assert state.status_of(watched) == "2 spaces left"
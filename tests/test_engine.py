@@ -0,0 +1,121 @@
+from datetime import date, timedelta
+
+from gym_monitor.engine import MonitorEngine
+from gym_monitor.parser import slot_record
+from gym_monitor.rules import Rule
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).strftime("%d %b %Y (%a)")
+
+
+def _page(first_status, second_status):
+    return {"CSE Active": [slot_record("CSE Active", _day(1), "07:00 - 08:00", first_status),
+                           slot_record("CSE Active", _day(2), "07:00 - 08:00", second_status)]}
+
+
+def _show(engine, data):
+    engine.last_data = data
+    engine.last_snapshot = engine.state.snapshot(data)
+
+
+def test_rule_fires_in_the_same_cycle_as_an_expiry():
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    try:
+        engine.rules.add(Rule('venue="CSE Active"'))
+        _show(engine, _page("FULL", "FULL"))
+        assert engine._match_rules() == []      # baseline
+
+        data = _page("FULL", "3 spaces left")
+        _show(engine, data)
+        # The first slot ends before the rules see the new page.
+        engine._evict_expired(now=data["CSE Active"][0]["ends"])
+        assert engine._match_rules() == [data["CSE Active"][1]["id"]]
+    finally:
+        engine.close()
+
+
+def test_rule_fires_without_an_expiry():
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    try:
+        engine.rules.add(Rule('venue="CSE Active"'))
+        _show(engine, _page("FULL", "FULL"))
+        engine._match_rules()
+        data = _page("FULL", "3 spaces left")
+        _show(engine, data)
+        assert engine._match_rules() == [data["CSE Active"][1]["id"]]
+    finally:
+        engine.close()
+
+
+def test_every_request_counts_against_the_budget():
+    from gym_monitor.devtools.booking_server import BookingServer, Schedule
+    from gym_monitor.transport import HttpClient
+
+    with BookingServer(Schedule.synthesize(days=1)) as site, BookingServer(Schedule.synthesize(days=1)) as other:
+        engine = MonitorEngine(url=site.url, extra_urls=[other.url], client=HttpClient(hedge=False))
+        try:
+            engine.fetch_snapshot()
+            engine.check_once()
+            assert len(engine.scheduler._request_times) == 4
+        finally:
+            engine.close()
+
+
+def _watching_engine(site, monkeypatch):
+    """An engine on `site` watching one FULL slot, with parse_section and detect_openings counted."""
+    from gym_monitor import engine as engine_module
+    from gym_monitor.transport import HttpClient
+
+    calls = {'parse': 0, 'detect': 0}
+
+    def counted(name, func):
+        def wrapper(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+    monkeypatch.setattr(engine_module, 'parse_section', counted('parse', engine_module.parse_section))
+    monkeypatch.setattr(engine_module, 'detect_openings', counted('detect', engine_module.detect_openings))
+    engine = MonitorEngine(url=site.url, extra_urls=[], client=HttpClient(hedge=False))
+    engine.state.seed(engine.fetch_snapshot())
+    watched = site.schedule.slot_ids("FULL")[0]
+    engine.state.select(watched)
+    assert engine.check_once() == []    # the first diff of the watched slot
+    calls.update(parse=0, detect=0)
+    engine.stats.clear()
+    return engine, watched, calls
+
+
+def _check_unchanged_then_changed(site, engine, watched, calls):
+    for _ in range(3):
+        assert engine.check_once() == []
+    assert calls == {'parse': 0, 'detect': 0}
+    assert engine.stats['short_circuited'] == 3
+
+    site.flip(watched)
+    assert engine.check_once() == [watched]
+    assert calls['parse'] >= 1 and calls['detect'] == 1
+
+
+def test_not_modified_page_skips_parse_and_detect(monkeypatch):
+    from gym_monitor.devtools.booking_server import BookingServer, Schedule
+
+    with BookingServer(Schedule.synthesize(days=2, seed=1)) as site:
+        engine, watched, calls = _watching_engine(site, monkeypatch)
+        try:
+            _check_unchanged_then_changed(site, engine, watched, calls)
+            assert engine.stats['not_modified'] == 3 and site.not_modified >= 3
+        finally:
+            engine.close()
+
+
+def test_same_page_without_etag_skips_parse_and_detect(monkeypatch):
+    from gym_monitor.devtools.booking_server import BookingServer, Schedule
+
+    with BookingServer(Schedule.synthesize(days=2, seed=1), etag=False) as site:
+        engine, watched, calls = _watching_engine(site, monkeypatch)
+        try:
+            _check_unchanged_then_changed(site, engine, watched, calls)
+            assert engine.stats['unchanged_page'] == 3 and site.not_modified == 0
+        finally:
+            engine.close()
@@ -0,0 +1,104 @@
+import asyncio
+import smtplib
+
+from gym_monitor.mailer import Mailer, SmtpSession, is_permanent
+
+CONFIG = {'smtp_server': 'localhost', 'smtp_port': 25, 'sender_email': 'monitor@example.com',
+          'sender_password': '', 'recipient_email': 'owner@example.com'}
+
+
+class _Session:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message, recipient=None):
+        if recipient == 'typo@exmaple':
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b'No such user')})
+        self.sent.append(recipient)
+
+    def close(self):
+        pass
+
+
+async def _offload(func, *args):
+    return func(*args)
+
+
+def test_rejected_recipient_does_not_block_later_digests():
+    async def scenario():
+        mailer = Mailer(CONFIG, _offload, digest_window=0.01, backoff_base=10)
+        mailer.session = _Session()
+        task = asyncio.create_task(mailer.run())
+        mailer.add("CSE Active|20 Oct 2026 (Tue)|07:00 - 08:00", recipient='typo@exmaple')
+        mailer.add("CSE Active|20 Oct 2026 (Tue)|07:00 - 08:00", recipient='ok@example.com')
+        await asyncio.sleep(0.1)
+        task.cancel()
+        return mailer
+    mailer = asyncio.run(scenario())
+    assert mailer.session.sent == ['ok@example.com']
+    assert mailer.failures == 0
+
+
+def test_transient_errors_are_not_permanent():
+    assert not is_permanent(smtplib.SMTPServerDisconnected())
+    assert not is_permanent(smtplib.SMTPResponseException(421, b'Try again later'))
+    assert not is_permanent(smtplib.SMTPAuthenticationError(535, b'Bad credentials'))
+    assert is_permanent(smtplib.SMTPDataError(554, b'Message rejected'))
+
+
+class _Connection:
+    opened = []
+
+    def __init__(self, host, port, timeout=None):
+        self.opened.append((type(self).__name__, port))
+
+    def starttls(self):
+        self.opened.append(('starttls', None))
+
+    def login(self, user, password):
+        pass
+
+
+class _SSL(_Connection):
+    pass
+
+
+class _Plain(_Connection):
+    pass
+
+
+def test_every_port_uses_implicit_tls_by_default(monkeypatch):
+    monkeypatch.setattr(smtplib, 'SMTP_SSL', _SSL)
+    monkeypatch.setattr(smtplib, 'SMTP', _Plain)
+    _Connection.opened = []
+    for port in (465, 994, 587):
+        SmtpSession(dict(CONFIG, smtp_port=port, sender_password='secret')).connect()
+    assert _Connection.opened == [('_SSL', 465), ('_SSL', 994), ('_SSL', 587)]
+
+    _Connection.opened = []
+    SmtpSession(dict(CONFIG, smtp_port=587, smtp_ssl=False, smtp_starttls=True)).connect()
+    assert _Connection.opened == [('_Plain', 587), ('starttls', None)]
+
+
+def test_session_is_closed_off_the_loop():
+    offloaded = []
+
+    async def offload(func, *args):
+        offloaded.append(func.__name__)
+        return func(*args)
+
+    class Failing(_Session):
+        def send(self, message, recipient=None):
+            raise smtplib.SMTPServerDisconnected('Connection unexpectedly closed')
+
+    async def scenario():
+        mailer = Mailer(CONFIG, offload, digest_window=0.01, backoff_base=0.01, backoff_max=0.01)
+        mailer.session = Failing()
+        task = asyncio.create_task(mailer.run())
+        mailer.add("CSE Active|20 Oct 2026 (Tue)|07:00 - 08:00")
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+    asyncio.run(scenario())
+    assert offloaded[:2] == ['send', 'close']
+    assert offloaded[-1] == 'close'
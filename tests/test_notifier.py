@@ -0,0 +1,72 @@
+import asyncio
+import time
+
+from gym_monitor.notifier import Channel, NotificationDispatcher
+
+
+class _Recording(Channel):
+    """Records (slot id, monotonic time) of every delivery."""
+
+    def __init__(self, name, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+        self.delivered = []
+
+    async def deliver(self, alert):
+        self.delivered.append((alert.slot_id, time.monotonic()))
+
+
+async def _offload(func, *args):
+    return func(*args)
+
+
+async def _settle(dispatcher):
+    for runner in dispatcher._runners.values():
+        await runner.queue.join()
+
+
+def test_repeats_are_dropped_per_channel_within_the_dedup_window():
+    async def scenario():
+        dispatcher = NotificationDispatcher(_offload)
+        email, webhook = _Recording('email', dedup_seconds=60), _Recording('webhook', dedup_seconds=0.05)
+        dispatcher.add_channel(email)
+        dispatcher.add_channel(webhook)
+        dispatcher.dispatch('a', channels=['email'])
+        dispatcher.dispatch('a')        # a repeat for email only
+        dispatcher.dispatch('a')        # a repeat for both
+        dispatcher.dispatch('b')
+        await _settle(dispatcher)
+        await asyncio.sleep(0.1)        # past the webhook's window, not the email's
+        dispatcher.dispatch('a')
+        await _settle(dispatcher)
+        return dispatcher.stats(), email.delivered, webhook.delivered
+
+    stats, email, webhook = asyncio.run(scenario())
+    assert [slot_id for slot_id, _ in email] == ['a', 'b']
+    assert [slot_id for slot_id, _ in webhook] == ['a', 'b', 'a']
+    assert stats['email']['deduplicated'] == 3
+    assert stats['webhook']['deduplicated'] == 1
+    assert stats['email']['delivered'] == 2 and stats['webhook']['delivered'] == 3
+
+
+def test_token_bucket_allows_a_burst_then_spaces_deliveries():
+    async def scenario():
+        dispatcher = NotificationDispatcher(_offload)
+        limited = _Recording('limited', rate=2, per=0.5)
+        free = _Recording('free', rate=100, per=0.5)
+        dispatcher.add_channel(limited)
+        dispatcher.add_channel(free)
+        started = time.monotonic()
+        for slot_id in 'abcd':
+            dispatcher.dispatch(slot_id)
+        await _settle(dispatcher)
+        return started, limited.delivered, free.delivered
+
+    started, limited, free = asyncio.run(scenario())
+    assert [slot_id for slot_id, _ in limited] == list('abcd')
+    offsets = [at - started for _, at in limited]
+    # Two tokens at once, then one every per / rate = 0.25 s.
+    assert offsets[1] < 0.1
+    assert offsets[2] >= 0.2 and offsets[3] >= 0.45
+    # The other channel is not held up by the limited one.
+    assert all(at - started < 0.1 for _, at in free)
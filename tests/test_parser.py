@@ -0,0 +1,40 @@
+from pathlib import Path
+
+import pytest
+
+from gym_monitor.parser import find_section, parse_schedule, parse_schedule_soup
+
+pytest.importorskip("bs4")
+
+PAGES = sorted((Path(__file__).resolve().parent / 'pages').glob('*.html')) + \
+    sorted((Path(__file__).resolve().parent.parent / 'bench' / 'pages').glob('*.html'))
+
+
+def _rows(data):
+    return {venue: [(slot["date"], slot["time"], slot["status"]) for slot in slots] for venue, slots in data.items()}
+
+
+@pytest.mark.parametrize('path', PAGES, ids=lambda path: path.name)
+def test_same_slots_as_the_soup_parser(path):
+    html = path.read_text(encoding='utf-8')
+    fast = parse_schedule(html)
+    assert fast
+    assert fast == parse_schedule_soup(html)
+
+
+def test_comments_scripts_and_lookalike_attributes():
+    html = (Path(__file__).resolve().parent / 'pages' / 'edge_cases.html').read_text(encoding='utf-8')
+    assert _rows(parse_schedule(html)) == {
+        "CSE Active": [
+            ("19 Oct 2026 (Mon)", "08:00 - 09:00", "FULL"),
+            ("19 Oct 2026 (Mon)", "09:00 - 10:00", "3spaces left"),
+            ("20 Oct 2026 (Tue)", "10:00 - 11:00nested", "nested"),
+            ("20 Oct 2026 (Tue)", "11:00 - 12:00", "FULL & waitlist"),
+        ],
+        "HKU B-Active": [("19 Oct 2026 (Mon)", "07:00 - 08:00", "5 spaces left")],
+    }
+
+
+def test_section_ends_at_its_own_closing_tag():
+    html = '<div id="x"><div>a<!-- </div> --></div><script>"</div>"</script></div><div>after</div>'
+    assert find_section(html, 'x') == '<div>a<!-- </div> --></div><script>"</div>"</script>'
@@ -0,0 +1,112 @@
+from datetime import date, datetime
+
+import pytest
+
+from gym_monitor.parser import slot_record
+from gym_monitor.rules import Rule, RuleError, RuleSet
+from gym_monitor.slots import SlotRegistry, Snapshot
+
+# 15 Oct 2030 is a Tuesday.
+_TUESDAY = "15 Oct 2030 (Tue)"
+_WEDNESDAY = "16 Oct 2030 (Wed)"
+
+
+@pytest.mark.parametrize("text", [
+    'venue="CSE Active',        # unbalanced quote
+    'days',                     # not key=value
+    'time=',
+    'colour=red',
+    'days=someday',
+    'time=25:00-',
+    'time=18:00-18:00',
+    'time=20:00-18:00',
+    'dates=next week',
+    'min=three',
+    'min=0',
+    'min=255',
+])
+def test_invalid_rules_raise_rule_error(text):
+    with pytest.raises(RuleError):
+        Rule(text)
+
+
+def test_rule_error_is_a_value_error():
+    assert issubclass(RuleError, ValueError)
+
+
+def test_time_range_may_be_open_on_either_side():
+    evening = Rule('time=18:00-')
+    assert (evening.start_minute, evening.end_minute) == (18 * 60, 1440)
+    assert evening.covers(datetime(2030, 10, 15, 23, 30))
+    assert not evening.covers(datetime(2030, 10, 15, 17, 59))
+    morning = Rule('time=-09:00')
+    assert (morning.start_minute, morning.end_minute) == (0, 9 * 60)
+    assert not morning.covers(datetime(2030, 10, 15, 9, 0))
+
+
+@pytest.mark.parametrize("days, weekdays", [
+    ('tue,thu', {1, 3}),
+    ('mon-fri', {0, 1, 2, 3, 4}),
+    ('weekends', {5, 6}),
+    ('weekdays,sun', {0, 1, 2, 3, 4, 6}),
+    ('fri-mon', {4, 5, 6, 0}),           # wraps around the week
+    ('Tuesday,SAT', {1, 5}),
+])
+def test_day_lists_and_ranges(days, weekdays):
+    assert Rule(f'days={days}').weekdays == frozenset(weekdays)
+
+
+def test_dates_single_day_and_open_ranges():
+    assert (Rule('dates=2030-10-15').date_from, Rule('dates=2030-10-15').date_to) == (date(2030, 10, 15),) * 2
+    since = Rule('dates=2030-10-15..')
+    assert since.covers(datetime(2031, 1, 1, 8)) and not since.covers(datetime(2030, 10, 14, 8))
+
+
+def test_index_keys_cover_venue_weekday_and_hour():
+    rule = Rule('venue="CSE Active" days=tue,thu time=18:30-20:00')
+    assert sorted(rule.index_keys()) == [('cse active', day, hour) for day in (1, 3) for hour in (18, 19)]
+    anywhere = Rule('time=07:00-08:00')
+    assert sorted(anywhere.index_keys()) == [(None, day, 7) for day in range(7)]
+
+
+def test_candidates_are_looked_up_by_venue_weekday_and_hour():
+    rules = RuleSet()
+    cse = rules.add(Rule('venue="CSE Active" days=tue time=18:00-'))
+    anywhere = rules.add(Rule('time=07:00-09:00'))
+    tuesday_evening = datetime(2030, 10, 15, 19)
+    assert rules.candidates("CSE Active", tuesday_evening) == [cse]
+    assert rules.candidates("HKU B-Active", tuesday_evening) == []
+    assert rules.candidates("HKU B-Active", datetime(2030, 10, 16, 8)) == [anywhere]
+    assert rules.remove(cse.id) is cse and rules.remove(cse.id) is None
+    assert rules.candidates("CSE Active", tuesday_evening) == []
+    assert not any(cse in cell for cell in rules._index.values())
+
+
+def _snapshot(registry, *slots):
+    data = {}
+    for venue, date_text, time_slot, status in slots:
+        data.setdefault(venue, []).append(slot_record(venue, date_text, time_slot, status))
+    return Snapshot.from_data(registry, data)
+
+
+def test_changes_fire_only_for_slots_that_start_to_satisfy_a_rule():
+    registry = SlotRegistry()
+    rules = RuleSet()
+    evenings = rules.add(Rule('venue="CSE Active" days=tue time=18:00-'))
+    three = rules.add(Rule('days=tue,wed min=3'))
+    old = _snapshot(registry,
+                    ("CSE Active", _TUESDAY, "18:00 - 19:00", "FULL"),
+                    ("CSE Active", _TUESDAY, "19:00 - 20:00", "1 spaces left"),
+                    ("CSE Active", _TUESDAY, "07:00 - 08:00", "FULL"),
+                    ("HKU B-Active", _TUESDAY, "18:00 - 19:00", "FULL"))
+    new = _snapshot(registry,
+                    ("CSE Active", _TUESDAY, "18:00 - 19:00", "2 spaces left"),    # evenings only
+                    ("CSE Active", _TUESDAY, "19:00 - 20:00", "5 spaces left"),    # was already enough for evenings
+                    ("CSE Active", _TUESDAY, "07:00 - 08:00", "1 spaces left"),    # too few for min=3
+                    ("HKU B-Active", _TUESDAY, "18:00 - 19:00", "FULL"),
+                    ("HKU B-Active", _WEDNESDAY, "18:00 - 19:00", "4 spaces left"))  # new on the page
+    fired = rules.changes(registry, old, new)
+    assert fired == {"CSE Active|%s|18:00 - 19:00" % _TUESDAY: [evenings],
+                     "CSE Active|%s|19:00 - 20:00" % _TUESDAY: [three],
+                     "HKU B-Active|%s|18:00 - 19:00" % _WEDNESDAY: [three]}
+    assert rules.changes(registry, new, new) == {}
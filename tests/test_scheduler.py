@@ -0,0 +1,75 @@
+import types
+from datetime import datetime
+
+import pytest
+
+from gym_monitor import scheduler
+from gym_monitor.scheduler import PollScheduler, PollWindow, parse_window
+
+
+def _at(text):
+    return datetime.strptime(text, "%Y-%m-%d %H:%M:%S")
+
+
+def test_window_across_midnight_belongs_to_the_day_it_starts():
+    # 2026-10-16 is a Friday, 2026-10-17 a Saturday.
+    night = PollWindow("23:00", "01:00", 30, weekdays={4})
+    assert night.contains(_at("2026-10-16 23:30:00"))
+    assert night.contains(_at("2026-10-17 00:59:59"))     # still Friday's window
+    assert not night.contains(_at("2026-10-17 01:00:00"))
+    assert not night.contains(_at("2026-10-17 23:30:00"))
+    assert not night.contains(_at("2026-10-16 00:30:00"))  # Thursday's window does not run
+    assert night.seconds_until_start(_at("2026-10-16 22:00:00")) == 3600
+    assert night.seconds_until_start(_at("2026-10-17 02:00:00")) == 6 * 86400 + 21 * 3600
+
+
+def test_first_matching_window_wins_and_learned_ones_only_fill_gaps():
+    now = [_at("2026-10-16 23:30:00")]
+    polls = PollScheduler(windows=[PollWindow("23:00", "01:00", 30), PollWindow("23:15", "23:45", 5)],
+                          default_interval=60, jitter=0, clock=lambda: now[0])
+    polls.set_learned_windows([PollWindow("22:00", "02:00", 10)])
+    assert polls.interval_at(now[0]) == 30
+    assert polls.interval_at(_at("2026-10-17 01:30:00")) == 10
+    assert polls.interval_at(_at("2026-10-17 03:00:00")) == 60
+
+
+def test_delay_is_shortened_to_enter_a_faster_window_on_time():
+    now = [_at("2026-10-16 11:59:20")]
+    polls = PollScheduler(windows=[PollWindow("12:00", "12:05", 0.5)], default_interval=60, jitter=0,
+                          clock=lambda: now[0], max_requests_per_hour=0)
+    assert polls.next_delay() == 40
+    now[0] = _at("2026-10-16 12:01:00")
+    assert polls.next_delay() == 0.5
+
+
+def test_jitter_stays_within_bounds():
+    polls = PollScheduler(windows=[], default_interval=10, jitter=0.2, max_requests_per_hour=0,
+                          clock=lambda: _at("2026-10-16 15:00:00"))
+    delays = [polls.next_delay() for _ in range(2000)]
+    assert all(8 <= delay <= 12 for delay in delays)
+    assert max(delays) - min(delays) > 3     # and actually varies
+
+
+def test_hourly_budget_holds_back_polls_until_the_oldest_request_is_an_hour_old(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(scheduler, 'time', types.SimpleNamespace(monotonic=lambda: clock[0]))
+    polls = PollScheduler(windows=[], default_interval=1, jitter=0, max_requests_per_hour=3,
+                          clock=lambda: _at("2026-10-16 15:00:00"))
+    for _ in range(3):
+        assert polls.next_delay() == 1
+        polls.record_request()
+        clock[0] += 10
+    assert polls.next_delay() == 3600 - 30    # the first request leaves the window then
+    clock[0] = 1000.0 + 3600
+    assert polls.next_delay() == 1
+    polls.record_request()
+    assert polls.next_delay() == 10           # now the second one is the oldest
+
+
+def test_parse_window():
+    window = parse_window("23:30-00:30=15")
+    assert (window.start, window.end, window.interval) == (23 * 3600 + 1800, 1800, 15.0)
+    with pytest.raises(ValueError):
+        parse_window("23:30=15")
+    with pytest.raises(ValueError):
+        parse_window("25:00-26:00=15")
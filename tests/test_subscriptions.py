@@ -0,0 +1,104 @@
+import asyncio
+from datetime import date, timedelta
+
+from gym_monitor.engine import MonitorEngine
+from gym_monitor.parser import slot_record
+from gym_monitor.subscriptions import SubscriptionRegistry
+
+
+def _page(status):
+    day = (date.today() + timedelta(days=1)).strftime("%d %b %Y (%a)")
+    return {"CSE Active": [slot_record("CSE Active", day, "07:00 - 08:00", status)]}
+
+
+def _settle(engine):
+    """Waits for the rule changes queued on the engine loop."""
+    engine.submit(asyncio.sleep(0)).result(2)
+
+
+def test_only_the_owners_of_fired_rules_are_notified():
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    try:
+        registry = SubscriptionRegistry(engine)
+        registry.subscribe('alice', webhooks=['http://alice.example/hook'])
+        registry.subscribe('bob', webhooks=['http://bob.example/hook'])
+        registry.add_rule('alice', 'venue="CSE Active" min=3')
+        registry.add_rule('bob', 'venue="CSE Active"')
+        _settle(engine)
+
+        engine.last_snapshot = engine.state.snapshot(_page("2 spaces left"))
+        engine._match_rules()
+        data = _page("5 spaces left")
+        engine.last_snapshot = engine.state.snapshot(data)
+        slot_id = data["CSE Active"][0]["id"]
+        # Bob's rule was already satisfied with 2 places, so only Alice's fires.
+        assert engine._match_rules() == [slot_id]
+        assert registry.channels_for(slot_id) == {'webhook http://alice.example/hook'}
+    finally:
+        engine.close()
+
+
+def test_rule_ids_survive_a_restart(tmp_path):
+    path = tmp_path / 'subscriptions.json'
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    try:
+        registry = SubscriptionRegistry(engine, path)
+        registry.subscribe('alice', webhooks=['http://alice.example/hook'])
+        first = registry.add_rule('alice', 'days=sat,sun').id
+        second = registry.add_rule('alice', 'days=mon-fri min=2').id
+    finally:
+        engine.close()
+
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    try:
+        registry = SubscriptionRegistry(engine, path)
+        assert [rule["id"] for rule in registry.get('alice')["rules"]] == [first, second]
+        third = registry.add_rule('alice', 'days=sat').id
+        assert third > second
+        assert registry.remove_rule('alice', first)
+        _settle(engine)
+        assert [rule.id for rule in engine.rules] == [second, third]
+    finally:
+        engine.close()
+
+
+def _post(api, path, body):
+    import json
+    import urllib.error
+    import urllib.request
+    request = urllib.request.Request(api.url + path, data=json.dumps(body).encode('utf-8'), method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=5) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_api_rejects_malformed_subscriptions_and_unknown_slots():
+    from gym_monitor.api import ApiServer
+
+    engine = MonitorEngine(url="http://127.0.0.1:9/", extra_urls=[])
+    registry = SubscriptionRegistry(engine)
+    api = ApiServer(engine, registry, port=0).start()
+    try:
+        data = _page("FULL")
+        engine.last_data = data
+        engine.last_snapshot = engine.state.snapshot(data)
+        slot_id = data["CSE Active"][0]["id"]
+
+        assert _post(api, '/subscribe', {"name": "alice", "webhooks": "http://alice.example/hook"}) == 400
+        assert _post(api, '/subscribe', {"name": "alice", "webhooks": ["ftp://alice.example/hook"]}) == 400
+        assert _post(api, '/subscribe', {"name": "alice", "email": ["alice@example.com"]}) == 400
+        assert _post(api, '/subscribe', {"name": "alice", "email": "alice"}) == 400
+        assert _post(api, '/subscribe', {"name": ["alice"]}) == 400
+        assert _post(api, '/subscribe', {"name": ""}) == 400
+        assert registry.subscribers() == []
+
+        assert _post(api, '/subscribe', {"name": "alice", "webhooks": ["https://alice.example/hook"]}) == 200
+        assert _post(api, '/watch', {"name": "alice", "slot_id": "CSE Active|1 Jan 2000 (Sat)|00:00 - 01:00"}) == 400
+        assert _post(api, '/watch', {"name": "alice", "slot_id": slot_id}) == 200
+        assert registry.get('alice')["slots"] == [slot_id]
+        assert engine.state.selected_snapshot() == {slot_id}
+    finally:
+        api.stop()
+        engine.close()
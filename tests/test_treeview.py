@@ -0,0 +1,111 @@
+from datetime import date, timedelta
+
+from gym_monitor.parser import slot_record
+from gym_monitor.treeview import TreeRenderer, date_row_id
+
+
+class _Tree:
+    """A Treeview stand-in that keeps the rows and records every call."""
+
+    def __init__(self):
+        self.rows = []      # [iid, values, tags] in display order
+        self.ops = []
+
+    def _find(self, iid):
+        return next(index for index, row in enumerate(self.rows) if row[0] == iid)
+
+    def insert(self, parent, index, iid, values, tags):
+        self.ops.append(('insert', iid))
+        self.rows.insert(index, [iid, values, tags])
+
+    def delete(self, *iids):
+        self.ops.append(('delete',) + iids)
+        self.rows = [row for row in self.rows if row[0] not in iids]
+
+    def move(self, iid, parent, index):
+        self.ops.append(('move', iid))
+        self.rows.insert(index, self.rows.pop(self._find(iid)))
+
+    def item(self, iid, values=None, tags=None):
+        self.ops.append(('item', iid))
+        row = self.rows[self._find(iid)]
+        if values is not None:
+            row[1] = values
+        if tags is not None:
+            row[2] = tags
+
+    def exists(self, iid):
+        return any(row[0] == iid for row in self.rows)
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).strftime("%d %b %Y (%a)")
+
+
+def _slots(*rows):
+    return [slot_record("CSE Active", _day(offset), time_slot, status) for offset, time_slot, status in rows]
+
+
+def _shown(tree):
+    return [(iid, values[1], tags) for iid, values, tags in tree.rows]
+
+
+def test_first_render_inserts_every_row_with_date_headers():
+    tree = _Tree()
+    slots = _slots((1, "07:00 - 08:00", "FULL"), (1, "08:00 - 09:00", "2 spaces left"), (2, "07:00 - 08:00", "FULL"))
+    calls = TreeRenderer(tree).render(slots, selected={slots[0]["id"]})
+    assert calls == 5
+    assert _shown(tree) == [(date_row_id(_day(1)), '', ('date',)),
+                            (slots[0]["id"], "FULL", ('selected',)),
+                            (slots[1]["id"], "2 spaces left", ()),
+                            (date_row_id(_day(2)), '', ('date',)),
+                            (slots[2]["id"], "FULL", ())]
+
+
+def test_rerender_touches_only_the_rows_that_differ():
+    tree = _Tree()
+    renderer = TreeRenderer(tree)
+    before = _slots((1, "07:00 - 08:00", "FULL"), (1, "08:00 - 09:00", "FULL"), (2, "07:00 - 08:00", "FULL"))
+    renderer.render(before, selected=set())
+    tree.ops.clear()
+
+    assert renderer.render(before, selected=set()) == 0
+    assert tree.ops == []
+
+    # One status changes, a day is gone and a new one appears.
+    after = _slots((1, "07:00 - 08:00", "FULL"), (1, "08:00 - 09:00", "1 spaces left"), (3, "07:00 - 08:00", "FULL"))
+    assert renderer.render(after, selected=set()) == 4
+    assert tree.ops == [('delete', date_row_id(_day(2)), before[2]["id"]),
+                        ('item', after[1]["id"]),
+                        ('insert', date_row_id(_day(3))),
+                        ('insert', after[2]["id"])]
+    assert [iid for iid, _, _ in _shown(tree)] == [date_row_id(_day(1)), after[0]["id"], after[1]["id"],
+                                                   date_row_id(_day(3)), after[2]["id"]]
+
+
+def test_reordered_page_moves_the_kept_rows():
+    tree = _Tree()
+    renderer = TreeRenderer(tree)
+    slots = _slots((1, "07:00 - 08:00", "FULL"), (1, "08:00 - 09:00", "FULL"))
+    renderer.render(slots, selected=set())
+    tree.ops.clear()
+    renderer.render(slots[::-1], selected=set())
+    assert {op for op, *_ in tree.ops} == {'move'}
+    assert [iid for iid, _, _ in _shown(tree)] == [date_row_id(_day(1)), slots[1]["id"], slots[0]["id"]]
+
+
+def test_set_selected_and_clear():
+    tree = _Tree()
+    renderer = TreeRenderer(tree)
+    slots = _slots((1, "07:00 - 08:00", "FULL"))
+    renderer.render(slots, selected=set())
+    renderer.set_selected(slots[0]["id"], True)
+    renderer.set_selected("not shown", True)
+    assert _shown(tree)[1] == (slots[0]["id"], "FULL", ('selected',))
+    tree.ops.clear()
+    assert renderer.render(slots, selected={slots[0]["id"]}) == 0   # the renderer knows it is highlighted
+
+    renderer.clear()
+    assert tree.rows == []
+    renderer.render(slots, selected=set())
+    assert [op for op, *_ in tree.ops[-2:]] == ['insert', 'insert']
@@ -0,0 +1,40 @@
+from gym_monitor.metrics import metrics
+from gym_monitor.updates import UpdateQueue
+
+
+def test_drain_runs_urgent_then_posted_then_the_latest_put_per_key():
+    queue = UpdateQueue()
+    calls = []
+    coalesced = metrics.counters['gui.coalesced']
+    queue.put('render', calls.append, 'snapshot 1')
+    queue.post(calls.append, 'log 1')
+    queue.put('status', calls.append, 'status 1')
+    queue.put('render', calls.append, 'snapshot 2')
+    queue.urgent(calls.append, 'alert')
+    queue.post(calls.append, 'log 2')
+    queue.put('render', calls.append, 'snapshot 3')
+    assert len(queue) == 5
+    assert metrics.counters['gui.coalesced'] - coalesced == 2
+
+    assert queue.drain() == 5
+    assert calls == ['alert', 'log 1', 'log 2', 'snapshot 3', 'status 1']
+    assert len(queue) == 0 and queue.drain() == 0
+
+
+def test_a_failing_update_does_not_stop_the_batch():
+    queue = UpdateQueue()
+    calls = []
+    queue.post(lambda: 1 / 0)
+    queue.post(calls.append, 'after')
+    assert queue.drain() == 2
+    assert calls == ['after']
+
+
+def test_updates_queued_while_draining_wait_for_the_next_frame():
+    queue = UpdateQueue()
+    calls = []
+    queue.post(lambda: queue.put('render', calls.append, 'later'))
+    assert queue.drain() == 1
+    assert calls == []
+    assert queue.drain() == 1
+    assert calls == ['later']